@@ -0,0 +1,60 @@
+"""
+Report prompt tokens spent on bounding boxes for the saved bbox fixtures.
+
+Compares the repr of the raw list (what llm_call_node used to send) with the compact encoding,
+with and without a token budget. Tokens are counted with tiktoken when it is installed,
+otherwise estimated at 4 characters per token.
+
+Run from the backend folder:
+    python -m benchmarks.bbox_encoder_benchmark --budgets 1500 500
+"""
+import argparse
+import json
+import os
+
+from src.bbox_encoder import CHARS_PER_TOKEN, encode_bboxes
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Query and plan step the fixtures were recorded for
+FIXTURE_TASKS = {
+    "bboxes_search_results.json": ("What is the latest news on Apple's stock price?",
+                                   "Click on the link to a reliable financial news source like Reuters"),
+    "bboxes_docs_page.json": ("How does page.evaluate handle promises?",
+                              "Open the Page API reference and read the evaluate section"),
+}
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+except ImportError:
+    def count_tokens(text: str) -> int:
+        return len(text) // CHARS_PER_TOKEN
+
+
+def main(budgets):
+    print(f"{'fixture':<30}{'encoding':<18}{'tokens':>8}{'saved':>8}")
+    for name, (query, plan_step) in FIXTURE_TASKS.items():
+        with open(os.path.join(fixtures_dir, name)) as f:
+            bboxes = json.load(f)
+
+        baseline = count_tokens(str(bboxes))
+        variants = {"repr (before)": str(bboxes), "compact": encode_bboxes(bboxes, token_budget=None)}
+        for budget in budgets:
+            variants[f"ranked {budget}"] = encode_bboxes(bboxes, query=query, plan_step=plan_step,
+                                                         token_budget=budget)
+
+        for label, text in variants.items():
+            tokens = count_tokens(text)
+            print(f"{name:<30}{label:<18}{tokens:>8}{1 - tokens / baseline:>8.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[1500, 500])
+    args = parser.parse_args()
+    main(args.budgets)
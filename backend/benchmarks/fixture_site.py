@@ -0,0 +1,75 @@
+"""
+Serve the saved HTML fixtures as a small local site the agent can browse without the network.
+
+    /, /search           search_results.html, result links point back into the site
+    /article/...         docs_page.html
+    /dashboard           spa_dashboard.html
+
+Every page grows its `data-repeat` containers `scale` times on load, as in mark_page_benchmark.
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from benchmarks.mark_page_benchmark import GROW_DOM
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ROUTES = {
+    "/": "search_results.html",
+    "/search": "search_results.html",
+    "/dashboard": "spa_dashboard.html",
+}
+ARTICLE_PREFIX = "/article/"
+ARTICLE_PAGE = "docs_page.html"
+
+
+def load_fixture(name: str, scale: int) -> bytes:
+    with open(os.path.join(fixtures_dir, name)) as f:
+        html = f.read()
+    # Results link to the real sites, keep the agent on this server
+    html = html.replace('href="https://www.', f'href="{ARTICLE_PREFIX}').replace('href="https://', f'href="{ARTICLE_PREFIX}')
+    grow = f"<script>({GROW_DOM})({scale});</script>"
+    return html.replace("</body>", f"{grow}\n</body>").encode()
+
+
+class FixtureSite:
+    """A threaded HTTP server on a free local port, started and stopped around a benchmark."""
+
+    def __init__(self, scale: int = 1):
+        self.scale = scale
+        self.pages = {name: load_fixture(name, scale) for name in {*ROUTES.values(), ARTICLE_PAGE}}
+        pages = self.pages
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                name = ROUTES.get(path) or (ARTICLE_PAGE if path.startswith(ARTICLE_PREFIX) else None)
+                if name is None:
+                    self.send_error(404)
+                    return
+                body = pages[name]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self) -> "FixtureSite":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,175 @@
+"""
+Run the whole agent graph offline: the fixture site on a local HTTP server, headless Chromium and a
+scripted chat model in place of Gemini.
+
+Each journey (see benchmarks.scripted_model) is run `--runs` times per DOM scale and reports the
+end-to-end time, the median time per graph step, time per phase (mark, screenshot, encode, settle,
+action, llm) from the run trace, the Python process RSS and the page's JS heap.
+
+A run fails when the scripted model finds no element to act on or no answer is produced, so a
+broken annotation or action path shows up as a failure, not a fast run. With `--baseline`, runs
+slower than the saved results by more than `--tolerance` fail too.
+
+Run from the backend folder:
+    python -m benchmarks.graph_benchmark --scales 1 10 50 --runs 3 --save results.json
+    python -m benchmarks.graph_benchmark --baseline results.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from langgraph.checkpoint.memory import MemorySaver
+from playwright.async_api import async_playwright
+
+from benchmarks.fixture_site import FixtureSite
+from benchmarks.scripted_model import JOURNEYS, START_PATHS, ScriptedChatModel
+from src.agent_runner import initial_state
+from src.build_graph import build_graph
+from src.graph_state import AgentOutput, MasterPlanState
+from src.resources import resources
+from src.utilities import BROWSER_ARGS, CHROMIUM_EXECUTABLE_PATH, CONTEXT_OPTIONS, new_agent_page
+from src.tracing import RunTrace
+
+PHASES = ("mark", "screenshot", "encode", "settle", "action", "llm")
+
+
+def install_model(model: ScriptedChatModel):
+    """Serve `model` in place of every Gemini model the nodes take from the resource registry."""
+    for name in ("llm", "llm_summary"):
+        resources.replace(name, model)
+    resources.replace("agent_output_llm", model.with_structured_output(AgentOutput, include_raw=True))
+    resources.replace("master_plan_llm", model.with_structured_output(MasterPlanState))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+async def js_heap_mb(page) -> float:
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        await cdp.send("Performance.enable")
+        metrics = {metric["name"]: metric["value"] for metric in (await cdp.send("Performance.getMetrics"))["metrics"]}
+        return metrics.get("JSHeapUsedSize", 0) / 2 ** 20
+    finally:
+        await cdp.detach()
+
+
+async def run_journey(app, context, site: FixtureSite, journey: str, latency_ms: float) -> dict:
+    model = ScriptedChatModel(journey=JOURNEYS[journey], latency_ms=latency_ms)
+    install_model(model)
+    page = await new_agent_page(context, site.url + START_PATHS[journey])
+    try:
+        node_count = await page.evaluate("document.getElementsByTagName('*').length")
+        thread_id = uuid.uuid4().hex
+        trace = RunTrace(thread_id)
+        config = {"recursion_limit": 100,
+                  "configurable": {"thread_id": thread_id, "session_id": "benchmark", "page": page,
+                                   "bypass_cache": True, "trace": trace}}
+        start = time.perf_counter()
+        result = await app.ainvoke(initial_state("What is the latest news on Apple's stock price?"), config)
+        total_ms = (time.perf_counter() - start) * 1000
+        summary = trace.finish()
+        failures = [f"no element for {miss}" for miss in model.misses]
+        if not result.get("answer"):
+            failures.append("no answer")
+        return {"nodes": node_count, "total_ms": total_ms, "summary": summary, "rss_mb": rss_mb(),
+                "js_heap_mb": await js_heap_mb(page), "failures": failures}
+    finally:
+        await page.close()
+
+
+def aggregate(runs) -> dict:
+    steps = {}
+    for run in runs:
+        for node, entry in run["summary"]["nodes"].items():
+            steps.setdefault(node, []).append(entry["total_ms"] / entry["count"])
+    phases = {phase: statistics.median(run["summary"]["phases"].get(phase, {}).get("total_ms", 0) for run in runs)
+              for phase in PHASES}
+    marks = [run["summary"]["phases"].get("mark", {}) for run in runs]
+    return {
+        "nodes": runs[0]["nodes"],
+        "total_ms": statistics.median(run["total_ms"] for run in runs),
+        "mark_ms": statistics.median(mark.get("total_ms", 0) / max(mark.get("count", 1), 1) for mark in marks),
+        "phases_ms": phases,
+        "steps_ms": {node: statistics.median(times) for node, times in steps.items()},
+        "rss_mb": max(run["rss_mb"] for run in runs),
+        "js_heap_mb": max(run["js_heap_mb"] for run in runs),
+        "failures": sorted({failure for run in runs for failure in run["failures"]}),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if not before:
+            continue
+        for metric in ("total_ms", "mark_ms"):
+            if before[metric] and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {before[metric]:.1f} -> {result[metric]:.1f}")
+    return regressions
+
+
+async def main(journeys, scales, runs, latency_ms):
+    results = {}
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True, args=BROWSER_ARGS,
+                                                   executable_path=CHROMIUM_EXECUTABLE_PATH)
+        context = await browser.new_context(**CONTEXT_OPTIONS)
+        app = build_graph().compile(checkpointer=MemorySaver())
+
+        print(f"{'journey':<12}{'scale':>6}{'nodes':>8}{'total ms':>10}{'mark ms':>9}"
+              + "".join(f"{phase:>11}" for phase in PHASES) + f"{'rss MB':>8}{'heap MB':>9}")
+        for scale in scales:
+            with FixtureSite(scale) as site:
+                for journey in journeys:
+                    # One untimed run loads the browser, fonts and code paths
+                    await run_journey(app, context, site, journey, latency_ms)
+                    result = aggregate([await run_journey(app, context, site, journey, latency_ms)
+                                        for _ in range(runs)])
+                    results[f"{journey}@{scale}"] = result
+                    print(f"{journey:<12}{scale:>6}{result['nodes']:>8}{result['total_ms']:>10.1f}"
+                          f"{result['mark_ms']:>9.1f}"
+                          + "".join(f"{result['phases_ms'][phase]:>11.1f}" for phase in PHASES)
+                          + f"{result['rss_mb']:>8.0f}{result['js_heap_mb']:>9.1f}")
+                    for failure in result["failures"]:
+                        print(f"    FAILED: {failure}")
+
+        print("\nMedian ms per step")
+        for key, result in results.items():
+            print(f"{key:<18}" + "  ".join(f"{node}={ms:.1f}" for node, ms in result["steps_ms"].items()))
+
+        await browser.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--journeys", nargs="+", default=list(JOURNEYS), choices=list(JOURNEYS))
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated model latency per call")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.journeys, args.scales, args.runs, args.llm_latency_ms))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [f"{key}: {failure}" for key, result in results.items() for failure in result["failures"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed += compare(results, json.load(f), args.tolerance)
+    if failed:
+        print("\n" + "\n".join(failed))
+        sys.exit(1)
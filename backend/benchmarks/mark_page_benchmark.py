@@ -0,0 +1,96 @@
+"""
+Time markPage() element discovery over the saved HTML fixtures.
+
+Each fixture marks one container with `data-repeat`; its children are cloned `--scales` times to
+grow the DOM, so the same page can be measured from a few hundred to tens of thousands of nodes.
+The current script is compared against the original implementation in legacy_mark_page.js.
+
+Run from the backend folder:
+    python -m benchmarks.mark_page_benchmark --scales 1 10 50 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+
+from playwright.async_api import async_playwright
+
+from src.utilities import BROWSER_ARGS, CHROMIUM_EXECUTABLE_PATH, mark_page_script
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+fixtures_dir = os.path.join(benchmarks_dir, "fixtures")
+
+with open(os.path.join(benchmarks_dir, "legacy_mark_page.js")) as f:
+    legacy_mark_page_script = f.read()
+
+SCRIPTS = {
+    "current": mark_page_script,
+    "legacy": legacy_mark_page_script,
+}
+
+GROW_DOM = """(times) => {
+    document.querySelectorAll("[data-repeat]").forEach((container) => {
+        const original = Array.from(container.children).map((child) => child.cloneNode(true));
+        for (let i = 1; i < times; i++) {
+            original.forEach((child) => container.appendChild(child.cloneNode(true)));
+        }
+    });
+    return document.getElementsByTagName("*").length;
+}"""
+
+TIME_MARK_PAGE = """() => {
+    const start = performance.now();
+    const bboxes = markPage();
+    const elapsed = performance.now() - start;
+    unmarkPage();
+    return [elapsed, bboxes.length];
+}"""
+
+
+async def time_fixture(context, html: str, scale: int, script: str, runs: int):
+    page = await context.new_page()
+    try:
+        await page.set_content(html, wait_until="load")
+        node_count = await page.evaluate(GROW_DOM, scale)
+        await page.evaluate(script)
+        timings, count = [], 0
+        for _ in range(runs):
+            elapsed, count = await page.evaluate(TIME_MARK_PAGE)
+            timings.append(elapsed)
+        return node_count, statistics.median(timings), count
+    finally:
+        await page.close()
+
+
+async def main(scales, runs, fixtures):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True, args=BROWSER_ARGS,
+                                                   executable_path=CHROMIUM_EXECUTABLE_PATH)
+        context = await browser.new_context(viewport={"width": 1280, "height": 720})
+
+        print(f"{'fixture':<22}{'scale':>6}{'nodes':>8}{'legacy ms':>12}{'current ms':>12}"
+              f"{'speedup':>9}{'bboxes':>12}")
+        for name in fixtures:
+            with open(os.path.join(fixtures_dir, name)) as f:
+                html = f.read()
+            for scale in scales:
+                results = {}
+                for label, script in SCRIPTS.items():
+                    results[label] = await time_fixture(context, html, scale, script, runs)
+                nodes, legacy_ms, legacy_count = results["legacy"]
+                _, current_ms, current_count = results["current"]
+                speedup = legacy_ms / current_ms if current_ms else float("inf")
+                print(f"{name:<22}{scale:>6}{nodes:>8}{legacy_ms:>12.1f}{current_ms:>12.1f}"
+                      f"{speedup:>8.1f}x{f'{legacy_count}/{current_count}':>12}")
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--fixtures", nargs="+",
+                        default=sorted(f for f in os.listdir(fixtures_dir) if f.endswith(".html")))
+    args = parser.parse_args()
+    asyncio.run(main(args.scales, args.runs, args.fixtures))
@@ -0,0 +1,97 @@
+"""
+Load real pages with and without the agent's network profile and compare load time, requests,
+bytes transferred and HTTP cache hits.
+
+Each URL is loaded cold in a fresh context, then again from the same context (warm), as going back
+or opening another page of the same site does. Modes:
+    none     no profile
+    route    every request passed through a Playwright route, which turns off the HTTP cache
+    profile  the network profile as agents get it (Chromium URL blocking, routes only past the
+             third-party cap)
+
+Needs network access. Run from the backend folder:
+    python -m benchmarks.network_profile_benchmark --urls https://www.bbc.com https://en.wikipedia.org/wiki/Paris
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from src.network_profile import network_profile, network_stats
+from src.utilities import BROWSER_ARGS, CHROMIUM_EXECUTABLE_PATH, CONTEXT_OPTIONS
+
+MODES = ("none", "route", "profile")
+
+
+async def load(context, url: str, timeout_ms: int) -> dict:
+    page = await context.new_page()
+    if network_stats(context) is not None:
+        await network_profile.apply_page(page)
+    cdp = await context.new_cdp_session(page)
+    totals = {"requests": 0, "bytes": 0, "cached": 0}
+
+    def on_response(event):
+        totals["requests"] += 1
+        if event["response"].get("fromDiskCache") or event["response"].get("fromMemoryCache"):
+            totals["cached"] += 1
+
+    def on_finished(event):
+        totals["bytes"] += event.get("encodedDataLength", 0)
+
+    cdp.on("Network.responseReceived", on_response)
+    cdp.on("Network.loadingFinished", on_finished)
+    await cdp.send("Network.enable")
+    start = time.perf_counter()
+    try:
+        await page.goto(url, wait_until="load", timeout=timeout_ms)
+    except Exception as e:
+        print(f"  {url}: {e}")
+    totals["load_ms"] = (time.perf_counter() - start) * 1000
+    await page.close()
+    return totals
+
+
+async def run_mode(browser, mode: str, url: str, timeout_ms: int) -> dict:
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    try:
+        if mode == "route":
+            await context.route("**/*", lambda route: route.continue_())
+        elif mode == "profile":
+            await network_profile.apply(context)
+        cold = await load(context, url, timeout_ms)
+        warm = await load(context, url, timeout_ms)
+        stats = network_stats(context)
+        return {"cold": cold, "warm": warm, "blocked": stats.blocked if stats else 0}
+    finally:
+        await context.close()
+
+
+async def main(urls, runs: int, timeout_ms: int):
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True, args=BROWSER_ARGS,
+                                                   executable_path=CHROMIUM_EXECUTABLE_PATH)
+        print(f"{'url':<40}{'mode':<9}{'load':<6}{'ms':>8}{'requests':>10}{'KB':>9}{'cached':>8}{'blocked':>9}")
+        for url in urls:
+            for mode in MODES:
+                results = [await run_mode(browser, mode, url, timeout_ms) for _ in range(runs)]
+                for load_kind in ("cold", "warm"):
+                    loads = [result[load_kind] for result in results]
+                    print(f"{url[:39]:<40}{mode:<9}{load_kind:<6}"
+                          f"{statistics.median(entry['load_ms'] for entry in loads):>8.0f}"
+                          f"{statistics.median(entry['requests'] for entry in loads):>10.0f}"
+                          f"{statistics.median(entry['bytes'] for entry in loads) / 1024:>9.0f}"
+                          f"{statistics.median(entry['cached'] for entry in loads):>8.0f}"
+                          f"{statistics.median(result['blocked'] for result in results):>9.0f}")
+        await browser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", nargs="+", default=["https://www.bbc.com", "https://en.wikipedia.org/wiki/Paris",
+                                                      "https://www.theverge.com"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=int, default=30000, help="per load, in ms")
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.runs, args.timeout))
@@ -0,0 +1,108 @@
+"""
+A deterministic chat model that plays a scripted journey, so the graph can run without Gemini.
+
+Agent steps pick their target from the bounding boxes in the observation by matching the encoded
+`id|type|aria-label|text` lines, the plan, answer and memory summaries come back as fixed text.
+Replies are returned as tool calls when the model is bound to a schema, like Gemini does.
+"""
+import asyncio
+import re
+from dataclasses import dataclass
+from typing_extensions import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+BBOX_LINE = re.compile(r"^(\d+)\|.*$", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class Step:
+    action: str
+    pattern: Optional[str] = None  # regex matched against the encoded bbox lines, first match is the target
+    content: Optional[str] = None
+
+
+# Journeys over benchmarks.fixture_site, each ending with Respond
+JOURNEYS = {
+    "search": [
+        Step("Type", r"\|(input|textarea)\|.*Search", "apple stock price news today"),
+        Step("Click", r"\|a\|.*Reuters"),
+        Step("Scroll", "WINDOW", "down"),
+        Step("Respond"),
+    ],
+    "dashboard": [
+        Step("Type", r"\|(input|textarea)\|.*Filter", "orders"),
+        Step("Click", r"View orders"),
+        Step("Scroll", "WINDOW", "down"),
+        Step("Respond"),
+    ],
+}
+
+START_PATHS = {"search": "/", "dashboard": "/dashboard"}
+
+
+def message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class ScriptedChatModel(BaseChatModel):
+    journey: List[Step]
+    latency_ms: float = 0
+    position: int = 0
+    misses: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Sync callers (invoke outside the graph) get the same scripted replies, the latency included
+        return asyncio.run(self._agenerate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, tools=None,
+                         **kwargs) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        tool = tools[0]["function"]["name"] if tools else None
+        if tool == "MasterPlanState":
+            message = self._tool_call(tool, {"plan": [f"{step.action} {step.content or step.pattern or ''}".strip()
+                                                      for step in self.journey]})
+        elif tool == "AgentOutput":
+            message = self._tool_call(tool, self._next_step(messages))
+        elif "expert at answering" in message_text(messages[0]):
+            message = AIMessage(content="1. Steps: followed the scripted journey\n2. Final Answer: done")
+        else:
+            message = AIMessage(content="Summary of the earlier entries.")
+        input_tokens = sum(len(message_text(m)) for m in messages) // 4
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": 20, "total_tokens": input_tokens + 20}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _next_step(self, messages: List[BaseMessage]) -> dict:
+        step = self.journey[min(self.position, len(self.journey) - 1)]
+        self.position += 1
+        if step.action not in ("Click", "Type"):
+            target = step.pattern if step.action == "Scroll" else None
+            return {"thought": f"Scripted step {self.position}", "action": step.action, "target": target,
+                    "content": step.content}
+
+        observation = next((message_text(m) for m in reversed(messages) if "Bounding Boxes" in message_text(m)), "")
+        match = next((line for line in BBOX_LINE.finditer(observation) if re.search(step.pattern, line.group(0))),
+                     None)
+        if match is None:
+            # Nothing to act on, the run stops here and the miss fails the benchmark
+            self.misses.append(f"{step.action} {step.pattern}")
+            return {"thought": f"No element matches {step.pattern}", "action": "Respond"}
+        return {"thought": f"Scripted step {self.position}", "action": step.action, "target": match.group(1),
+                "content": step.content}
+
+    @staticmethod
+    def _tool_call(name: str, args: Any) -> AIMessage:
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": name, "type": "tool_call"}])
@@ -0,0 +1,65 @@
+"""
+Time the objects an agent step needs before it can call the model, built per step as the nodes used
+to (prompt template, Gemini client with its async transport, structured output binding, mark_page.js
+read from disk) against taking them from the warmed resource registry.
+
+No request is sent, any GOOGLE_API_KEY value works.
+
+Run from the backend folder:
+    python -m benchmarks.step_overhead_benchmark --steps 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.graph_state import AgentOutput
+from src.llm import DEFAULT_MODEL
+from src.resources import resources
+from src.utilities import mark_page_path, mark_page_script
+import src.nodes.llm_call_node as llm_call_node
+
+
+def per_step_objects():
+    prompt = llm_call_node.build_prompt()
+    llm = ChatGoogleGenerativeAI(model=DEFAULT_MODEL, temperature=0.7, max_retries=3)
+    llm.async_client
+    structured = llm.with_structured_output(AgentOutput, include_raw=True)
+    with open(mark_page_path) as f:
+        script = f.read()
+    return prompt, structured, script
+
+
+def registry_objects():
+    return resources.get("llm_call_prompt"), resources.get("agent_output_llm"), mark_page_script
+
+
+def time_steps(build, steps: int) -> list:
+    times = []
+    for _ in range(steps):
+        start = time.perf_counter()
+        build()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+async def main(steps: int):
+    start = time.perf_counter()
+    await resources.warm()
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{'':<16}{'median ms':>10}{'p95 ms':>9}{'total ms':>10}")
+    for name, build in (("per step", per_step_objects), ("registry", registry_objects)):
+        times = sorted(time_steps(build, steps))
+        print(f"{name:<16}{statistics.median(times):>10.3f}{times[int(len(times) * 0.95) - 1]:>9.3f}"
+              f"{sum(times):>10.1f}")
+    print(f"\nOne-off warm-up at startup: {warm_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.steps))
@@ -0,0 +1,158 @@
+"""
+A browser worker: owns a BrowserPool and runs the agent graph for the sessions placed on it, taking
+its commands from the broker so the API can run as many stateless uvicorn workers as there are cores.
+
+Start one or more per node next to the API (ROVER_BROWSER_MODE=remote), from the backend folder:
+    python browser_worker.py
+"""
+import asyncio
+import os
+import socket
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.agent_runner import AgentRunner, initial_state
+from src.broker import (BROKER_POLL_SECONDS, END_EVENT, WORKER_HEARTBEAT_SECONDS, Broker, Command,
+                        command_stream, session_stream)
+from src.browser_pool import BrowserPool, PoolExhaustedError, SessionNotFoundError
+from src.build_graph import build_graph
+from src.cache import cache_stats
+from src.checkpointer import open_checkpointer
+from src.event_bus import event_bus
+from src.resources import resources
+from src.scheduler import run_scheduler
+from src.tracing import metrics
+
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# How often finished commands and events past BROKER_RETENTION_SECONDS are deleted
+BROKER_PRUNE_SECONDS = 60
+
+
+class BrowserWorker:
+    def __init__(self, broker: Broker, worker_id: str = WORKER_ID):
+        self.broker = broker
+        self.worker_id = worker_id
+        self.pool = BrowserPool.from_env()
+        self.runner = AgentRunner(self.pool)
+        self.capacity = self.pool.max_browsers * self.pool.contexts_per_browser
+        self.runs = {}  # command id -> task of a running query or resume
+        # A closed session's event history and subscriptions go with it
+        self.pool.on_session_closed(event_bus.close_session)
+        self.pool.on_session_closed(self._session_closed)
+
+    async def serve(self):
+        await self.pool.start()
+        await self.broker.register_worker(self.worker_id, self.capacity)
+        print(f"[browser_worker] {self.worker_id} serving {self.capacity} sessions")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            async with open_checkpointer() as checkpointer:
+                self.runner.graph = build_graph().compile(checkpointer=checkpointer)
+                await resources.warm()
+                while True:
+                    commands = await self.broker.claim(self.worker_id)
+                    for command in commands:
+                        self._dispatch(command)
+                    if not commands:
+                        await asyncio.sleep(BROKER_POLL_SECONDS)
+        finally:
+            heartbeat.cancel()
+            for task in self.runs.values():
+                task.cancel()
+            await self.broker.remove_worker(self.worker_id)
+            await self.pool.close()
+
+    async def _heartbeat(self):
+        last_prune = 0.0
+        while True:
+            await self.broker.heartbeat(self.worker_id, self.pool.stats()["sessions"], self.capacity)
+            # The API serves /metrics, /cache/stats and /scheduler/stats from these in remote mode
+            await self.broker.report_stats(self.worker_id, {
+                "browsers": self.pool.stats(), "cache": cache_stats(), "scheduler": run_scheduler.stats(),
+                "metrics": metrics.dump()})
+            if time.monotonic() - last_prune > BROKER_PRUNE_SECONDS:
+                last_prune = time.monotonic()
+                await self.broker.prune()
+            await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+
+    def _dispatch(self, command: Command):
+        if command.kind == "cancel":
+            task = self.runs.get(command.payload["command_id"])
+            if task is not None:
+                task.cancel()
+            asyncio.create_task(self.broker.finish(command.id, {}))
+        elif command.kind in ("query", "resume"):
+            task = asyncio.create_task(self._run(command))
+            self.runs[command.id] = task
+            task.add_done_callback(lambda _: self.runs.pop(command.id, None))
+        else:
+            asyncio.create_task(self._reply(command))
+
+    async def _reply(self, command: Command):
+        try:
+            if command.kind == "setup":
+                session = await self.pool.create_session(command.payload["url"])
+                await self.broker.add_session(session.session_id, self.worker_id)
+                asyncio.create_task(self._forward_events(session.session_id))
+                result = {"session_id": session.session_id}
+            elif command.kind == "cleanup":
+                await self.pool.close_session(command.payload["session_id"])
+                result = {}
+            else:
+                raise ValueError(f"Unknown command '{command.kind}'")
+            await self.broker.finish(command.id, result)
+        except PoolExhaustedError as e:
+            await self.broker.finish(command.id, {"error": str(e), "status": 503}, failed=True)
+        except SessionNotFoundError as e:
+            await self.broker.finish(command.id, {"error": f"Unknown browser session: {e}", "status": 404},
+                                     failed=True)
+        except Exception as e:
+            print(f"[browser_worker] {command.kind} failed: {e}")
+            await self.broker.finish(command.id, {"error": str(e), "status": 500}, failed=True)
+
+    async def _run(self, command: Command):
+        payload = command.payload
+        stream = command_stream(command.id)
+        if command.kind == "query":
+            events = self.runner.stream(initial_state(payload["query"]), payload["session_id"], payload["thread_id"],
+                                        bypass_cache=payload.get("bypass_cache", False),
+                                        tenant=payload.get("tenant", ""))
+        else:
+            events = self.runner.stream(None, payload["session_id"], payload["thread_id"],
+                                        resume_url=payload.get("resume_url", ""), tenant=payload.get("tenant", ""))
+        ended = False
+        try:
+            async for event_type, content in events:
+                await self.broker.publish(stream, event_type, content)
+                ended = event_type == END_EVENT
+        except Exception as e:
+            # AgentRunner.stream already sent the error event
+            print(f"[browser_worker] {command.kind} {command.id} failed: {e}")
+        finally:
+            await events.aclose()
+            if not ended:
+                await self.broker.publish(stream, END_EVENT, "Stream completed")
+            await self.broker.finish(command.id, {})
+
+    async def _forward_events(self, session_id: str):
+        """Copy the session's browser events from the local event bus to the broker until it closes."""
+        stream = session_stream(session_id)
+        try:
+            async for event in event_bus.subscribe(session_id):
+                await self.broker.publish(stream, event.type, event.data)
+        finally:
+            await self.broker.publish(stream, END_EVENT, "Session closed")
+
+    def _session_closed(self, session_id: str):
+        # Explicit cleanups and idle evictions both land here
+        asyncio.create_task(self.broker.remove_session(session_id))
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(BrowserWorker(Broker()).serve())
+    except KeyboardInterrupt:
+        pass
@@ -1,18 +1,64 @@
-from fastapi import FastAPI, HTTPException, APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, APIRouter, Header, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import json
-from typing_extensions import Dict, Any
-import asyncio
-import time
+from typing_extensions import Optional
+import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from src.request_validate import QueryRequest, BrowserSetupRequest
-from src.utilities import setup_browser_2
+from src.agent_runner import AgentRunner, initial_state
+from src.scheduler import run_scheduler
+from src.request_validate import QueryRequest, BrowserSetupRequest, CleanupRequest, ResumeRequest
+from src.broker import ROVER_BROWSER_MODE, Broker, CommandFailedError, RemoteBrowsers
+from src.browser_pool import BrowserPool, SessionNotFoundError, PoolExhaustedError
 from src.build_graph import build_graph
+from src.cache import cache_stats
+from src.checkpointer import open_checkpointer
+from src.event_bus import event_bus
+from src.resources import resources
+from src.sse import sse_frame, sse_response
+from src.tracing import Metrics, metrics
+
+load_dotenv()
+
+# Pool of warm browsers, each session gets its own isolated context
+browser_pool = BrowserPool.from_env()
+# A closed session's event history and subscriptions go with it
+browser_pool.on_session_closed(event_bus.close_session)
+
+# With remote browsers this process holds no browser state, browser_worker.py processes own the
+# sessions and any API worker can serve any of them
+remote_browsers = RemoteBrowsers(Broker()) if ROVER_BROWSER_MODE == "remote" else None
+
+# Runs the graph on this process's browsers, and reads checkpoints to resume in either mode
+agent_runner = AgentRunner(browser_pool)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if remote_browsers is None:
+        await browser_pool.start()
+    try:
+        # Remote mode still reads checkpoints to resume, so it must share CHECKPOINT_DB with the workers
+        async with open_checkpointer() as checkpointer:
+            agent_runner.graph = build_graph().compile(checkpointer=checkpointer)
+            # Prompts, model clients and encoders are built now rather than on the first query
+            await resources.warm()
+            yield
+    finally:
+        if remote_browsers is None:
+            await browser_pool.close()
 
 
-app = FastAPI(title="Web Rover Chat Bot")
+async def check_session(session_id: str):
+    """Raise SessionNotFoundError unless the session is live here or on a browser worker."""
+    if remote_browsers is not None:
+        await remote_browsers.get_session(session_id)
+    else:
+        browser_pool.get_session(session_id)
+
+
+app = FastAPI(title="Web Rover Chat Bot", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,81 +69,52 @@ app.add_middleware(
 )
 router = APIRouter()
 
-load_dotenv()
-
-# Global variable to store browser session
-browser_session: Dict[str, Any] = {
-    "playwright": None,
-    "browser": None,
-    "page": None
-}
-
-# Global queue for browser events
-browser_events = asyncio.Queue()
-
-langgraph_app = build_graph().compile()
-
-
 @router.post("/setup-browser")
 async def setup_browser(request: BrowserSetupRequest):
     try:
-        # Clear any existing session
-        if browser_session["playwright"]:
-            await cleanup_browser()
-
-        # Setup new browser session
-        playwright, browser, page = await setup_browser_2(request.url)
-
-        # Store session info
-        browser_session.update({
-            "playwright": playwright,
-            "browser": browser,
-            "page": page
-        })
-
-        return {"status": "success", "message": "Browser setup complete"}
+        # Hand out a fresh context on one of the warm browsers
+        pool = remote_browsers or browser_pool
+        session = await pool.create_session(request.url)
+
+        return {"status": "success", "message": "Browser setup complete", "session_id": session.session_id}
+    except PoolExhaustedError as e:
+        raise HTTPException(status_code=503, detail=f"No browser capacity available: {str(e)}")
+    except CommandFailedError as e:
+        raise HTTPException(status_code=e.status, detail=f"Failed to setup browser: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to setup browser: {str(e)}")
 
 
 @router.post("/cleanup")
-async def cleanup_browser():
+async def cleanup_browser(request: CleanupRequest):
     try:
-        if browser_session["page"]:
-            await browser_session["page"].close()
-        if browser_session["browser"]:
-            await browser_session["browser"].close()
-        if browser_session["playwright"]:
-            await browser_session["playwright"].stop()
-
-        # Reset session
-        browser_session.update({
-            "playwright": None,
-            "browser": None,
-            "page": None
-        })
+        await (remote_browsers or browser_pool).close_session(request.session_id)
 
         return {"status": "success", "message": "Browser cleanup complete"}
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown browser session: {request.session_id}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to cleanup browser: {str(e)}")
 
 
-async def emit_browser_event(event_type: str, data: Dict[str, Any]):
-    await browser_events.put({
-        "type": event_type,
-        "data": data
-    })
+@router.get("/browser-events")
+async def browser_events_endpoint(session_id: str, last_event_id: Optional[str] = Header(None)):
+    try:
+        await check_session(session_id)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown browser session: {session_id}")
 
+    # EventSource sends the id of the last event it saw when it reconnects
+    replay_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
 
-@router.get("/browser-events")
-async def browser_events_endpoint():
     async def event_generator():
-        while True:
-            try:
-                event = await browser_events.get()
-                yield f"data: {json.dumps(event)}\n\n"
-            except asyncio.CancelledError:
-                break
+        if remote_browsers is not None:
+            async for event_id, event_type, data in remote_browsers.events(session_id, replay_after):
+                yield sse_frame(event_type, data, event_id)
+            return
+        async for event in event_bus.subscribe(session_id, replay_after):
+            # Keep the bus ids so Last-Event-ID refers to the session's history
+            yield sse_frame(event.type, event.data, event.id)
 
     return StreamingResponse(
         event_generator(),
@@ -105,94 +122,93 @@ async def browser_events_endpoint():
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
         }
     )
 
 
-async def stream_agent_response(query: str, page):
-    try:
-        initial_state = {
-            "input_str": query,
-            "page": page,
-            "image": "",
-            "master_plan": None,
-            "bboxes": [],
-            "actions_taken": [],
-            "action": None,
-            "last_action": "",
-            "notes": [],
-            "answer": ""
-        }
-
-        # Keep track of last event for potential retries
-        last_event = None
-        retry_count = 0
-        max_retries = 3
-
-        async for event in langgraph_app.astream(
-                initial_state,
-                {"recursion_limit": 400}
-        ):
-            try:
-                # Send periodic keepalive to prevent timeout
-                yield f"data: {{\n  \"type\": \"keepalive\",\n  \"timestamp\": {time.time()}\n}}\n\n"
-
-                if isinstance(event, dict):
-                    last_event = event
-
-                    if "parse_action_node" in event:
-                        action = event["parse_action_node"]["action"]
-                        thought = event["parse_action_node"]["notes"][-1]
-
-                        # Ensure proper encoding and escaping of JSON
-                        thought_json = json.dumps(thought, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"thought\",\n  \"content\": {thought_json}\n}}\n\n"
-
-                        if isinstance(action, dict):
-                            action_json = json.dumps(action, ensure_ascii=False)
-                            yield f"data: {{\n  \"type\": \"action\",\n  \"content\": {action_json}\n}}\n\n"
-
-                            # Handle browser events
-                            action_type = action.get("action", "")
-                            if action_type == "goto":
-                                await emit_browser_event("navigation", {
-                                    "url": action["args"],
-                                    "status": "loading"
-                                })
-
-                    if "answer_node" in event:
-                        answer = event["answer_node"]["answer"]
-                        answer_json = json.dumps(answer, ensure_ascii=False)
-                        yield f"data: {{\n  \"type\": \"final_answer\",\n  \"content\": {answer_json}\n}}\n\n"
-
-                    # Reset retry count on successful event
-                    retry_count = 0
-            except Exception as e:
-                print(f"Error processing event: {str(e)}")
-                retry_count += 1
-                if retry_count <= max_retries and last_event:
-                    # Retry last event
-                    yield f"data: {{\n  \"type\": \"retry\",\n  \"content\": \"Retrying last action...\"\n}}\n\n"
-                    continue
-                else:
-                    raise e
-
-    except Exception as e:
-        error_json = json.dumps(str(e), ensure_ascii=False)
-        yield f"data: {{\n  \"type\": \"error\",\n  \"content\": {error_json}\n}}\n\n"
-        raise e
-    finally:
-        # Ensure proper stream closure
-        yield f"data: {{\n  \"type\": \"end\",\n  \"content\": \"Stream completed\"\n}}\n\n"
+def check_queue():
+    # Turn runs away before streaming while this process schedules them, browser workers do it in the stream
+    if remote_browsers is None and run_scheduler.waiting() >= run_scheduler.max_queue:
+        raise HTTPException(status_code=429, detail="Too many queued runs, try again later")
 
 
 @router.post("/query")
-async def query_agent(request: QueryRequest):
-    if not browser_session["page"]:
+async def query_agent(request: QueryRequest, http_request: Request, x_tenant_id: str = Header("")):
+    try:
+        await check_session(request.session_id)
+    except SessionNotFoundError:
         raise HTTPException(status_code=400, detail="Browser not initialized. Call /setup-browser first")
-
-    return StreamingResponse(stream_agent_response(request.query, browser_session["page"]),
-                             media_type="text/event-stream")
+    check_queue()
+
+    thread_id = uuid.uuid4().hex
+    if remote_browsers is not None:
+        events = remote_browsers.run(request.session_id, "query", {"query": request.query, "thread_id": thread_id,
+                                                                   "bypass_cache": request.bypass_cache,
+                                                                   "tenant": x_tenant_id})
+    else:
+        events = agent_runner.stream(initial_state(request.query), request.session_id, thread_id,
+                                     bypass_cache=request.bypass_cache, tenant=x_tenant_id)
+    return sse_response(events, http_request)
+
+
+@router.post("/query/{thread_id}/resume")
+async def resume_query(thread_id: str, request: ResumeRequest, http_request: Request,
+                       x_tenant_id: str = Header("")):
+    try:
+        await check_session(request.session_id)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=400, detail="Browser not initialized. Call /setup-browser first")
+    check_queue()
+
+    snapshot = await agent_runner.graph.aget_state({"configurable": {"thread_id": thread_id}})
+    if not snapshot.values:
+        raise HTTPException(status_code=404, detail=f"No checkpoint found for thread {thread_id}")
+
+    if not snapshot.next:
+        # The run already finished, replay its answer instead of starting over
+        async def completed_response():
+            yield "action", {"action": "Respond", "args": None}
+            yield "final_answer", snapshot.values.get("answer", "")
+            yield "end", "Stream completed"
+
+        return sse_response(completed_response(), http_request)
+
+    resume_url = snapshot.values.get("current_url", "")
+    if remote_browsers is not None:
+        events = remote_browsers.run(request.session_id, "resume", {"thread_id": thread_id, "resume_url": resume_url,
+                                                                    "tenant": x_tenant_id})
+    else:
+        events = agent_runner.stream(None, request.session_id, thread_id, resume_url=resume_url,
+                                     tenant=x_tenant_id)
+    return sse_response(events, http_request)
+
+
+# In remote mode the runs happen on the browser workers, these report what each live worker last sent
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    if remote_browsers is not None:
+        return {worker_id: stats["cache"] for worker_id, stats in (await remote_browsers.worker_stats()).items()}
+    return cache_stats()
+
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    if remote_browsers is not None:
+        return {worker_id: stats["scheduler"] for worker_id, stats in (await remote_browsers.worker_stats()).items()}
+    return run_scheduler.stats()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    if remote_browsers is not None:
+        # Summed over the workers, one scrape of the API covers them all
+        workers = await remote_browsers.worker_stats()
+        text = Metrics.merged([stats["metrics"] for stats in workers.values()]).render()
+    else:
+        text = metrics.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
 app.include_router(router=router)
 
@@ -0,0 +1,105 @@
+import os
+import re
+from typing_extensions import Any, Dict, Optional
+
+from pydantic import ValidationError
+
+from src.graph_state import ACTION_VERBS, Action, AgentOutput
+
+# Replies in a row that may be re-asked on the same observation before the page is observed again
+LLM_PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "2"))
+
+# Spellings models use for each verb, matched case-insensitively
+VERB_ALIASES = {
+    "click": "Click", "type": "Type", "scroll": "Scroll", "wait": "Wait", "goback": "GoBack",
+    "back": "GoBack", "google": "Google", "respond": "Respond", "answer": "Respond", "research": "Research",
+    "read": "Read",
+}
+
+THOUGHT_PREFIX = re.compile(r"^\W*thought\W*:", re.IGNORECASE)
+# An "Action:" that starts a line, the usual layout
+ACTION_LINE_PATTERN = re.compile(r"^\W*action\W*:[ \t]*(.*)$", re.IGNORECASE | re.MULTILINE)
+# Any "action:", for replies that put thought and action on one line
+ACTION_PATTERN = re.compile(r"\baction\W*:[ \t]*(.*)$", re.IGNORECASE | re.MULTILINE)
+# "Click [3]", "type 5; text", "Scroll [WINDOW]: down", "Go Back", "**Respond**"
+VERB_PATTERN = re.compile(
+    r"^\W*(go\s*back|[a-z]+)\s*(?:\[\s*(\d+|window)\s*\]|(\d+|window)\b)?\s*[;:,\-]?\s*(.*)$",
+    re.IGNORECASE | re.DOTALL)
+
+
+class ActionParseError(ValueError):
+    """Raised when a model reply holds no usable action; the message is shown to the model on the re-ask."""
+
+
+def last_match(pattern: re.Pattern, text: str) -> Optional[re.Match]:
+    """Last match of `pattern`, trying every start so one on the same line as another is found too."""
+    match, position = None, 0
+    while (found := pattern.search(text, position)) is not None:
+        match, position = found, found.start() + 1
+    return match
+
+
+def parse_text_output(text: str) -> AgentOutput:
+    """
+    Tolerant parser for replies that came back as plain `Thought: ... Action: ...` text instead of
+    a tool call: accepts missing brackets, other separators, markdown and verb spellings. The last
+    "Action:" wins, so the word in the thought is not taken for the action:
+
+    >>> parse_text_output("Thought: I'll pick my next action: scroll down. Action: Click [3]").action
+    'Click'
+    >>> parse_text_output("Thought: the next action: scroll down\\nAction: Click [3]").target
+    '3'
+    """
+    action_match = last_match(ACTION_LINE_PATTERN, text) or last_match(ACTION_PATTERN, text)
+    if action_match is None:
+        raise ActionParseError("The reply has no 'Action:' line.")
+    action_line = action_match.group(1).strip().strip("*`")
+    thought = THOUGHT_PREFIX.sub("", text[:action_match.start()].strip()).strip().strip("*").strip()
+
+    verb_match = VERB_PATTERN.match(action_line)
+    verb = VERB_ALIASES.get(re.sub(r"\s+", "", verb_match.group(1)).lower()) if verb_match else None
+    if verb is None:
+        raise ActionParseError(f"Unknown action '{action_line}', expected one of {', '.join(ACTION_VERBS)}.")
+    target = verb_match.group(2) or verb_match.group(3)
+    content = verb_match.group(4).strip().strip("[]").strip() or None
+    if verb == "Scroll" and target is None and content and content.lower() in ("up", "down"):
+        target = "WINDOW"
+    return validate_output({"thought": thought, "action": verb, "target": target, "content": content})
+
+
+def validate_output(payload: Dict[str, Any]) -> AgentOutput:
+    try:
+        return AgentOutput.model_validate(payload)
+    except ValidationError as e:
+        raise ActionParseError("; ".join(error["msg"].removeprefix("Value error, ") for error in e.errors()))
+
+
+def parse_agent_output(payload) -> AgentOutput:
+    """Validate a structured reply (tool call arguments) or fall back to parsing reply text."""
+    if isinstance(payload, AgentOutput):
+        return payload
+    if isinstance(payload, dict):
+        return validate_output(payload)
+    if isinstance(payload, str) and payload.strip():
+        return parse_text_output(payload)
+    raise ActionParseError("The reply was empty.")
+
+
+def to_action(output: AgentOutput) -> Action:
+    """The graph's Action, keeping the `Click [3]` spelling used in histories and the UI."""
+    if output.target is None:
+        return Action(action=output.action, args=output.content)
+    return Action(action=f"{output.action} [{output.target}]", args=output.content, target=output.target)
+
+
+def action_target(action: Action) -> Optional[str]:
+    """Target of an action: the validated field, or the bracketed label of older checkpoints."""
+    if action.get("target"):
+        return action["target"]
+    match = re.search(r"\[\s*(\w+)\s*\]", action.get("action", ""))
+    return match.group(1) if match else None
+
+
+def bbox_id(action: Action) -> Optional[int]:
+    target = action_target(action)
+    return int(target) if target and target.isdigit() else None
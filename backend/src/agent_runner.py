@@ -0,0 +1,219 @@
+from typing_extensions import Any, Dict
+
+from src.browser_pool import BrowserPool, SessionNotFoundError
+from src.cache import answer_cache, answer_key
+from src.event_bus import event_bus
+from src.network_profile import network_stats
+from src.scheduler import RunBudget, SchedulerFullError, run_scheduler
+from src.streaming import JsonStringFieldStream, ThoughtStream, chunk_text
+from src.tracing import RunTrace
+
+
+def initial_state(query: str) -> Dict[str, Any]:
+    return {
+        "input_str": query,
+        "current_url": "",
+        "image": "",
+        "master_plan": None,
+        "bboxes": [],
+        "actions_taken": [],
+        "action": None,
+        "last_action": "",
+        "notes": [],
+        "answer": "",
+        "token_usage": {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0},
+        "fast_path_hit": "",
+        "fast_path_hits": [],
+        "llm_calls_avoided": 0,
+        "research_links": [],
+        "page_text": "",
+        "parse_error": "",
+        "parse_failures": 0,
+        "actions_summary": "",
+        "actions_folded": 0,
+        "notes_summary": "",
+        "notes_folded": 0
+    }
+
+
+class AgentRunner:
+    """
+    Runs the agent graph on the sessions of a browser pool and turns its events into the
+    `(type, content)` pairs the query stream sends. The API process uses it in local browser mode,
+    browser_worker.py in remote mode.
+    """
+
+    def __init__(self, pool: BrowserPool):
+        self.pool = pool
+        # Compiled at startup with the checkpointer so every run can be resumed by its thread id
+        self.graph = None
+
+    async def stream(self, graph_input: Dict[str, Any] | None, session_id: str, thread_id: str,
+                     resume_url: str = "", bypass_cache: bool = False, tenant: str = ""):
+        """
+        Run (or with `graph_input=None`, resume) the checkpointed thread on the session's page.
+        A new query that was answered recently from the same start page is served from the answer cache,
+        any other waits for a run slot of the scheduler first, sending its queue position meanwhile.
+        """
+        try:
+            self.pool.get_session(session_id)
+        except SessionNotFoundError:
+            yield "error", "Browser session expired"
+            return
+
+        # Keep the session leased while the graph runs so idle eviction never closes it mid-query
+        async with self.pool.lease(session_id) as session:
+            page = session.page
+            # Browser events of the run go to the session's channel, until the session closes
+            event_bus.open_session(session_id)
+            # A resumed run may land on a fresh browser, put it back where the run left off
+            if resume_url and page.url != resume_url:
+                await page.goto(resume_url, timeout=60000, wait_until="domcontentloaded")
+
+            # Only fresh runs know the page they started from, resumed ones are never cached
+            cache_key = answer_key(graph_input["input_str"], page.url) if graph_input else None
+            if cache_key and not bypass_cache:
+                cached_answer = answer_cache.get(cache_key)
+                if cached_answer is not None:
+                    print(f"[query] Answer cache hit for: {graph_input['input_str']}")
+                    # The UI shows an answer once the run has responded
+                    yield "action", {"action": "Respond", "args": None}
+                    yield "final_answer", cached_answer
+                    yield "end", "Stream completed"
+                    return
+
+            yield "thread", thread_id
+
+            try:
+                ticket = run_scheduler.enqueue(tenant or session_id)
+            except SchedulerFullError as e:
+                yield "error", str(e)
+                yield "end", "Stream completed"
+                return
+            # Released when the run ends or the client disconnects, queued or not
+            try:
+                async for position in ticket.wait():
+                    yield "queued", {"position": position}
+
+                if graph_input is None:
+                    snapshot = await self.graph.aget_state({"configurable": {"thread_id": thread_id}})
+                    budget = RunBudget.resuming(snapshot.values)
+                else:
+                    budget = RunBudget()
+                # The page travels in the config, never in the checkpointed state
+                config = {
+                    "recursion_limit": 400,
+                    "configurable": {"thread_id": thread_id, "session_id": session_id, "page": page,
+                                     "bypass_cache": bypass_cache, "trace": RunTrace(thread_id), "budget": budget}
+                }
+                async for event in self.run(graph_input, config):
+                    event_type, content = event
+                    # A run cut short by its budget answers with what it had, never cache that
+                    if event_type == "final_answer" and cache_key and content and not budget.exceeded:
+                        answer_cache.set(cache_key, content)
+                    yield event
+            finally:
+                run_scheduler.release(ticket)
+
+    async def run(self, graph_input: Dict[str, Any] | None, config: Dict[str, Any]):
+        trace = config["configurable"].get("trace")
+        budget = config["configurable"].get("budget")
+        try:
+            # Keep track of last event for potential retries
+            last_event = None
+            retry_count = 0
+            max_retries = 3
+            thought_stream = ThoughtStream()
+            tool_thought_stream = JsonStringFieldStream("thought")
+
+            async for event in self.graph.astream_events(graph_input, config, version="v2"):
+                try:
+                    kind = event["event"]
+                    node = event.get("metadata", {}).get("langgraph_node")
+
+                    # Forward model tokens as soon as they arrive
+                    if kind == "on_chat_model_stream":
+                        chunk = event["data"]["chunk"]
+                        text = chunk_text(chunk)
+                        if node == "llm_call_node":
+                            # The thought arrives inside the tool call arguments, or as text when the model replied in text
+                            tool_args = "".join(part.get("args") or "" for part in chunk.tool_call_chunks)
+                            delta = tool_thought_stream.feed(tool_args) if tool_args else thought_stream.feed(text)
+                            if delta:
+                                yield "thought_delta", delta
+                        elif node == "answer_node" and text:
+                            yield "answer_delta", text
+                        continue
+
+                    # Everything below reacts to a graph node itself starting or finishing
+                    if event.get("name") != node:
+                        continue
+                    if kind == "on_chain_start" and node == "llm_call_node":
+                        thought_stream = ThoughtStream()
+                        tool_thought_stream = JsonStringFieldStream("thought")
+                    output = event.get("data", {}).get("output")
+                    if kind != "on_chain_end" or not isinstance(output, dict):
+                        continue
+
+                    last_event = event
+
+                    if node == "fast_path_node" and output.get("fast_path_hit"):
+                        yield "fast_path", output["fast_path_hit"]
+
+                    if node in ("parse_action_node", "fast_path_node", "read_source_node"):
+                        action = output.get("action")
+                        notes = output.get("notes")
+
+                        if notes:
+                            yield "thought", notes[-1]
+
+                        if isinstance(action, dict) and action.get("action") == "retry":
+                            yield "retry", action["args"]
+                        elif isinstance(action, dict):
+                            yield "action", action
+
+                    # Time each action spent waiting on the page versus doing work
+                    if output.get("step_latency"):
+                        yield "latency", output["step_latency"]
+
+                    # Prompt size of each model step, to watch the memory window hold it flat
+                    if output.get("prompt_size"):
+                        yield "prompt_size", output["prompt_size"]
+
+                    if node == "answer_node":
+                        # The run was cut short, the answer is built from what it found so far
+                        if budget is not None and budget.exceeded:
+                            yield "budget_exceeded", budget.exceeded
+                        yield "final_answer", output["answer"]
+
+                    # Reset retry count on successful event
+                    retry_count = 0
+                except Exception as e:
+                    print(f"Error processing event: {str(e)}")
+                    retry_count += 1
+                    if retry_count <= max_retries and last_event:
+                        # Retry last event
+                        yield "retry", "Retrying last action..."
+                        continue
+                    else:
+                        raise e
+
+            # Requests the session's network profile blocked so far and the bytes that saved
+            page = config["configurable"].get("page")
+            stats = network_stats(page.context) if page is not None else None
+            if stats is not None:
+                yield "network", stats.as_dict()
+
+            # Where the run's time, tokens and bytes went, per node and phase
+            if trace is not None:
+                yield "metrics", trace.finish()
+
+        except Exception as e:
+            yield "error", str(e)
+            raise e
+        finally:
+            # Failed runs still count in /metrics
+            if trace is not None and not trace.finished:
+                trace.finish()
+            # Ensure proper stream closure
+            yield "end", "Stream completed"
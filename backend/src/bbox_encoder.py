@@ -0,0 +1,108 @@
+import os
+import re
+from typing_extensions import List, Optional
+
+from src.graph_state import Bbox, MasterPlanState
+
+BBOX_TEXT_LIMIT = int(os.getenv("BBOX_TEXT_LIMIT", "80"))
+BBOX_TOKEN_BUDGET = int(os.getenv("BBOX_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4
+
+# Form controls are what most steps act on, so they win ties against plain links
+TYPE_PRIORITY = {"input": 1.0, "textarea": 1.0, "select": 0.8, "button": 0.5}
+
+STOP_WORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "click", "type", "link", "page",
+    "what", "when", "where", "which", "who", "how", "you", "your", "are", "was", "not", "then", "have",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def terms(text: str) -> set:
+    return {word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 2 and word not in STOP_WORDS}
+
+
+def normalize_text(text: str, limit: int = BBOX_TEXT_LIMIT) -> str:
+    text = " ".join(text.split())
+    if len(text) > limit:
+        text = text[:limit - 1].rstrip() + "…"
+    return text.replace("|", "/")
+
+
+def dedupe_bboxes(bboxes: List[Bbox]) -> List[Bbox]:
+    """markPage() emits one entry per client rect; keep the first rect of each id."""
+    seen, unique = set(), []
+    for bbox in bboxes:
+        if bbox["id"] not in seen:
+            seen.add(bbox["id"])
+            unique.append(bbox)
+    return unique
+
+
+def encode_bbox(bbox: Bbox, text_limit: int = BBOX_TEXT_LIMIT) -> str:
+    """Terse line for one element: `id|type|aria-label|text`, omitting an aria-label equal to the text."""
+    text = normalize_text(bbox.get("text", ""), text_limit)
+    aria = normalize_text(bbox.get("ariaLabel", ""), text_limit)
+    if aria == text:
+        aria = ""
+    return f"{bbox['id']}|{bbox.get('type', '')}|{aria}|{text}"
+
+
+def plan_steps(master_plan) -> List[str]:
+    """Steps of the latest plan, whether it was checkpointed as a model or a plain dict."""
+    if not master_plan:
+        return []
+    plan = master_plan[-1] if isinstance(master_plan, list) else master_plan
+    return plan.plan if isinstance(plan, MasterPlanState) else plan.get("plan", [])
+
+
+def current_plan_step(master_plan, steps_taken: int) -> str:
+    """
+    Best guess at the plan step being worked on: the plan is not tracked step by step, so assume one
+    action per step. It is only used to rank elements, never shown to the model.
+    """
+    steps = plan_steps(master_plan)
+    if not steps:
+        return ""
+    return steps[min(steps_taken, len(steps) - 1)]
+
+
+def relevance(bbox: Bbox, query_terms: set, step_terms: set) -> float:
+    words = terms(f"{bbox.get('text', '')} {bbox.get('ariaLabel', '')}")
+    return (2 * len(words & query_terms) + len(words & step_terms)
+            + TYPE_PRIORITY.get(bbox.get("type", ""), 0))
+
+
+def encode_bboxes(bboxes: List[Bbox], query: str = "", plan_step: str = "",
+                  token_budget: Optional[int] = BBOX_TOKEN_BUDGET, text_limit: int = BBOX_TEXT_LIMIT) -> str:
+    """
+    Serialize bboxes for the prompt, one element per line in id order.
+
+    When the lines do not fit in `token_budget`, the elements most relevant to the query and the
+    current plan step are kept and the rest are counted in a trailing note.
+    """
+    unique = dedupe_bboxes(bboxes)
+    lines = {bbox["id"]: encode_bbox(bbox, text_limit) for bbox in unique}
+
+    header = "id|type|aria-label|text"
+    total_chars = len(header) + sum(len(line) + 1 for line in lines.values())
+    if token_budget is None or total_chars // CHARS_PER_TOKEN <= token_budget:
+        return "\n".join([header, *lines.values()])
+
+    query_terms, step_terms = terms(query), terms(plan_step)
+    ranked = sorted(unique, key=lambda bbox: (-relevance(bbox, query_terms, step_terms), bbox["id"]))
+
+    # The header and the omitted note count against the budget too, the note at its longest
+    note_chars = len(f"({len(lines)} less relevant elements omitted)") + 1
+    kept, budget_chars = set(), token_budget * CHARS_PER_TOKEN - len(header) - note_chars
+    for bbox in ranked:
+        cost = len(lines[bbox["id"]]) + 1
+        if cost > budget_chars:
+            continue
+        kept.add(bbox["id"])
+        budget_chars -= cost
+
+    body = [line for bbox_id, line in lines.items() if bbox_id in kept]
+    omitted = len(lines) - len(kept)
+    return "\n".join([header, *body, f"({omitted} less relevant elements omitted)"])
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing_extensions import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from src.browser_pool import PoolExhaustedError, SessionNotFoundError
+
+# local: this process owns the browsers. remote: browser_worker.py processes own them and API
+# workers reach them through the broker, so any number of API workers can serve a session.
+ROVER_BROWSER_MODE = os.getenv("ROVER_BROWSER_MODE", "local")
+BROKER_DB = os.getenv("BROKER_DB", "broker.sqlite")
+BROKER_POLL_SECONDS = float(os.getenv("BROKER_POLL_SECONDS", "0.05"))
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "2"))
+# A worker silent for this long is considered dead, its sessions are gone with it
+WORKER_TIMEOUT_SECONDS = float(os.getenv("WORKER_TIMEOUT_SECONDS", "10"))
+# Finished commands and their events are kept this long for late readers
+BROKER_RETENTION_SECONDS = float(os.getenv("BROKER_RETENTION_SECONDS", "3600"))
+BROKER_COMMAND_TIMEOUT_SECONDS = float(os.getenv("BROKER_COMMAND_TIMEOUT_SECONDS", "120"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY, capacity INTEGER NOT NULL, sessions INTEGER NOT NULL, heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, worker_id TEXT NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', result TEXT, created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commands_by_worker ON commands (worker_id, status);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, stream TEXT NOT NULL, type TEXT NOT NULL, content TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_stream ON events (stream, id);
+CREATE TABLE IF NOT EXISTS worker_stats (
+    worker_id TEXT PRIMARY KEY, stats TEXT NOT NULL
+);
+"""
+
+# Last event of a command or session stream
+END_EVENT = "end"
+
+
+class WorkerUnavailableError(PoolExhaustedError):
+    """Raised when no live browser worker has room for a new session."""
+
+
+class CommandFailedError(RuntimeError):
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Command:
+    id: int
+    kind: str  # setup, cleanup, query, resume or cancel
+    payload: Dict[str, Any]
+
+
+def command_stream(command_id: int) -> str:
+    return f"command:{command_id}"
+
+
+def session_stream(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+class Broker:
+    """
+    Routes work between API workers and browser workers through one SQLite file: which worker owns
+    each session, commands queued for a worker, and the events each command or session streams back.
+    Calls run in a thread so the event loop never waits on the database lock.
+    """
+
+    def __init__(self, path: str = BROKER_DB):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _execute(self, fn, *args):
+        with self._lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                                   timeout=30)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.executescript(SCHEMA)
+            return fn(self._connection, *args)
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._execute, fn, *args)
+
+    # Workers
+
+    async def register_worker(self, worker_id: str, capacity: int):
+        def register(db):
+            db.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, 0, ?)", (worker_id, capacity, time.time()))
+            # A restarted worker lost the browsers of its previous life
+            db.execute("DELETE FROM sessions WHERE worker_id = ?", (worker_id,))
+        await self._run(register)
+
+    async def heartbeat(self, worker_id: str, sessions: int, capacity: int):
+        await self._run(lambda db: db.execute(
+            "UPDATE workers SET sessions = ?, capacity = ?, heartbeat = ? WHERE worker_id = ?",
+            (sessions, capacity, time.time(), worker_id)))
+
+    async def remove_worker(self, worker_id: str):
+        def remove(db):
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            db.execute("DELETE FROM sessions WHERE worker_id = ?", (worker_id,))
+            db.execute("DELETE FROM worker_stats WHERE worker_id = ?", (worker_id,))
+        await self._run(remove)
+
+    async def report_stats(self, worker_id: str, stats: Dict[str, Any]):
+        await self._run(lambda db: db.execute("INSERT OR REPLACE INTO worker_stats VALUES (?, ?)",
+                                              (worker_id, json.dumps(stats))))
+
+    async def worker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """The last stats each live worker reported, by worker id."""
+        rows = await self._run(lambda db: db.execute(
+            "SELECT worker_id, stats FROM worker_stats JOIN workers USING (worker_id) WHERE heartbeat > ?",
+            (time.time() - WORKER_TIMEOUT_SECONDS,)).fetchall())
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    async def place_session(self) -> str:
+        """Pick the live worker with the lowest share of its capacity in use and count the session against it."""
+        def place(db):
+            row = db.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat > ? AND sessions < capacity "
+                "ORDER BY CAST(sessions AS REAL) / capacity, sessions LIMIT 1",
+                (time.time() - WORKER_TIMEOUT_SECONDS,)).fetchone()
+            if row is None:
+                raise WorkerUnavailableError("No live browser worker has room for another session")
+            # Until its next heartbeat the worker's count includes sessions still being created
+            db.execute("UPDATE workers SET sessions = sessions + 1 WHERE worker_id = ?", row)
+            return row[0]
+        return await self._run(place)
+
+    # Sessions
+
+    async def add_session(self, session_id: str, worker_id: str):
+        await self._run(lambda db: db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                                              (session_id, worker_id, time.time())))
+
+    async def remove_session(self, session_id: str):
+        await self._run(lambda db: db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)))
+
+    async def session_worker(self, session_id: str) -> Optional[str]:
+        """The live worker holding `session_id`, or None if the session or its worker is gone."""
+        def find(db):
+            row = db.execute(
+                "SELECT sessions.worker_id FROM sessions JOIN workers USING (worker_id) "
+                "WHERE session_id = ? AND heartbeat > ?", (session_id, time.time() - WORKER_TIMEOUT_SECONDS)).fetchone()
+            return row[0] if row else None
+        return await self._run(find)
+
+    # Commands
+
+    async def submit(self, worker_id: str, kind: str, payload: Dict[str, Any]) -> int:
+        return await self._run(lambda db: db.execute(
+            "INSERT INTO commands (worker_id, kind, payload, created) VALUES (?, ?, ?, ?)",
+            (worker_id, kind, json.dumps(payload), time.time())).lastrowid)
+
+    async def claim(self, worker_id: str) -> List[Command]:
+        def claim(db):
+            rows = db.execute("SELECT id, kind, payload FROM commands WHERE worker_id = ? AND status = 'pending' "
+                              "ORDER BY id", (worker_id,)).fetchall()
+            if rows:
+                db.executemany("UPDATE commands SET status = 'running' WHERE id = ?", [(row[0],) for row in rows])
+            return [Command(id=row[0], kind=row[1], payload=json.loads(row[2])) for row in rows]
+        return await self._run(claim)
+
+    async def finish(self, command_id: int, result: Dict[str, Any], failed: bool = False):
+        await self._run(lambda db: db.execute("UPDATE commands SET status = ?, result = ? WHERE id = ?",
+                                              ("failed" if failed else "done", json.dumps(result), command_id)))
+
+    async def result(self, command_id: int, timeout: float = BROKER_COMMAND_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            row = await self._run(lambda db: db.execute("SELECT status, result FROM commands WHERE id = ?",
+                                                        (command_id,)).fetchone())
+            if row and row[0] == "failed":
+                error = json.loads(row[1])
+                raise CommandFailedError(error.get("error", "Browser worker failed"), error.get("status", 500))
+            if row and row[0] == "done":
+                return json.loads(row[1])
+            await asyncio.sleep(BROKER_POLL_SECONDS)
+        raise CommandFailedError(f"Browser worker did not answer within {timeout:.0f}s", 504)
+
+    # Event streams
+
+    async def publish(self, stream: str, event_type: str, content: Any) -> int:
+        return await self._run(lambda db: db.execute(
+            "INSERT INTO events (stream, type, content, created) VALUES (?, ?, ?, ?)",
+            (stream, event_type, json.dumps(content), time.time())).lastrowid)
+
+    async def read(self, stream: str, after_id: int = 0) -> List[Tuple[int, str, Any]]:
+        rows = await self._run(lambda db: db.execute(
+            "SELECT id, type, content FROM events WHERE stream = ? AND id > ? ORDER BY id",
+            (stream, after_id)).fetchall())
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    async def last_id(self, stream: str) -> int:
+        row = await self._run(lambda db: db.execute("SELECT MAX(id) FROM events WHERE stream = ?",
+                                                    (stream,)).fetchone())
+        return row[0] or 0
+
+    async def follow(self, stream: str, after_id: int = 0) -> AsyncIterator[Tuple[int, str, Any]]:
+        """Yield the stream's events as they are published, up to and including its end event."""
+        while True:
+            events = await self.read(stream, after_id)
+            for event in events:
+                yield event
+                if event[1] == END_EVENT:
+                    return
+            if events:
+                after_id = events[-1][0]
+            else:
+                await asyncio.sleep(BROKER_POLL_SECONDS)
+
+    async def prune(self):
+        cutoff = time.time() - BROKER_RETENTION_SECONDS
+        def prune(db):
+            db.execute("DELETE FROM events WHERE created < ?", (cutoff,))
+            db.execute("DELETE FROM commands WHERE created < ? AND status IN ('done', 'failed')", (cutoff,))
+            db.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+            db.execute("DELETE FROM worker_stats WHERE worker_id NOT IN (SELECT worker_id FROM workers)")
+        await self._run(prune)
+
+
+@dataclass
+class RemoteSession:
+    session_id: str
+    worker_id: str
+
+
+class RemoteBrowsers:
+    """The BrowserPool calls an API worker needs, served by whichever browser worker owns the session."""
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+
+    async def create_session(self, url: str) -> RemoteSession:
+        worker_id = await self.broker.place_session()
+        command_id = await self.broker.submit(worker_id, "setup", {"url": url})
+        result = await self.broker.result(command_id)
+        return RemoteSession(session_id=result["session_id"], worker_id=worker_id)
+
+    async def get_session(self, session_id: str) -> RemoteSession:
+        worker_id = await self.broker.session_worker(session_id)
+        if worker_id is None:
+            raise SessionNotFoundError(session_id)
+        return RemoteSession(session_id=session_id, worker_id=worker_id)
+
+    async def close_session(self, session_id: str):
+        session = await self.get_session(session_id)
+        command_id = await self.broker.submit(session.worker_id, "cleanup", {"session_id": session_id})
+        await self.broker.result(command_id)
+
+    async def run(self, session_id: str, kind: str, payload: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """Run a query or resume on the session's worker and yield its `(type, content)` events."""
+        try:
+            session = await self.get_session(session_id)
+        except SessionNotFoundError:
+            yield "error", "Browser session expired"
+            return
+        command_id = await self.broker.submit(session.worker_id, kind, {**payload, "session_id": session_id})
+        ended = False
+        try:
+            async for _, event_type, content in self.broker.follow(command_stream(command_id)):
+                ended = event_type == END_EVENT
+                yield event_type, content
+        finally:
+            if not ended:
+                # The client went away, stop the run instead of driving the browser for nobody
+                await self.broker.submit(session.worker_id, "cancel", {"command_id": command_id})
+
+    async def worker_stats(self) -> Dict[str, Dict[str, Any]]:
+        return await self.broker.worker_stats()
+
+    async def events(self, session_id: str, after_id: Optional[int] = None) -> AsyncIterator[Tuple[int, str, Any]]:
+        """
+        The session's browser events with broker ids, so Last-Event-ID works across API workers. Without
+        `after_id` only new events are sent, like a fresh event bus subscription.
+        """
+        stream = session_stream(session_id)
+        if after_id is None:
+            after_id = await self.broker.last_id(stream)
+        async for event in self.broker.follow(stream, after_id):
+            if event[1] == END_EVENT:
+                return
+            yield event
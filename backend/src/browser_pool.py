@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing_extensions import Callable, Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+from src.utilities import BROWSER_ARGS, CONTEXT_OPTIONS, CHROMIUM_EXECUTABLE_PATH, new_agent_page
+
+
+class SessionNotFoundError(KeyError):
+    """Raised when a session id is unknown or has already been evicted."""
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when every browser in the pool is hosting its maximum number of contexts."""
+
+
+@dataclass
+class BrowserSession:
+    session_id: str
+    context: BrowserContext
+    page: Page
+    browser_index: int
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    leases: int = 0
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class BrowserPool:
+    """
+    A bounded set of warm Chromium processes, each hosting many isolated BrowserContexts.
+
+    Every `/setup-browser` call gets its own context (cookies, storage and tabs are not shared)
+    keyed by a session id, so sessions never tear down each other's pages. Sessions that are not
+    leased by a running query are evicted after `idle_timeout` seconds.
+    """
+
+    def __init__(self, max_browsers: int = 2, contexts_per_browser: int = 16, prelaunch: int = 1,
+                 idle_timeout: float = 600, executable_path: Optional[str] = CHROMIUM_EXECUTABLE_PATH):
+        self.max_browsers = max_browsers
+        self.contexts_per_browser = contexts_per_browser
+        self.prelaunch = min(prelaunch, max_browsers)
+        self.idle_timeout = idle_timeout
+        self.executable_path = executable_path
+
+        self._playwright: Optional[Playwright] = None
+        self._browsers: List[Browser] = []
+        self._sessions: Dict[str, BrowserSession] = {}
+        self._lock = asyncio.Lock()
+        self._reaper: Optional[asyncio.Task] = None
+        self._close_callbacks: List[Callable[[str], None]] = []
+
+    @classmethod
+    def from_env(cls) -> "BrowserPool":
+        return cls(
+            max_browsers=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+            contexts_per_browser=int(os.getenv("BROWSER_POOL_CONTEXTS_PER_BROWSER", "16")),
+            prelaunch=int(os.getenv("BROWSER_POOL_PRELAUNCH", "1")),
+            idle_timeout=float(os.getenv("BROWSER_SESSION_IDLE_TIMEOUT", "600")),
+        )
+
+    async def start(self):
+        self._playwright = await async_playwright().start()
+        for _ in range(self.prelaunch):
+            self._browsers.append(await self._launch_browser())
+        self._reaper = asyncio.create_task(self._evict_idle_sessions())
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for session_id in list(self._sessions):
+            await self.close_session(session_id)
+        for browser in self._browsers:
+            await browser.close()
+        self._browsers = []
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _launch_browser(self) -> Browser:
+        return await self._playwright.chromium.launch(
+            headless=True,
+            args=BROWSER_ARGS,
+            executable_path=self.executable_path
+        )
+
+    async def _pick_browser(self) -> int:
+        """Return the index of the least loaded live browser, launching a new one if all are full."""
+        load = [0] * len(self._browsers)
+        for session in self._sessions.values():
+            load[session.browser_index] += 1
+
+        candidates = [i for i, browser in enumerate(self._browsers)
+                      if browser.is_connected() and load[i] < self.contexts_per_browser]
+        if candidates:
+            return min(candidates, key=lambda i: load[i])
+
+        # Replace a crashed browser before growing the pool
+        for i, browser in enumerate(self._browsers):
+            if not browser.is_connected():
+                self._browsers[i] = await self._launch_browser()
+                return i
+
+        if len(self._browsers) < self.max_browsers:
+            self._browsers.append(await self._launch_browser())
+            return len(self._browsers) - 1
+
+        raise PoolExhaustedError(f"All {self.max_browsers} browsers are hosting "
+                                 f"{self.contexts_per_browser} sessions")
+
+    async def create_session(self, url: str) -> BrowserSession:
+        async with self._lock:
+            browser_index = await self._pick_browser()
+            context = await self._browsers[browser_index].new_context(**CONTEXT_OPTIONS)
+            session = BrowserSession(session_id=uuid.uuid4().hex, context=context, page=None,
+                                     browser_index=browser_index)
+            self._sessions[session.session_id] = session
+
+        try:
+            session.page = await new_agent_page(context, url)
+        except Exception:
+            await self.close_session(session.session_id)
+            raise
+        return session
+
+    def get_session(self, session_id: str) -> BrowserSession:
+        session = self._sessions.get(session_id)
+        if session is None or session.page is None:
+            raise SessionNotFoundError(session_id)
+        session.touch()
+        return session
+
+    @asynccontextmanager
+    async def lease(self, session_id: str):
+        """Hold a session for the duration of a query so it is never evicted mid-run."""
+        session = self.get_session(session_id)
+        session.leases += 1
+        try:
+            yield session
+        finally:
+            session.leases -= 1
+            session.touch()
+
+    def on_session_closed(self, callback: Callable[[str], None]):
+        """Call `callback(session_id)` whenever a session is closed, explicitly or by eviction."""
+        self._close_callbacks.append(callback)
+
+    async def close_session(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        for callback in self._close_callbacks:
+            callback(session_id)
+        try:
+            await session.context.close()
+        except Exception as e:
+            print(f"[browser_pool] Could not close context for session {session_id}: {e}")
+
+    async def _evict_idle_sessions(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            expired = [session_id for session_id, session in self._sessions.items()
+                       if not session.leases and now - session.last_used > self.idle_timeout]
+            for session_id in expired:
+                print(f"[browser_pool] Evicting idle session {session_id}")
+                try:
+                    await self.close_session(session_id)
+                except SessionNotFoundError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "browsers": len(self._browsers),
+            "sessions": len(self._sessions),
+            "active_sessions": sum(1 for session in self._sessions.values() if session.leases),
+            "capacity": self.max_browsers * self.contexts_per_browser,
+        }
@@ -1,9 +1,16 @@
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from langchain_core.runnables import RunnableConfig
 
+from src.extraction import looks_like_pdf
 from src.graph_state import AgentState
+from src.scheduler import over_budget
+from src.tracing import traced_node
+from src.utilities import get_page
 from src.nodes.master_plan_node import master_plan_node
 from src.nodes.annotate_page import annotate_page
+from src.nodes.fast_path_node import fast_path_node
 from src.nodes.llm_call_node import llm_call_node
 from src.nodes.parse_action_node import parse_action_node
 from src.nodes.click import click_node
@@ -13,6 +20,9 @@ from src.nodes.wait import wait_node
 from src.nodes.go_back import go_back_node
 from src.nodes.go_to_search_engine import go_to_search_engine_node
 from src.nodes.answer_node import answer_node
+from src.nodes.extract_node import extract_node
+from src.nodes.research_node import research_node
+from src.nodes.read_source_node import read_source_node
 
 
 load_dotenv()
@@ -23,48 +33,105 @@ tools = {
     "Scroll": "scroll_node",
     "Wait": "wait_node",
     "GoBack": "go_back_node",
-    "Google": "go_to_search_engine_node"
+    "Google": "go_to_search_engine_node",
+    "Research": "research_node",
+    "Read": "extract_node"
 }
 
 
-def tool_router(state: AgentState):
-    action = state["action"]["action"]
-    action_type = action.split(" ")[0]
+def tool_router(state: AgentState, config: RunnableConfig):
+    # A run past its step, time or token budget answers with what it has instead of acting again
+    if over_budget(state, config):
+        return "answer_node"
+    action = state.get("action")
+    action_type = action.get("action", "").split(" ")[0] if isinstance(action, dict) else "retry"
     if action_type == "retry":
+        # Re-ask on the same observation while the reply is what failed and re-asks are left, otherwise observe again
+        if state.get("parse_error"):
+            return "llm_call_node"
         return "annotate_page_node"
     if action_type == "Respond":
         return "answer_node"
-    return tools[action_type]
+    return tools.get(action_type, "annotate_page_node")
+
+
+def fast_path_router(state: AgentState, config: RunnableConfig):
+    if state.get("fast_path_hit"):
+        return tool_router(state, config)
+    return "llm_call_node"
+
+
+def observation_router(state: AgentState, config: RunnableConfig):
+    """Observe a newly opened document by reading its text, a screenshot of a PDF shows almost nothing."""
+    url = get_page(config).url
+    if looks_like_pdf(url) and url != state.get("current_url"):
+        return "extract_node"
+    return "annotate_page_node"
+
+
+def extract_router(state: AgentState):
+    # Nothing readable (or an unreadable PDF), look at the page instead
+    return "llm_call_node" if state.get("page_text") else "annotate_page_node"
+
+
+def research_router(state: AgentState):
+    """Read every collected source in parallel, or go back to observing if there was nothing to read."""
+    links = state.get("research_links") or []
+    if not links:
+        return "annotate_page_node"
+    return [Send("read_source_node", {"url": link["url"], "title": link["title"], "input_str": state["input_str"]})
+            for link in links]
+
 
 def build_graph():
     workflow = StateGraph(state_schema=AgentState)
-    workflow.add_node("master_plan_node", master_plan_node)
-    workflow.add_node("annotate_page_node", annotate_page)
-    workflow.add_node("llm_call_node", llm_call_node)
-    workflow.add_node("parse_action_node", parse_action_node)
-    workflow.add_node("type_node", type_node)
-    workflow.add_node("scroll_node", scroll_node)
-    workflow.add_node("click_node", click_node)
-    workflow.add_node("wait_node", wait_node)
-    workflow.add_node("go_to_search_engine_node", go_to_search_engine_node)
-    workflow.add_node("go_back_node", go_back_node)
-    workflow.add_node("answer_node", answer_node)
+    nodes = {
+        "master_plan_node": master_plan_node,
+        "annotate_page_node": annotate_page,
+        "fast_path_node": fast_path_node,
+        "llm_call_node": llm_call_node,
+        "parse_action_node": parse_action_node,
+        "type_node": type_node,
+        "scroll_node": scroll_node,
+        "click_node": click_node,
+        "wait_node": wait_node,
+        "go_to_search_engine_node": go_to_search_engine_node,
+        "go_back_node": go_back_node,
+        "extract_node": extract_node,
+        "research_node": research_node,
+        "read_source_node": read_source_node,
+        "answer_node": answer_node,
+    }
+    for name, node in nodes.items():
+        # Each node is a span of the run trace, the phases it runs are nested under it
+        workflow.add_node(name, traced_node(name, node))
 
     workflow.add_edge(start_key=START, end_key="master_plan_node")
     workflow.add_edge(start_key="master_plan_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="annotate_page_node", end_key="llm_call_node")
+    workflow.add_edge(start_key="annotate_page_node", end_key="fast_path_node")
+    workflow.add_conditional_edges(source="fast_path_node", path=fast_path_router,
+                                   path_map=["llm_call_node", "click_node", "type_node", "answer_node"])
     workflow.add_edge(start_key="llm_call_node", end_key="parse_action_node")
     workflow.add_conditional_edges(source="parse_action_node", path=tool_router,
-                                   path_map=["annotate_page_node",  "click_node", "type_node", "scroll_node", "wait_node",
-                                             "go_back_node", "go_to_search_engine_node", "answer_node"])
-    workflow.add_edge(start_key="type_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="scroll_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="click_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="wait_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="go_to_search_engine_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="go_back_node", end_key="annotate_page_node")
-    workflow.add_edge(start_key="parse_action_node", end_key="answer_node")
+                                   path_map=["annotate_page_node", "llm_call_node", "click_node", "type_node",
+                                             "scroll_node", "wait_node",
+                                             "go_back_node", "go_to_search_engine_node", "research_node",
+                                             "extract_node", "answer_node"])
+    for action_node in ["type_node", "scroll_node", "click_node", "wait_node", "go_to_search_engine_node",
+                        "go_back_node"]:
+        workflow.add_conditional_edges(source=action_node, path=observation_router,
+                                       path_map=["annotate_page_node", "extract_node"])
+    workflow.add_conditional_edges(source="extract_node", path=extract_router,
+                                   path_map=["llm_call_node", "annotate_page_node"])
+    workflow.add_conditional_edges(source="research_node", path=research_router,
+                                   path_map=["annotate_page_node", "read_source_node"])
+    # Notes of all sources are merged by the reducer before the single answer_node run
+    workflow.add_edge(start_key="read_source_node", end_key="answer_node")
     workflow.add_edge(start_key="answer_node", end_key=END)
     return workflow
 
-graph = build_graph().compile()
+
+def make_graph():
+    """Graph factory for LangGraph Studio (langgraph.json), the server compiles its own at startup."""
+    return build_graph().compile()
+
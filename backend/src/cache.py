@@ -0,0 +1,109 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from typing_extensions import Any, Dict, Hashable, Optional
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600"))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "86400"))
+
+# Unicode words, so questions in any script keep their own keys
+WORD_PATTERN = re.compile(r"\w+")
+
+# Words that never change what a task asks for, dropped when matching equivalent plans
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "is", "are", "me", "my", "please", "can", "could",
+    "you", "tell", "find", "show", "what", "whats", "s",
+}
+
+
+class TTLCache:
+    """Size-capped LRU mapping whose entries also expire `ttl_seconds` after they were stored."""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase words only, so casing, punctuation and spacing never cause a miss."""
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def normalize_url(url: str) -> str:
+    """Host and path of the start page; query strings and fragments are session noise."""
+    parts = urlsplit(url or "")
+    return f"{parts.netloc.lower().removeprefix('www.')}{parts.path.rstrip('/')}"
+
+
+def answer_key(input_str: str, start_url: str = "") -> Optional[tuple]:
+    """None when the query has no words to tell it apart, such a query is never cached."""
+    query = normalize_query(input_str)
+    return (query, normalize_url(start_url)) if query else None
+
+
+def plan_key(input_str: str, start_url: str = "") -> Optional[tuple]:
+    """
+    Tasks that differ only in filler words share a plan, word order still counts ("london to paris").
+    None when nothing but filler is left, such a task is never cached.
+    """
+    words = tuple(word for word in normalize_query(input_str).split() if word not in FILLER_WORDS)
+    return (words, normalize_url(start_url)) if words else None
+
+
+answer_cache = TTLCache("answer", ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS)
+plan_cache = TTLCache("plan", PLAN_CACHE_SIZE, PLAN_CACHE_TTL_SECONDS)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache.name: cache.stats() for cache in (answer_cache, plan_cache)}
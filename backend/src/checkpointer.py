@@ -0,0 +1,40 @@
+import os
+from contextlib import asynccontextmanager
+from typing_extensions import AsyncIterator, Callable, Dict
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+
+
+@asynccontextmanager
+async def memory_checkpointer() -> AsyncIterator[BaseCheckpointSaver]:
+    yield MemorySaver()
+
+
+@asynccontextmanager
+async def sqlite_checkpointer() -> AsyncIterator[BaseCheckpointSaver]:
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as saver:
+        yield saver
+
+
+# Factories return an async context manager that owns the saver's connections
+CHECKPOINTERS: Dict[str, Callable[[], AsyncIterator[BaseCheckpointSaver]]] = {
+    "memory": memory_checkpointer,
+    "sqlite": sqlite_checkpointer,
+}
+
+
+def register_checkpointer(name: str, factory: Callable[[], AsyncIterator[BaseCheckpointSaver]]):
+    """Make another backend (e.g. Postgres) selectable through the CHECKPOINTER setting."""
+    CHECKPOINTERS[name] = factory
+
+
+def open_checkpointer(name: str = CHECKPOINTER):
+    if name not in CHECKPOINTERS:
+        raise ValueError(f"Unknown checkpointer '{name}', expected one of {sorted(CHECKPOINTERS)}")
+    return CHECKPOINTERS[name]()
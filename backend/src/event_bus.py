@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing_extensions import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from langchain_core.runnables import RunnableConfig
+
+EVENT_BUS_HISTORY = int(os.getenv("EVENT_BUS_HISTORY", "256"))
+EVENT_BUS_SUBSCRIBER_BUFFER = int(os.getenv("EVENT_BUS_SUBSCRIBER_BUFFER", "64"))
+EVENT_BUS_POLICY = os.getenv("EVENT_BUS_POLICY", "coalesce")  # coalesce | drop_oldest
+
+# Only the latest of these matters to a viewer that fell behind, or one replaying the history
+COALESCED_EVENT_TYPES = {"screenshot", "scroll"}
+
+
+@dataclass
+class BusEvent:
+    id: int
+    type: str
+    data: Dict[str, Any]
+    timestamp: float = field(default_factory=time.time)
+
+
+class Subscriber:
+    """Bounded ring buffer of one listener; a slow listener loses old events instead of growing memory."""
+
+    def __init__(self, maxlen: int, policy: str):
+        self.buffer: Deque[Optional[BusEvent]] = deque()
+        self.maxlen = maxlen
+        self.policy = policy
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+
+    def push(self, event: Optional[BusEvent]):
+        if event is not None and self.policy == "coalesce" and event.type in COALESCED_EVENT_TYPES:
+            stale = [queued for queued in self.buffer if queued is not None and queued.type == event.type]
+            for queued in stale:
+                self.buffer.remove(queued)
+            self.dropped += len(stale)
+        if len(self.buffer) >= self.maxlen:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(event)
+        self.wakeup.set()
+
+    async def next(self) -> Optional[BusEvent]:
+        while not self.buffer:
+            self.wakeup.clear()
+            await self.wakeup.wait()
+        return self.buffer.popleft()
+
+
+class Channel:
+    def __init__(self, history: int):
+        self.next_id = 1
+        self.history: Deque[BusEvent] = deque(maxlen=history)
+        self.subscribers: Set[Subscriber] = set()
+
+
+class EventBus:
+    """
+    Fan-out pub/sub of browser events keyed by session.
+
+    Every subscriber of a session receives every event (unlike a shared queue where listeners steal
+    from each other), the last `history` events of each session are kept for `Last-Event-ID` replay
+    (only the latest of each coalesced type), and nothing is buffered for sessions nobody is watching
+    beyond that history.
+    """
+
+    def __init__(self, history: int = EVENT_BUS_HISTORY, subscriber_buffer: int = EVENT_BUS_SUBSCRIBER_BUFFER,
+                 policy: str = EVENT_BUS_POLICY):
+        self.history = history
+        self.subscriber_buffer = subscriber_buffer
+        self.policy = policy
+        self._channels: Dict[str, Channel] = {}
+
+    def open_session(self, session_id: str) -> Channel:
+        """The session's channel, created when a run starts or a viewer subscribes."""
+        channel = self._channels.get(session_id)
+        if channel is None:
+            channel = self._channels[session_id] = Channel(self.history)
+        return channel
+
+    def publish(self, session_id: str, event_type: str, data: Dict[str, Any]) -> Optional[BusEvent]:
+        channel = self._channels.get(session_id)
+        if channel is None:
+            # Closed already (a node still finishing after cleanup), a new channel would never be closed
+            return None
+        event = BusEvent(id=channel.next_id, type=event_type, data=data)
+        channel.next_id += 1
+        if event_type in COALESCED_EVENT_TYPES:
+            # A full screenshot per step would keep tens of MB of images in every session's history
+            for stale in [past for past in channel.history if past.type == event_type]:
+                channel.history.remove(stale)
+        channel.history.append(event)
+        for subscriber in channel.subscribers:
+            subscriber.push(event)
+        return event
+
+    async def subscribe(self, session_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[BusEvent]:
+        """Yield the session's events, first replaying the ones after `last_event_id` from history."""
+        channel = self.open_session(session_id)
+        subscriber = Subscriber(self.subscriber_buffer, self.policy)
+        if last_event_id is not None:
+            for event in channel.history:
+                if event.id > last_event_id:
+                    subscriber.push(event)
+        channel.subscribers.add(subscriber)
+        try:
+            while True:
+                event = await subscriber.next()
+                if event is None:
+                    return
+                yield event
+        finally:
+            channel.subscribers.discard(subscriber)
+            if subscriber.dropped:
+                print(f"[event_bus] Subscriber of session {session_id} dropped {subscriber.dropped} events")
+
+    def close_session(self, session_id: str):
+        """Forget a session's history and end its subscriptions."""
+        channel = self._channels.pop(session_id, None)
+        if channel is None:
+            return
+        for subscriber in channel.subscribers:
+            subscriber.push(None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._channels),
+            "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+        }
+
+
+event_bus = EventBus()
+
+
+def emit(config: RunnableConfig, event_type: str, data: Dict[str, Any]):
+    """Publish a browser event for the session the current graph run belongs to."""
+    session_id = config.get("configurable", {}).get("session_id")
+    if session_id:
+        event_bus.publish(session_id, event_type, data)
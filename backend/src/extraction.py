@@ -0,0 +1,111 @@
+import asyncio
+import io
+import os
+from dataclasses import dataclass
+from typing_extensions import List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from playwright.async_api import BrowserContext, Page
+from pypdf import PdfReader
+
+from src.bbox_encoder import terms
+
+EXTRACT_CHUNK_CHARS = int(os.getenv("EXTRACT_CHUNK_CHARS", "1500"))
+EXTRACT_CHAR_BUDGET = int(os.getenv("EXTRACT_CHAR_BUDGET", "8000"))
+EXTRACT_PDF_TIMEOUT_SECONDS = float(os.getenv("EXTRACT_PDF_TIMEOUT_SECONDS", "30"))
+
+CHUNK_SEPARATOR = "\n[...]\n"
+
+# Text of the content blocks of the page in document order, leaving out navigation, page chrome,
+# hidden elements and blocks nested in one already taken. Falls back to the main region's text.
+READABLE_TEXT_SCRIPT = """() => {
+    const BLOCKS = "h1, h2, h3, h4, h5, h6, p, li, pre, blockquote, td, th, dt, dd, figcaption";
+    const CHROME = "nav, header, footer, aside, form, [role=navigation], [role=banner], [role=contentinfo], [aria-hidden=true]";
+    const root = document.querySelector("article, main, [role=main]") || document.body;
+    if (!root) return "";
+    const taken = new Set();
+    const lines = [];
+    for (const element of root.querySelectorAll(BLOCKS)) {
+        const parent = element.parentElement && element.parentElement.closest(BLOCKS);
+        if (parent && taken.has(parent)) continue;
+        if (element.closest(CHROME) || (element.checkVisibility && !element.checkVisibility())) continue;
+        const text = element.innerText.trim();
+        if (!text) continue;
+        taken.add(element);
+        lines.push(/^H[1-6]$/.test(element.tagName) ? "# " + text : text);
+    }
+    const text = lines.join("\\n");
+    return text.length >= 200 ? text : root.innerText;
+}"""
+
+
+@dataclass
+class PageText:
+    url: str
+    text: str
+    kind: str  # html or pdf
+
+
+def looks_like_pdf(url: str) -> bool:
+    url = (url or "").lower().split("?")[0]
+    return url.endswith(".pdf") or "/pdf/" in url
+
+
+def parse_pdf(data: bytes) -> str:
+    """Text of every page of a PDF, empty when the file cannot be read."""
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        print(f"[extraction] Could not parse PDF: {e}")
+        return ""
+
+
+async def pdf_text(context: BrowserContext, url: str) -> str:
+    # Fetched through the context so the session's cookies apply, parsed off the event loop
+    response = await context.request.get(url, timeout=EXTRACT_PDF_TIMEOUT_SECONDS * 1000)
+    if not response.ok:
+        return ""
+    return await asyncio.to_thread(parse_pdf, await response.body())
+
+
+async def page_text(page: Page) -> PageText:
+    """Readable main content of the current page, or the text of the PDF it shows."""
+    url = page.url
+    if not looks_like_pdf(url):
+        content_type = await page.evaluate("() => document.contentType")
+        if content_type != "application/pdf":
+            text = await page.evaluate(READABLE_TEXT_SCRIPT)
+            return PageText(url=url, text=normalize_lines(text), kind="html")
+    return PageText(url=url, text=normalize_lines(await pdf_text(page.context, url)), kind="pdf")
+
+
+def normalize_lines(text: str) -> str:
+    return "\n".join(" ".join(line.split()) for line in (text or "").splitlines() if line.strip())
+
+
+def split_chunks(text: str, chunk_chars: int = EXTRACT_CHUNK_CHARS) -> List[str]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_chars, chunk_overlap=chunk_chars // 10)
+    return splitter.split_text(text)
+
+
+def select_chunks(chunks: List[str], query: str = "", plan_step: str = "",
+                  char_budget: int = EXTRACT_CHAR_BUDGET) -> List[str]:
+    """
+    The chunks sharing the most words with the task and plan step that fit in `char_budget`, kept in
+    document order. Without any overlap the document is read from the top.
+    """
+    query_terms, step_terms = terms(query), terms(plan_step)
+
+    def score(index: int) -> float:
+        words = terms(chunks[index])
+        return 2 * len(words & query_terms) + len(words & step_terms)
+
+    ranked = sorted(range(len(chunks)), key=lambda index: (-score(index), index))
+    selected, used = [], 0
+    for index in ranked:
+        if used + len(chunks[index]) > char_budget:
+            continue
+        selected.append(index)
+        used += len(chunks[index])
+    return [chunks[index] for index in sorted(selected)]
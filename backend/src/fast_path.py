@@ -0,0 +1,90 @@
+import os
+import re
+from urllib.parse import urlsplit
+from typing_extensions import Callable, Dict, List, Optional, Tuple
+
+from src.bbox_encoder import current_plan_step, plan_steps
+from src.graph_state import AgentState, Action, Bbox, steps_taken
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+GOOGLE_HOST = re.compile(r"(^|\.)google\.[a-z.]+$")
+GOOGLE_HOME_PATHS = {"", "/", "/webhp"}
+QUOTED = re.compile(r"[\"“]([^\"“”]{2,})[\"”]")
+
+# Labels that only ever appear on consent banners, best choice first
+CONSENT_LABELS = ["reject all", "reject all cookies", "accept all", "accept all cookies", "allow all cookies",
+                  "agree to all", "i agree"]
+# Too generic on their own, only trusted when the page also offers a cookie-related control
+WEAK_CONSENT_LABELS = ["accept", "agree", "allow all", "got it", "ok, got it", "accept cookies"]
+
+# A rule returns the action to take and a thought explaining it, or None to leave the step to the LLM
+Rule = Callable[[AgentState], Optional[Tuple[Action, str]]]
+
+
+def label(bbox: Bbox) -> str:
+    return " ".join((bbox.get("text") or bbox.get("ariaLabel") or "").lower().split())
+
+
+def cookie_consent(state: AgentState) -> Optional[Tuple[Action, str]]:
+    bboxes = state.get("bboxes", [])
+    labels = {label(bbox): bbox for bbox in reversed(bboxes)}
+    candidates = list(CONSENT_LABELS)
+    if any("cookie" in text for text in labels):
+        candidates += WEAK_CONSENT_LABELS
+    for candidate in candidates:
+        bbox = labels.get(candidate)
+        if bbox is not None:
+            return (Action(action=f"Click [{bbox['id']}]", args=None, target=str(bbox["id"])),
+                    f"Closing the cookie consent popup with '{bbox.get('text') or bbox.get('ariaLabel')}'")
+    return None
+
+
+def search_term(state: AgentState) -> str:
+    """The quoted search term of the plan, preferring the step being worked on, else the task itself."""
+    steps = plan_steps(state.get("master_plan"))
+    current = current_plan_step(state.get("master_plan"), steps_taken(state))
+    for step in [current] + steps:
+        if re.search(r"\b(type|search|enter)\b", step, re.IGNORECASE):
+            match = QUOTED.search(step)
+            if match:
+                return match.group(1).strip()
+    return state["input_str"]
+
+
+def google_search(state: AgentState) -> Optional[Tuple[Action, str]]:
+    url = urlsplit(state.get("current_url", ""))
+    if not GOOGLE_HOST.search(url.netloc.lower()) or url.path not in GOOGLE_HOME_PATHS:
+        return None
+    boxes = [bbox for bbox in state.get("bboxes", []) if bbox.get("type") in ("textarea", "input")]
+    search_boxes = [bbox for bbox in boxes if "search" in (bbox.get("ariaLabel") or "").lower()]
+    if not search_boxes:
+        return None
+    term = search_term(state)
+    return (Action(action=f"Type [{search_boxes[0]['id']}]", args=term, target=str(search_boxes[0]["id"])),
+            f"On the Google home page, searching for {term}")
+
+
+# Checked in order, a popup has to go before anything under it can be used
+RULES: Dict[str, Rule] = {
+    "cookie_consent": cookie_consent,
+    "google_search": google_search,
+}
+
+
+def match_rule(state: AgentState, fired: List[str]) -> Optional[Tuple[str, Action, str]]:
+    """
+    First rule that applies to the current observation, as `(key, action, thought)`. A rule fires at
+    most once per URL in a run, so if its action did not change anything the LLM takes over.
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    for name, rule in RULES.items():
+        key = f"{name}@{state.get('current_url', '')}"
+        if key in fired:
+            continue
+        result = rule(state)
+        if result is not None:
+            action, thought = result
+            return key, action, thought
+    return None
@@ -1,10 +1,13 @@
-from typing_extensions import TypedDict, List, Annotated
+from dataclasses import dataclass
+from typing_extensions import TypedDict, List, Annotated, Dict, Any, Literal, NotRequired, Optional
 from operator import add
-from playwright.async_api import Page
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from src.research import SourceLink
 
 
 class Bbox(TypedDict):
+    id: int
     x: int
     y: int
     text: str
@@ -15,20 +18,113 @@ class Bbox(TypedDict):
 class Action(TypedDict):
     action: str
     args: str | Bbox
+    target: NotRequired[str]  # bbox id or WINDOW, also kept in `action` as "Click [3]"
+
+
+class TokenUsage(TypedDict):
+    input_tokens: int
+    output_tokens: int
+    llm_calls: int
+
+
+def add_token_usage(left: TokenUsage | None, right: TokenUsage | None) -> TokenUsage:
+    left, right = left or {}, right or {}
+    return TokenUsage(
+        input_tokens=left.get("input_tokens", 0) + right.get("input_tokens", 0),
+        output_tokens=left.get("output_tokens", 0) + right.get("output_tokens", 0),
+        llm_calls=left.get("llm_calls", 0) + right.get("llm_calls", 0)
+    )
+
+
+@dataclass(frozen=True)
+class DropOldest:
+    """Update for a windowed list: its `count` oldest entries were folded into the list's summary."""
+    count: int
+
+
+def add_or_drop(left: List[str] | None, right: List[str] | DropOldest | None) -> List[str]:
+    left = left or []
+    if isinstance(right, DropOldest):
+        return left[right.count:]
+    return left + (right or [])
+
+
+class PromptSize(TypedDict):
+    node: str
+    estimated_tokens: int
+    memory_tokens: int  # part of the prompt spent on past actions or notes
+    verbatim_entries: int
+    folded_entries: int
+
+
+class StepLatency(TypedDict):
+    step: str
+    total_ms: float
+    wait_ms: float
+    work_ms: float
+    waits: List[Dict[str, Any]]
 
 
 class MasterPlanState(BaseModel):
     plan: List[str] = Field(description="To setup the master plan state for model.")
 
 
+ACTION_VERBS = ("Click", "Type", "Scroll", "Wait", "GoBack", "Google", "Respond", "Research", "Read")
+TARGETED_VERBS = ("Click", "Type", "Scroll")
+
+
+class AgentOutput(BaseModel):
+    """The agent's reasoning about the observation and the single browser action to take next."""
+    thought: str = Field(description="Brief thoughts, summarizing the info that will help answer the task.")
+    action: Literal[ACTION_VERBS] = Field(description="The one action to take.")
+    target: Optional[str] = Field(default=None, description="Numerical label of the element for Click, Type and "
+                                                            "Scroll, or WINDOW to scroll the whole page.")
+    content: Optional[str] = Field(default=None, description="Text to type for Type, up or down for Scroll.")
+
+    @model_validator(mode="after")
+    def check_arguments(self):
+        if self.action in TARGETED_VERBS:
+            target = (self.target or "").strip().strip("[]").strip()
+            if not (target.isdigit() or (self.action == "Scroll" and target.upper() == "WINDOW")):
+                raise ValueError(f"{self.action} needs the numerical label of an element as target, got {self.target!r}")
+            self.target = target.upper() if not target.isdigit() else target
+        if self.action == "Type" and not self.content:
+            raise ValueError("Type needs the text to type as content")
+        if self.action == "Scroll":
+            direction = (self.content or "down").strip().lower()
+            if direction not in ("up", "down"):
+                raise ValueError(f"Scroll needs up or down as content, got {self.content!r}")
+            self.content = direction
+        return self
+
+
 class AgentState(TypedDict):
     input_str: str
-    page: Page
+    current_url: str
     image: str
     master_plan: MasterPlanState
     bboxes: List[Bbox]
-    actions_taken: Annotated[List[str], add]
+    actions_taken: Annotated[List[str], add_or_drop]  # recent actions, older ones live in actions_summary
     action: Action | str
     last_action: str
-    notes: Annotated[List[str], add]
+    notes: Annotated[List[str], add_or_drop]  # recent notes, older ones live in notes_summary
     answer: str
+    token_usage: Annotated[TokenUsage, add_token_usage]
+    step_latency: StepLatency
+    fast_path_hit: str  # rule that chose this step's action, empty when the LLM decides
+    fast_path_hits: Annotated[List[str], add]
+    llm_calls_avoided: Annotated[int, add]
+    research_links: List[SourceLink]
+    page_text: str  # relevant chunks of the page read by extract_node, replaces the screenshot while set
+    parse_error: str  # why the last model reply was unusable, sent back to the model on the re-ask
+    parse_failures: int
+    actions_summary: str
+    actions_folded: Annotated[int, add]
+    notes_summary: str
+    notes_folded: Annotated[int, add]
+    prompt_size: PromptSize
+
+
+def steps_taken(state: AgentState) -> int:
+    """Actions taken in the run, including the ones folded into the summary."""
+    return (state.get("actions_folded") or 0) + len(state.get("actions_taken") or [])
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from src.tracing import message_bytes, span
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Per-process limits for model calls, shared by every session running in this worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0.7) -> ChatGoogleGenerativeAI:
+    """Return the shared client for `model` so its HTTP connection pool is reused across calls."""
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, max_retries=3)
+    # return ChatOpenAI(base_url=os.getenv("OPENROUTER_BASE_URL"), model=os.getenv("MODEL_NAME"),
+    #                   api_key=os.getenv("OPENROUTER_API_KEY"), temperature=temperature, max_retries=3)
+
+
+@lru_cache(maxsize=None)
+def get_structured_llm(schema: type, model: str = DEFAULT_MODEL, temperature: float = 0.7,
+                       include_raw: bool = False) -> Runnable:
+    """
+    Model bound to reply with `schema` through tool calling. With `include_raw` the result is a dict
+    holding the raw message, the parsed object (or None) and the parsing error instead of raising.
+    """
+    return get_llm(model, temperature).with_structured_output(schema, include_raw=include_raw)
+
+
+async def ainvoke_llm(runnable: Runnable, llm_input, config: RunnableConfig | None = None):
+    """Run a model call on the event loop without blocking it, bounded by the process-wide limits."""
+    with span("llm", bytes_sent=message_bytes(llm_input)) as current:
+        queued = time.monotonic()
+        async with _llm_semaphore:
+            current.attributes["queued_ms"] = round((time.monotonic() - queued) * 1000, 1)
+            response = await asyncio.wait_for(runnable.ainvoke(llm_input, config=config), timeout=LLM_TIMEOUT_SECONDS)
+        # Structured calls with include_raw return the message next to the parsed object
+        message = response.get("raw") if isinstance(response, dict) else response
+        usage = getattr(message, "usage_metadata", None) or {}
+        current.attributes.update(input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+        return response
@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import os
+from dataclasses import dataclass
+from typing_extensions import Any, Dict, List, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+
+from src.bbox_encoder import CHARS_PER_TOKEN
+from src.graph_state import AgentState, DropOldest, PromptSize, TokenUsage, add_token_usage
+from src.llm import ainvoke_llm
+from src.prompt_builder import estimate_tokens, token_usage
+from src.resources import resources
+
+# Newest entries always sent verbatim, as long as they fit the prompt budget
+MEMORY_ACTIONS_WINDOW = int(os.getenv("MEMORY_ACTIONS_WINDOW", "10"))
+MEMORY_NOTES_WINDOW = int(os.getenv("MEMORY_NOTES_WINDOW", "8"))
+# Tokens of verbatim entries a prompt may carry before older ones are folded
+MEMORY_ACTIONS_PROMPT_TOKENS = int(os.getenv("MEMORY_ACTIONS_PROMPT_TOKENS", "600"))
+MEMORY_NOTES_PROMPT_TOKENS = int(os.getenv("MEMORY_NOTES_PROMPT_TOKENS", "3000"))
+# Length the rolling summaries are asked to stay under
+MEMORY_ACTIONS_SUMMARY_TOKENS = int(os.getenv("MEMORY_ACTIONS_SUMMARY_TOKENS", "200"))
+MEMORY_NOTES_SUMMARY_TOKENS = int(os.getenv("MEMORY_NOTES_SUMMARY_TOKENS", "600"))
+# Entries past the window to collect before folding, so the summary is not rewritten every step
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", "5"))
+
+
+@dataclass(frozen=True)
+class MemoryField:
+    name: str  # the windowed list in AgentState
+    summary: str  # its rolling summary
+    folded: str  # how many entries the summary covers
+    window: int
+    prompt_tokens: int
+    summary_tokens: int
+    instructions: str
+
+
+FIELDS = {
+    "actions_taken": MemoryField(
+        "actions_taken", "actions_summary", "actions_folded", MEMORY_ACTIONS_WINDOW,
+        MEMORY_ACTIONS_PROMPT_TOKENS, MEMORY_ACTIONS_SUMMARY_TOKENS,
+        "Summarize the browser actions an agent took: the sites and pages visited, what was searched, "
+        "typed and opened, and which attempts failed. Drop repeated scrolls and waits."),
+    "notes": MemoryField(
+        "notes", "notes_summary", "notes_folded", MEMORY_NOTES_WINDOW,
+        MEMORY_NOTES_PROMPT_TOKENS, MEMORY_NOTES_SUMMARY_TOKENS,
+        "Summarize an agent's notes while researching the user input. Keep every fact that helps answer it, "
+        "with numbers, dates, names and sources exactly as written. Drop reasoning about what to click."),
+}
+
+
+def entry_tokens(entries: List[str]) -> int:
+    return sum(len(entry) // CHARS_PER_TOKEN + 1 for entry in entries)
+
+
+def window_start(field: MemoryField, entries: List[str]) -> int:
+    """Index of the oldest entry kept verbatim: at most `window` entries within the prompt budget."""
+    start, tokens = len(entries), 0
+    while start > 0 and len(entries) - start < field.window:
+        tokens += entry_tokens([entries[start - 1]])
+        if tokens > field.prompt_tokens and start < len(entries):
+            break
+        start -= 1
+    return start
+
+
+def render(summary: str, entries: List[str]) -> str:
+    lines = [f"Earlier (summarized): {summary}"] if summary else []
+    lines.extend(f"- {entry}" for entry in entries)
+    return "\n".join(lines) or "None yet"
+
+
+def build_fold_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate(
+        messages=[
+            ("system", "{instructions} Merge the new entries into the summary so far and reply with the updated "
+                       "summary only, in at most {max_words} words."),
+            ("human", "User Input: {input}\n\nSummary so far: {summary}\n\nNew entries:\n{entries}")
+        ],
+        input_variables=["instructions", "max_words", "input", "summary", "entries"],
+    )
+
+
+resources.register("fold_prompt", build_fold_prompt)
+
+
+async def fold(field: MemoryField, summary: str, entries: List[str], input_str: str) -> Tuple[str, int, TokenUsage]:
+    prompt = resources.get("fold_prompt")
+    prompt_value = prompt.invoke({"instructions": field.instructions, "max_words": field.summary_tokens * 3 // 4,
+                                  "input": input_str, "summary": summary or "None yet",
+                                  "entries": render("", entries)})
+    estimated_tokens = estimate_tokens(prompt_value.to_messages())
+    response = await ainvoke_llm(resources.get("llm_summary"), prompt_value)
+    return response.content.strip(), len(entries), token_usage(response, estimated_tokens)
+
+
+class MemoryManager:
+    """
+    Keeps the prompts' view of `actions_taken` and `notes` bounded. The newest entries stay verbatim,
+    older ones are folded into a rolling summary by a background model call that the next step picks
+    up, so no step waits for a summary. Entries leave the state only once a summary covers them.
+    """
+
+    def __init__(self):
+        self._folds: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def compact(self, state: AgentState, config: RunnableConfig, start_folds: bool = True
+                ) -> Tuple[Dict[str, Tuple[str, List[str]]], Dict[str, Any]]:
+        """
+        Apply finished folds and start new ones. Returns each field's (summary, entries) for this
+        step's prompt and the state updates the calling node should return.
+        """
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        views, updates = {}, {}
+        for field in FIELDS.values():
+            summary, entries = state.get(field.summary) or "", state.get(field.name) or []
+            key = (thread_id, field.name)
+
+            task = self._folds.get(key)
+            if task is not None and task.done():
+                del self._folds[key]
+                if not task.cancelled() and task.exception() is None:
+                    summary, count, usage = task.result()
+                    entries = entries[count:]
+                    updates.update({field.summary: summary, field.name: DropOldest(count), field.folded: count})
+                    updates["token_usage"] = add_token_usage(updates.get("token_usage"), usage)
+                    print(f"[memory] Folded {count} {field.name} into a ~{len(summary) // CHARS_PER_TOKEN} token summary")
+                else:
+                    print(f"[memory] Could not fold {field.name}: {task.exception() if not task.cancelled() else 'cancelled'}")
+                task = None
+
+            start = window_start(field, entries)
+            over_budget = entry_tokens(entries) > field.prompt_tokens
+            if start_folds and task is None and start > 0 and (start >= MEMORY_FOLD_BATCH or over_budget):
+                # A fresh context keeps the summary call out of this node's callbacks and its streamed tokens
+                fold_coroutine = fold(field, summary, entries[:start], state["input_str"])
+                self._folds[key] = contextvars.Context().run(asyncio.ensure_future, fold_coroutine)
+            views[field.name] = (summary, entries)
+        return views, updates
+
+    def discard(self, config: RunnableConfig):
+        """Drop the folds of a finished run."""
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        for key in [key for key in self._folds if key[0] == thread_id]:
+            self._folds.pop(key).cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"folds_in_flight": sum(not task.done() for task in self._folds.values())}
+
+
+memory_manager = MemoryManager()
+
+
+def prompt_size(node: str, estimated_tokens: int, view: Tuple[str, List[str]], folded: int) -> PromptSize:
+    summary, entries = view
+    return PromptSize(node=node, estimated_tokens=estimated_tokens,
+                      memory_tokens=len(render(summary, entries)) // CHARS_PER_TOKEN,
+                      verbatim_entries=len(entries), folded_entries=folded)
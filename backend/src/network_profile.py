@@ -0,0 +1,266 @@
+import asyncio
+import os
+import weakref
+from dataclasses import dataclass, field, asdict
+from typing_extensions import Dict, FrozenSet, List, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Frame, Page, Request, Route, Error as PlaywrightError
+
+from src.tracing import metrics
+
+# Resource types never fetched, e.g. "media,font" or "image,media,font" when screenshots can go without pictures
+NETWORK_BLOCK_TYPES = os.getenv("NETWORK_BLOCK_TYPES", "media,font")
+# Extra domains to block, on top of the ad and tracker list below (comma separated)
+NETWORK_BLOCK_DOMAINS = os.getenv("NETWORK_BLOCK_DOMAINS", "")
+NETWORK_BLOCK_ADS = os.getenv("NETWORK_BLOCK_ADS", "true").lower() == "true"
+# Third-party requests allowed per document before the rest are blocked (0 for no cap)
+NETWORK_MAX_THIRD_PARTY = int(os.getenv("NETWORK_MAX_THIRD_PARTY", "150"))
+NETWORK_DISABLE_ANIMATIONS = os.getenv("NETWORK_DISABLE_ANIMATIONS", "true").lower() == "true"
+
+# Ad, analytics and tracking hosts that add nothing to a screenshot or page text
+AD_DOMAINS = frozenset({
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "adservice.google.com",
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com", "amazon-adsystem.com",
+    "adnxs.com", "criteo.com", "criteo.net", "taboola.com", "outbrain.com", "scorecardresearch.com",
+    "quantserve.com", "chartbeat.com", "chartbeat.net", "hotjar.com", "segment.io", "segment.com",
+    "mixpanel.com", "newrelic.com", "nr-data.net", "facebook.net", "connect.facebook.net", "ads-twitter.com",
+    "analytics.twitter.com", "bat.bing.com", "clarity.ms", "moatads.com", "rubiconproject.com", "pubmatic.com",
+    "openx.net", "casalemedia.com", "teads.tv", "adsrvr.org", "demdex.net", "omtrdc.net", "everesttech.net",
+})
+
+# Chromium blocks by URL pattern, so each blockable resource type goes by its file extensions
+TYPE_EXTENSIONS = {
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "ogg", "ogv", "mp3", "m4a", "m4v", "wav", "flac", "mov"),
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "stylesheet": ("css",),
+}
+
+# Chromium's error for requests refused by Network.setBlockedURLs or an aborted route
+BLOCKED_ERROR = "net::ERR_BLOCKED_BY_CLIENT"
+
+# Rough transfer size of a blocked request by resource type, for the bytes saved estimate
+TYPICAL_BYTES = {"image": 40_000, "media": 500_000, "font": 40_000, "script": 30_000, "stylesheet": 15_000,
+                 "xhr": 5_000, "fetch": 5_000}
+DEFAULT_TYPICAL_BYTES = 10_000
+
+# Stops CSS animations and transitions so pages reach their final layout at once
+DISABLE_ANIMATIONS_SCRIPT = """(() => {
+    const css = `*, *::before, *::after {
+        animation-duration: 0s !important; animation-delay: 0s !important;
+        transition-duration: 0s !important; transition-delay: 0s !important;
+        scroll-behavior: auto !important;
+    }`;
+    const add = () => {
+        const style = document.createElement("style");
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    };
+    if (document.documentElement) add();
+    else document.addEventListener("DOMContentLoaded", add);
+})()"""
+
+
+# Common public suffixes of two labels, a host under one keeps three labels as its site
+SECOND_LEVEL_SUFFIXES = frozenset({
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk", "ltd.uk", "plc.uk", "net.uk", "sch.uk", "nhs.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au", "co.nz", "org.nz", "net.nz", "govt.nz",
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "go.jp", "co.kr", "or.kr", "ac.kr", "go.kr",
+    "com.br", "net.br", "org.br", "gov.br", "com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn",
+    "com.hk", "org.hk", "com.tw", "org.tw", "com.sg", "edu.sg", "gov.sg", "com.my", "com.ph",
+    "co.in", "net.in", "org.in", "gov.in", "ac.in", "co.id", "or.id", "ac.id", "co.th", "ac.th",
+    "co.za", "org.za", "gov.za", "ac.za", "com.mx", "org.mx", "gob.mx", "com.ar", "gob.ar",
+    "com.co", "com.pe", "com.tr", "org.tr", "gov.tr", "com.ua", "co.il", "org.il", "ac.il",
+    "com.eg", "com.sa", "com.pk", "com.ng", "co.ke", "com.vn", "com.pl", "co.at", "or.at",
+})
+
+
+def site_of(host: str) -> str:
+    """The registrable part of a host, close enough to tell first from third party (example.co.uk too)."""
+    labels = host.split(".")
+    keep = 3 if len(labels) > 2 and ".".join(labels[-2:]) in SECOND_LEVEL_SUFFIXES else 2
+    return ".".join(labels[-keep:])
+
+
+def matches_domain(host: str, domains: FrozenSet[str]) -> bool:
+    parts = host.split(".")
+    return any(".".join(parts[i:]) in domains for i in range(len(parts) - 1))
+
+
+def is_third_party(url: str, page_url: str) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    page_host = (urlsplit(page_url).hostname or "").lower()
+    return bool(host and page_host) and site_of(host) != site_of(page_host)
+
+
+@dataclass
+class NetworkStats:
+    requests: int = 0
+    blocked: int = 0
+    bytes_saved: int = 0  # estimated from TYPICAL_BYTES, blocked requests never report a size
+    blocked_by: Dict[str, int] = field(default_factory=dict)  # resource_type, domain or third_party
+
+    def record_block(self, reason: str, resource_type: str):
+        saved = TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+        self.blocked += 1
+        self.bytes_saved += saved
+        self.blocked_by[reason] = self.blocked_by.get(reason, 0) + 1
+        metrics.counters["requests_blocked"] += 1
+        metrics.counters["bytes_saved"] += saved
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+# Stats of each context the profile was applied to, they go away with the context
+_context_stats: "weakref.WeakKeyDictionary[BrowserContext, NetworkStats]" = weakref.WeakKeyDictionary()
+
+
+class PageBlocker:
+    """
+    The profile on one page. Types and domains are blocked inside Chromium through the page's
+    Network.setBlockedURLs, so allowed requests never pass through Python and keep the HTTP cache.
+    Only a document past its third-party cap is routed, until the next navigation.
+    """
+
+    def __init__(self, profile: "NetworkProfile", page: Page, stats: NetworkStats):
+        self.profile = profile
+        self.page = page
+        self.stats = stats
+        self.third_party = 0
+        self.routed = False
+        page.on("request", self._on_request)
+        page.on("requestfailed", self._on_request_failed)
+        page.on("framenavigated", self._on_frame_navigated)
+
+    async def start(self):
+        patterns = self.profile.blocked_url_patterns()
+        if not patterns:
+            return
+        try:
+            session = await self.page.context.new_cdp_session(self.page)
+            await session.send("Network.enable")
+            await session.send("Network.setBlockedURLs", {"urls": patterns})
+        except PlaywrightError as e:
+            # Not Chromium, or the page closed already
+            print(f"[network_profile] URL blocking unavailable: {e}")
+
+    def _on_request(self, request: Request):
+        self.stats.requests += 1
+        if not self.profile.max_third_party or request.is_navigation_request():
+            return
+        if is_third_party(request.url, self.page.url):
+            self.third_party += 1
+            if self.third_party > self.profile.max_third_party and not self.routed:
+                self.routed = True
+                asyncio.create_task(self._route(True))
+
+    def _on_request_failed(self, request: Request):
+        if BLOCKED_ERROR in (request.failure or ""):
+            self.stats.record_block(self.profile.block_reason(request.url, request.resource_type),
+                                    request.resource_type)
+
+    def _on_frame_navigated(self, frame: Frame):
+        if frame == self.page.main_frame:
+            self.third_party = 0
+            if self.routed:
+                self.routed = False
+                asyncio.create_task(self._route(False))
+
+    async def _route(self, enable: bool):
+        try:
+            if enable:
+                await self.page.route("**/*", self._handle)
+            else:
+                await self.page.unroute("**/*", self._handle)
+        except PlaywrightError:
+            pass
+
+    async def _handle(self, route: Route):
+        request = route.request
+        try:
+            if not request.is_navigation_request() and is_third_party(request.url, self.page.url):
+                await route.abort("blockedbyclient")
+            else:
+                await route.continue_()
+        except PlaywrightError:
+            # The page closed while the request was pending
+            pass
+
+
+class NetworkProfile:
+    """
+    What an agent's browser context never fetches: resource types and domains, and third-party
+    requests past a cap per document. CSS animations are turned off too.
+    """
+
+    def __init__(self, block_types: FrozenSet[str] = frozenset(), block_domains: FrozenSet[str] = frozenset(),
+                 max_third_party: int = 0, disable_animations: bool = False):
+        self.block_types = block_types
+        self.block_domains = block_domains
+        self.max_third_party = max_third_party
+        self.disable_animations = disable_animations
+        self._pages: "weakref.WeakKeyDictionary[Page, asyncio.Task]" = weakref.WeakKeyDictionary()
+        unknown = block_types - TYPE_EXTENSIONS.keys()
+        if unknown:
+            print(f"[network_profile] Can't block resource types {sorted(unknown)}, "
+                  f"supported: {sorted(TYPE_EXTENSIONS)}")
+
+    @classmethod
+    def from_env(cls) -> "NetworkProfile":
+        extra = {domain.strip().lower() for domain in NETWORK_BLOCK_DOMAINS.split(",") if domain.strip()}
+        return cls(
+            block_types=frozenset(kind.strip() for kind in NETWORK_BLOCK_TYPES.split(",") if kind.strip()),
+            block_domains=frozenset(extra | (AD_DOMAINS if NETWORK_BLOCK_ADS else set())),
+            max_third_party=NETWORK_MAX_THIRD_PARTY,
+            disable_animations=NETWORK_DISABLE_ANIMATIONS,
+        )
+
+    def blocked_url_patterns(self) -> List[str]:
+        patterns = []
+        for kind in sorted(self.block_types & TYPE_EXTENSIONS.keys()):
+            for extension in TYPE_EXTENSIONS[kind]:
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+        for domain in sorted(self.block_domains):
+            patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        return patterns
+
+    def block_reason(self, url: str, resource_type: str) -> str:
+        """Which rule refused a blocked request, for the stats."""
+        if resource_type in self.block_types:
+            return resource_type
+        host = (urlsplit(url).hostname or "").lower()
+        if host and matches_domain(host, self.block_domains):
+            return "domain"
+        return "third_party"
+
+    async def apply(self, context: BrowserContext) -> NetworkStats:
+        """Apply the profile to every page the context opens, popups included."""
+        stats = _context_stats.get(context)
+        if stats is not None:
+            return stats
+        stats = _context_stats[context] = NetworkStats()
+        if self.disable_animations:
+            await context.add_init_script(DISABLE_ANIMATIONS_SCRIPT)
+        context.on("page", lambda page: asyncio.create_task(self.apply_page(page)))
+        for page in context.pages:
+            await self.apply_page(page)
+        return stats
+
+    async def apply_page(self, page: Page):
+        """Start blocking on `page`, awaited before its first navigation so nothing slips through."""
+        stats = _context_stats.get(page.context)
+        if stats is None:
+            return
+        # The context's page event and the opener both get here, the second waits for the first
+        if page not in self._pages:
+            self._pages[page] = asyncio.create_task(PageBlocker(self, page, stats).start())
+        await self._pages[page]
+
+
+network_profile = NetworkProfile.from_env()
+
+
+def network_stats(context: BrowserContext) -> Optional[NetworkStats]:
+    return _context_stats.get(context)
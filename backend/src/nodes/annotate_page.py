@@ -1,8 +1,11 @@
+from langchain_core.runnables import RunnableConfig
+from src.event_bus import emit
 from src.graph_state import AgentState
-from src.utilities import mark_page
+from src.utilities import mark_page, get_page
 
 
-async def annotate_page(state: AgentState):
-    page = state["page"]
+async def annotate_page(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
     result = await mark_page(page)
-    return {"image": result["image"], "bboxes": result["bboxes"]}
+    emit(config, "screenshot", {"url": page.url, "image": result["image"], "bboxes": len(result["bboxes"])})
+    return {"image": result["image"], "bboxes": result["bboxes"], "current_url": page.url, "page_text": ""}
@@ -1,12 +1,13 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from src.graph_state import AgentState
-import os
+from langchain_core.runnables import RunnableConfig
+from src.graph_state import AgentState, add_token_usage
+from src.memory import memory_manager, prompt_size, render
+from src.llm import ainvoke_llm
+from src.prompt_builder import estimate_tokens, token_usage
+from src.resources import resources
 
 
-async def answer_node(state: AgentState):
-    system_message_answer = """ You are an assistant who is expert at answering the user input based on the notes.
+SYSTEM_MESSAGE = """ You are an assistant who is expert at answering the user input based on the notes.
     You will be given:
     Notes: {notes}
 
@@ -17,23 +18,35 @@ async def answer_node(state: AgentState):
     Provide the answer in proper markdown format. Use proper markdown formatting for the steps and final answer.
     """
 
-    prompt_answer = ChatPromptTemplate(
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate(
         messages=[
-            ("system", system_message_answer),
+            ("system", SYSTEM_MESSAGE),
             ("human", "User Input: {input}")
         ],
         input_variables=["notes", "input"],
     )
 
-    notes = state["notes"]
+
+resources.register("answer_prompt", build_prompt)
+
+
+async def answer_node(state: AgentState, config: RunnableConfig):
+    prompt_answer = resources.get("answer_prompt")
+
+    # The answer is the run's last step, so a fold still in flight is not waited for, its notes go verbatim
+    memory, memory_updates = memory_manager.compact(state, config, start_folds=False)
+    memory_manager.discard(config)
+    notes = render(*memory["notes"])
     input_str = state["input_str"]
 
     prompt_value_answer = prompt_answer.invoke({"notes": notes, "input": input_str})
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7, max_retries=3)
-    # llm = (ChatOpenAI(base_url=os.getenv("OPENROUTER_BASE_URL"), model=os.getenv("MODEL_NAME"),
-    #                   api_key="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",
-    #                   temperature=0.7, max_retries=3, timeout=None))
-    response_answer = llm.invoke(prompt_value_answer)
+    estimated_tokens = estimate_tokens(prompt_value_answer.to_messages())
+    response_answer = await ainvoke_llm(resources.get("llm"), prompt_value_answer, config)
     answer = response_answer.content
 
-    return {"answer": answer}
+    usage = add_token_usage(token_usage(response_answer, estimated_tokens), memory_updates.get("token_usage"))
+    folded = (state.get("notes_folded") or 0) + memory_updates.get("notes_folded", 0)
+    return {**memory_updates, "answer": answer, "token_usage": usage,
+            "prompt_size": prompt_size("answer_node", estimated_tokens, memory["notes"], folded)}
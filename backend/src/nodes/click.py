@@ -1,16 +1,28 @@
-import asyncio
+from langchain_core.runnables import RunnableConfig
+from src.action_parser import bbox_id as action_bbox_id
+from src.event_bus import emit
+from src.graph_state import AgentState, Action
+from src.settle import StepTimer
+from src.tracing import span
+from src.utilities import get_page
 
-from src.graph_state import AgentState
 
-
-async def click_node(state: AgentState):
-    page = state["page"]
+async def click_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
     action = state["action"]
-    bbox_id = int(action["action"].split(" ")[1].split("[")[1].split("]")[0])
-    if bbox_id not in [bbox["id"] for bbox in state["bboxes"]]:
-        return {"action": "retry", "args": f"Could not find bbox with id {bbox_id}"}
-    bbox = state["bboxes"][bbox_id]
-    await asyncio.sleep(2)
-    await page.mouse.click(bbox["x"], bbox["y"])
-    await asyncio.sleep(4)
-    return {"last_action": f"Click : clicked on {bbox_id}", "actions_taken": [f"Click : clicked on {bbox_id}"]}
+    timer = StepTimer("click_node")
+    bbox_id = action_bbox_id(action)
+    bbox = next((bbox for bbox in state["bboxes"] if bbox["id"] == bbox_id), None)
+    if bbox is None:
+        return {"action": Action(action="retry", args=f"Could not find bbox with id {bbox_id}"),
+                "actions_taken": [f"Click : could not find bbox with id {bbox_id}"]}
+    # Click once the target stopped moving, then wait for whatever the click triggered
+    await timer.stable_target(page, bbox["x"], bbox["y"])
+    with span("action", action="click"):
+        await page.mouse.click(bbox["x"], bbox["y"])
+    emit(config, "click", {"bbox_id": bbox_id, "x": bbox["x"], "y": bbox["y"], "text": bbox.get("text", "")})
+    report = await timer.settle(page, learn=True)
+    if report.navigated:
+        emit(config, "navigation", {"url": page.url, "status": "loaded"})
+    return {"last_action": f"Click : clicked on {bbox_id}", "actions_taken": [f"Click : clicked on {bbox_id}"],
+            "step_latency": timer.report()}
@@ -0,0 +1,29 @@
+from langchain_core.runnables import RunnableConfig
+from src.bbox_encoder import current_plan_step
+from src.extraction import CHUNK_SEPARATOR, page_text, select_chunks, split_chunks
+from src.graph_state import AgentState, steps_taken
+from src.utilities import get_page
+
+
+async def extract_node(state: AgentState, config: RunnableConfig):
+    """Read the page's main content (or PDF) in one step and keep the chunks relevant to the task."""
+    page = get_page(config)
+    try:
+        extracted = await page_text(page)
+    except Exception as e:
+        print(f"[extract_node] Could not extract text from {page.url}: {e}")
+        return {"page_text": "", "actions_taken": [f"Read : could not extract text from {page.url}"]}
+
+    chunks = split_chunks(extracted.text)
+    plan_step = current_plan_step(state.get("master_plan"), steps_taken(state))
+    selected = select_chunks(chunks, query=state["input_str"], plan_step=plan_step)
+    text = CHUNK_SEPARATOR.join(selected)
+    print(f"[extract_node] {extracted.kind} {extracted.url}: kept {len(selected)} of {len(chunks)} chunks, "
+          f"{len(text)} characters")
+
+    summary = f"Read : extracted {len(selected)} of {len(chunks)} sections of {extracted.url}"
+    update = {"page_text": text, "current_url": extracted.url, "last_action": summary, "actions_taken": [summary]}
+    if extracted.url != state.get("current_url"):
+        # Reached without annotating this page, the last screenshot and boxes belong to another one
+        update.update({"image": "", "bboxes": []})
+    return update
@@ -0,0 +1,15 @@
+from src.fast_path import match_rule
+from src.graph_state import AgentState
+
+
+async def fast_path_node(state: AgentState):
+    """Pick obvious actions (consent popups, the Google search box) without a model round-trip."""
+    match = match_rule(state, state.get("fast_path_hits") or [])
+    if match is None:
+        return {"fast_path_hit": ""}
+
+    key, action, thought = match
+    avoided = (state.get("llm_calls_avoided") or 0) + 1
+    print(f"[fast_path_node] {key}: {action['action']} ({avoided} LLM calls avoided this run)")
+    return {"action": action, "notes": [thought], "fast_path_hit": key, "fast_path_hits": [key],
+            "llm_calls_avoided": 1, "parse_error": ""}
@@ -1,8 +1,18 @@
+from langchain_core.runnables import RunnableConfig
+from src.event_bus import emit
 from src.graph_state import AgentState
+from src.settle import StepTimer
+from src.tracing import span
+from src.utilities import get_page
 
 
-async def go_back_node(state: AgentState):
-    page = state["page"]
-    await page.go_back()
+async def go_back_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
+    timer = StepTimer("go_back_node")
+    with span("action", action="go_back"):
+        await page.go_back(wait_until="commit")
+    await timer.settle(page, learn=True)
+    emit(config, "navigation", {"url": page.url, "status": "loaded"})
     return {"last_action": f"Go Back : Navigated back to page {page.url}",
-            "actions_taken": [f"Go Back : Navigated back to page {page.url}"]}
\ No newline at end of file
+            "actions_taken": [f"Go Back : Navigated back to page {page.url}"],
+            "step_latency": timer.report()}
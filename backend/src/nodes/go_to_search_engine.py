@@ -1,8 +1,19 @@
+from langchain_core.runnables import RunnableConfig
+from src.event_bus import emit
 from src.graph_state import AgentState
+from src.settle import StepTimer
+from src.tracing import span
+from src.utilities import get_page
 
 
-async def go_to_search_engine_node(state: AgentState):
-    page = state["page"]
-    await page.goto("https://www.google.com")
+async def go_to_search_engine_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
+    timer = StepTimer("go_to_search_engine_node")
+    emit(config, "navigation", {"url": "https://www.google.com", "status": "loading"})
+    with span("action", action="goto"):
+        await page.goto("https://www.google.com", wait_until="commit")
+    await timer.settle(page, learn=True)
+    emit(config, "navigation", {"url": page.url, "status": "loaded"})
     return {"last_action": "Go to Search Engine : Navigated to Google",
-            "actions_taken": ["Go to Search Engine : Navigated to Google"]}
\ No newline at end of file
+            "actions_taken": ["Go to Search Engine : Navigated to Google"],
+            "step_latency": timer.report()}
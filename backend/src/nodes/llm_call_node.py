@@ -1,13 +1,16 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-import os
-from src.graph_state import AgentState
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
+from src.graph_state import AgentState, AgentOutput, add_token_usage, steps_taken
+from src.llm import get_structured_llm, ainvoke_llm
+from src.streaming import chunk_text
+from src.prompt_builder import observation_message, estimate_tokens, token_usage
+from src.bbox_encoder import current_plan_step
+from src.memory import memory_manager, prompt_size, render
+from src.resources import resources
 
 
-async def llm_call_node(state: AgentState):
-    try:
-        template = """Imagine you are a robot browsing the web, just like humans. Now you need to complete a task. In each iteration,
+SYSTEM_TEMPLATE = """Imagine you are a robot browsing the web, just like humans. Now you need to complete a task. In each iteration,
         you will receive an Observation that includes a screenshot of a webpage and some texts. 
         Carefully analyze the bounding box information and the web page contents to identify the Numerical Label corresponding 
         to the Web Element that requires interaction, then follow
@@ -20,6 +23,8 @@ async def llm_call_node(state: AgentState):
         5. Go back
         7. Return to google to start over.
         8. Respond with the final answer
+        9. Research: read the top results of the current search results page in parallel, then answer from them
+        10. Read the main text of the current page or PDF in one step
     
         Correspondingly, Action should STRICTLY follow the format:
     
@@ -30,6 +35,8 @@ async def llm_call_node(state: AgentState):
         - GoBack
         - Google
         - Respond 
+        - Research
+        - Read
     
         Key Guidelines You MUST follow:
     
@@ -38,55 +45,97 @@ async def llm_call_node(state: AgentState):
         2) Always click close on the popups.
         3) When clicking or typing, ensure to select the correct bounding box.
         4) Numeric labels lie in the top-left corner of their corresponding bounding boxes and are colored the same.
-        5) Try to scroll down if a pdf or a document is opeened to read the entire document., if you dont find the information you need, go back to the previous page and try a different source and collect more data until you have enough information to answer the question.
+        5) If a pdf, an article or a long document is opened, use Read to get its text in one step instead of scrolling through it. If you dont find the information you need, go back to the previous page and try a different source and collect more data until you have enough information to answer the question.
     
         * Web Browsing Guidelines *
         1) Don't interact with useless web elements like Login, Sign-in, donation that appear in Webpages
         2) Select strategically to minimize time wasted.
+        3) On a search results page for a question that needs several sources, prefer Research over opening results one by one.
     
-        Your reply should strictly follow the format:
-        Thought: {{Your brief thoughts (briefly summarize the info that will help ANSWER)}}
+        Reply by calling the AgentOutput tool with:
+        thought: {{Your brief thoughts (briefly summarize the info that will help ANSWER)}}
+        action: {{One action: Click, Type, Scroll, Wait, GoBack, Google, Respond, Research or Read}}
+        target: {{The Numerical_Label for Click, Type and Scroll, or WINDOW to scroll the page}}
+        content: {{The text for Type, up or down for Scroll}}
+        If you cannot call the tool, reply as text in the format:
+        Thought: {{Your brief thoughts}}
         Action: {{One Action format you choose}} (Make sure to enclose the bbox id in [] , for eg  Click [1], Type [5], Scroll [10] or Scroll [WINDOW])
     
         Then the User will provide:
         Observation: {{A labeled bounding boxes and contents given by User}}"
-        Actions Taken: {{A list of actions taken so far}} (Could be empty, if it is the first iteration)
+        Actions Taken: {{The recent actions taken so far, older ones summarized}} (Could be empty, if it is the first iteration)
         Master Plan: {{A set of steps that you can use as a reference to complete the task}}
     
         Observation including a screenshot of a webpage with bounding boxes and the text related to it: {{result}}"""
 
-        prompt = ChatPromptTemplate(
-            messages=[
-                ("system", template),
-                ("human", "Input: {input}"),
-                ("human", "Actions Taken So far: {actions_taken}"),
-                ("human", "Observation: Screenshot: {image}"),
-                ("human", "Observation: Bounding Boxes: {bboxes}"),
 
-            ],
-            input_variables=["image", "bboxes", "input"],
-            partial_variables={"actions_taken": []},
-            optional_variables=["actions_taken"]
-        )
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate(
+        messages=[
+            ("system", SYSTEM_TEMPLATE),
+            ("human", "Input: {input}"),
+            ("human", "Actions Taken So far: {actions_taken}"),
+            MessagesPlaceholder("observation"),
+            MessagesPlaceholder("correction", optional=True),
+        ],
+        input_variables=["observation", "input"],
+        partial_variables={"actions_taken": "None yet"},
+        optional_variables=["actions_taken"]
+    )
+
+
+resources.register("llm_call_prompt", build_prompt)
+resources.register("agent_output_llm", lambda: get_structured_llm(AgentOutput, include_raw=True))
+
 
-        actions_taken = state.get("actions_taken", [])
+async def llm_call_node(state: AgentState, config: RunnableConfig):
+    try:
+        prompt = resources.get("llm_call_prompt")
+
+        # Recent actions verbatim and older ones as a summary folded in the background
+        memory, memory_updates = memory_manager.compact(state, config)
+        actions_taken = render(*memory["actions_taken"])
         image = state["image"]
         bboxes = state["bboxes"]
         input_str = state["input_str"]
         master_plan = state["master_plan"]
+        page_text = state.get("page_text")
+        if page_text:
+            # The page was read as text, the screenshot would only repeat it
+            image = ""
+            page_text = f"Observation: Page text (sections relevant to the task):\n{page_text}"
+
+        correction = []
+        if state.get("parse_error"):
+            # Same observation as the unusable reply, only the reason it failed is added
+            correction = [HumanMessage(content=f"Your previous reply could not be used: {state['parse_error']} "
+                                               f"Reply again with exactly one valid action.")]
 
         prompt_value = prompt.invoke(
-            {"actions_taken": actions_taken, "image": image, "bboxes": bboxes, "input": input_str,
-             "master_plan": master_plan})
+            {"actions_taken": actions_taken, "correction": correction,
+             "observation": [observation_message(image, bboxes, text=page_text or "", query=input_str,
+                                                 plan_step=current_plan_step(master_plan, steps_taken(state)))],
+             "input": input_str, "master_plan": master_plan})
 
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7, max_retries=3)
-        # llm = (ChatOpenAI(base_url=os.getenv("OPENROUTER_BASE_URL"), model=os.getenv("MODEL_NAME"),
-        #                   api_key="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",
-        #                   temperature=0.7, max_retries=3, timeout=None))
-        response = llm.invoke(prompt_value)
+        estimated_tokens = estimate_tokens(prompt_value.to_messages())
+        response = await ainvoke_llm(resources.get("agent_output_llm"), prompt_value, config)
+        raw = response["raw"]
+        usage = token_usage(raw, estimated_tokens)
+        size = prompt_size("llm_call_node", estimated_tokens, memory["actions_taken"],
+                           steps_taken(state) - len(memory["actions_taken"][1]))
+        print(f"[llm_call_node] Prompt ~{estimated_tokens} tokens (estimated, {size['memory_tokens']} of past actions), "
+              f"{usage['input_tokens']} in / {usage['output_tokens']} out (reported)")
 
-        action = response.content
+        # The validated tool call, else its raw arguments or the reply text for parse_action_node to judge
+        if response["parsed"] is not None:
+            action = response["parsed"].model_dump()
+        elif raw.tool_calls:
+            action = raw.tool_calls[0]["args"]
+        else:
+            action = chunk_text(raw)
 
-        return {"action": action}
+        if "token_usage" in memory_updates:
+            usage = add_token_usage(usage, memory_updates["token_usage"])
+        return {**memory_updates, "action": action, "token_usage": usage, "prompt_size": size}
     except Exception as e:
         raise e
@@ -1,18 +1,14 @@
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-import os
-# from langgraph.errors import
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
+from src.cache import plan_cache, plan_key
 from src.graph_state import AgentState, MasterPlanState
-from src.utilities import mark_page
+from src.llm import get_structured_llm, ainvoke_llm
+from src.prompt_builder import observation_message, estimate_tokens, token_usage
+from src.resources import resources
+from src.utilities import mark_page, get_page
 
 
-async def master_plan_node(state: AgentState):
-    try:
-        page = state["page"]
-        screen_shot = await mark_page(page)
-
-        system_message = """
+SYSTEM_MESSAGE = """
         You are an expert a preparing a step by step plan to complete a task.
         You will be given a task provided by the user. The task might also be a question.
         You will need to prepare a plan to complete the task. In case its a question, you will need to prepare a plan to answer the question.
@@ -33,6 +29,11 @@ async def master_plan_node(state: AgentState):
         6. If you do not have enough information, go back to the previous page and try a different source and collect 
         more data until you have enough information to answer the question.
     
+        For research questions that need several sources, plan to read the top search results in parallel instead:
+        1. Go to Google
+        2. Type "Apple stock price news today" in the search bar and press enter
+        3. Research the top search results in parallel and answer from what they say
+    
         Your plan should be clear, sequential, and focused on achieving the user's goal efficiently. 
     
         --Notes--
@@ -40,24 +41,41 @@ async def master_plan_node(state: AgentState):
         For any question, you will need to go to google and search for the question.
         """
 
-        human_prompt = """ This is the task that needs to be performed/question that needs to be answered: {input} \n 
-        This is the screenshot of the current web page: {screenshot}"""
+HUMAN_PROMPT = """ This is the task that needs to be performed/question that needs to be answered: {input} \n 
+        This is the screenshot of the current web page and its labelled elements:"""
+
+resources.register("master_plan_system_message", lambda: SystemMessage(content=SYSTEM_MESSAGE))
+resources.register("master_plan_llm", lambda: get_structured_llm(MasterPlanState))
 
+
+async def master_plan_node(state: AgentState, config: RunnableConfig):
+    try:
+        page = get_page(config)
         input_str = state["input_str"]
 
-        human_message = human_prompt.format(input=input_str, screenshot=screen_shot)
+        # Equivalent tasks from the same start page reuse a stored plan instead of calling the model
+        key = plan_key(input_str, page.url)
+        if key is not None and not config.get("configurable", {}).get("bypass_cache"):
+            cached_plan = plan_cache.get(key)
+            if cached_plan is not None:
+                print(f"[master_plan_node] Reusing cached plan for: {input_str}")
+                return {"master_plan": [MasterPlanState(plan=list(cached_plan))]}
+
+        screen_shot = await mark_page(page)
+
+        human_message = HUMAN_PROMPT.format(input=input_str)
 
         messages = [
-            SystemMessage(content=system_message),
-            HumanMessage(content=human_message)
+            resources.get("master_plan_system_message"),
+            observation_message(screen_shot["image"], screen_shot["bboxes"], text=human_message,
+                                query=input_str)
         ]
 
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7, max_retries=3)
-        # llm = (ChatOpenAI(base_url=os.getenv("OPENROUTER_BASE_URL"), model=os.getenv("MODEL_NAME")))
-        structured_llm = llm.with_structured_output(MasterPlanState)
-
-        response = structured_llm.invoke(messages)
+        estimated_tokens = estimate_tokens(messages)
+        response = await ainvoke_llm(resources.get("master_plan_llm"), messages, config)
+        if key is not None:
+            plan_cache.set(key, tuple(response.plan))
 
-        return {"master_plan": [response]}
+        return {"master_plan": [response], "token_usage": token_usage(response, estimated_tokens)}
     except Exception as e:
         raise e
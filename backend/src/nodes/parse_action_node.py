@@ -1,17 +1,17 @@
+from src.action_parser import LLM_PARSE_RETRIES, ActionParseError, parse_agent_output, to_action
 from src.graph_state import AgentState, Action
 
 
 async def parse_action_node(state: AgentState):
-    action_prefix = "Action: "
-    text = state["action"]
-    if not text.strip().split("Action:")[-1]:
-        return {"action": "retry", "args": f"Could not parse LLM Output: {text}"}
-    action_block = text.strip().split("Action: ")[-1]
-    thought_block = text.strip().split("Action: ")[0].split("Thought: ")[-1]
-    split_output = action_block.split("; ", 1)
-    if len(split_output) == 1:
-        action, args = split_output[0], None
-    else:
-        action, args = split_output
+    """Validate the model's reply once; an unusable reply is sent back to the model with the reason."""
+    try:
+        output = parse_agent_output(state["action"])
+    except ActionParseError as e:
+        failures = (state.get("parse_failures") or 0) + 1
+        print(f"[parse_action_node] Unusable reply ({failures} in a row): {e}")
+        if failures > LLM_PARSE_RETRIES:
+            # Out of re-asks, observe the page again and give the fresh observation its own retries
+            return {"action": Action(action="retry", args=str(e)), "parse_error": "", "parse_failures": 0}
+        return {"action": Action(action="retry", args=str(e)), "parse_error": str(e), "parse_failures": failures}
 
-    return {"action": Action(action=action, args=args), "notes": [thought_block]}
+    return {"action": to_action(output), "notes": [output.thought], "parse_error": "", "parse_failures": 0}
@@ -0,0 +1,72 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from src.event_bus import emit
+from src.extraction import CHUNK_SEPARATOR, looks_like_pdf, page_text, pdf_text, select_chunks, split_chunks
+from src.llm import ainvoke_llm
+from src.network_profile import network_profile
+from src.prompt_builder import estimate_tokens, token_usage
+from src.resources import resources
+from src.research import SourceState, RESEARCH_PAGE_TIMEOUT_SECONDS, RESEARCH_TEXT_LIMIT
+from src.settle import settle
+from src.utilities import get_page
+
+
+SYSTEM_MESSAGE = """You are reading one web page to help answer the user input.
+    Extract every fact from the page text that helps answer the user input, with numbers, dates and names exactly
+    as written. Be brief. If the page has nothing relevant, reply with NONE.
+    """
+
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate(
+        messages=[
+            ("system", SYSTEM_MESSAGE),
+            ("human", "User Input: {input}\n\nPage: {title}\n\nPage text:\n{text}")
+        ],
+        input_variables=["input", "title", "text"],
+    )
+
+
+resources.register("read_source_prompt", build_prompt)
+
+
+async def read_source_node(state: SourceState, config: RunnableConfig):
+    """Open one research source in its own tab of the session's context and note what it says about the task."""
+    url, title = state["url"], state["title"] or state["url"]
+    context = get_page(config).context
+    tab = None
+    try:
+        if looks_like_pdf(url):
+            # Headless Chromium downloads PDFs instead of showing them, fetch the file directly
+            text = await pdf_text(context, url)
+        else:
+            tab = await context.new_page()
+            # Same blocking as the agent's page from the first request on
+            await network_profile.apply_page(tab)
+            await tab.goto(url, timeout=RESEARCH_PAGE_TIMEOUT_SECONDS * 1000, wait_until="domcontentloaded")
+            await settle(tab, timeout=2)
+            text = (await page_text(tab)).text
+    except Exception as e:
+        print(f"[read_source_node] Could not read {url}: {e}")
+        return {"actions_taken": [f"Research : could not read {title}"]}
+    finally:
+        if tab is not None:
+            await tab.close()
+    # Send the parts of long pages that are about the task rather than their first characters
+    text = CHUNK_SEPARATOR.join(select_chunks(split_chunks(text), query=state["input_str"],
+                                              char_budget=RESEARCH_TEXT_LIMIT))
+    emit(config, "research", {"url": url, "title": title, "characters": len(text)})
+    if not text:
+        return {"actions_taken": [f"Research : {title} had no readable text"]}
+
+    prompt = resources.get("read_source_prompt")
+    prompt_value = prompt.invoke({"input": state["input_str"], "title": title, "text": text})
+    estimated_tokens = estimate_tokens(prompt_value.to_messages())
+    response = await ainvoke_llm(resources.get("llm"), prompt_value, config)
+    usage = token_usage(response, estimated_tokens)
+
+    facts = response.content.strip()
+    if not facts or facts.upper().startswith("NONE"):
+        return {"actions_taken": [f"Research : nothing relevant in {title}"], "token_usage": usage}
+    return {"notes": [f"From {title} ({url}): {facts}"], "actions_taken": [f"Research : read {title}"],
+            "token_usage": usage}
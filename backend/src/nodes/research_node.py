@@ -0,0 +1,16 @@
+from langchain_core.runnables import RunnableConfig
+from src.graph_state import AgentState
+from src.research import result_links
+from src.utilities import get_page
+
+
+async def research_node(state: AgentState, config: RunnableConfig):
+    """Collect the top result links of the current search page for read_source_node to open in parallel."""
+    page = get_page(config)
+    links = await result_links(page)
+    if not links:
+        return {"research_links": [], "last_action": "Research : no result links on this page",
+                "actions_taken": ["Research : no result links on this page"]}
+    titles = ", ".join(link["title"] or link["url"] for link in links)
+    return {"research_links": links, "last_action": f"Research : reading {len(links)} sources in parallel",
+            "actions_taken": [f"Research : reading {titles}"]}
@@ -1,11 +1,18 @@
-from src.graph_state import AgentState
+from langchain_core.runnables import RunnableConfig
+from src.action_parser import action_target, bbox_id as action_bbox_id
+from src.event_bus import emit
+from src.graph_state import AgentState, Action
+from src.settle import StepTimer
+from src.tracing import span
+from src.utilities import get_page
 
 
-async def scroll_node(state: AgentState):
-    page = state["page"]
+async def scroll_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
     action = state["action"]
-    scroll_type = action["action"].split(" ")[1].split("[")[1].split("]")[0]
-    direction = action["args"]
+    timer = StepTimer("scroll_node")
+    scroll_type = (action_target(action) or "WINDOW").upper()
+    direction = action["args"] or "down"
 
     async def is_pdf_page():
         current_url = page.url
@@ -21,7 +28,6 @@ async def scroll_node(state: AgentState):
         for key in keys:
             try:
                 await page.keyboard.press(key)
-                await page.wait_for_timeout(100)
                 break  # Exit after first successful key press
             except Exception as e:
                 print(f"Failed with key {key}: {str(e)}")
@@ -34,79 +40,86 @@ async def scroll_node(state: AgentState):
         if is_pdf:
             try:
                 # Wait for PDF to load
-                await page.wait_for_load_state('networkidle')
-                await page.wait_for_timeout(1000)
+                await timer.settle(page, learn=True)
 
-                # Try to click on the PDF to ensure focus
-                try:
-                    await page.mouse.click(300, 300)  # Click somewhere in the middle of the page
-                except Exception:
-                    pass
+                with span("action", action="scroll"):
+                    # Try to click on the PDF to ensure focus
+                    try:
+                        await page.mouse.click(300, 300)  # Click somewhere in the middle of the page
+                    except Exception:
+                        pass
 
-                # Single scroll attempt
-                await try_scroll_methods(direction.lower() == "down")
-                await page.wait_for_timeout(500)
+                    # Single scroll attempt
+                    await try_scroll_methods(direction.lower() == "down")
+                await timer.settle(page, timeout=2, quiet_ms=150)
 
+                emit(config, "scroll", {"direction": direction, "target": "pdf"})
                 return {
                     "last_action": f"Scroll : scrolled {direction} on PDF document",
-                    "actions_taken": [f"Scroll : scrolled {direction} on PDF document"]
+                    "actions_taken": [f"Scroll : scrolled {direction} on PDF document"],
+                    "step_latency": timer.report()
                 }
 
             except Exception as e:
                 print(f"PDF scrolling error: {str(e)}")
                 return {
-                    "action": "retry",
-                    "args": f"Error scrolling PDF: {str(e)}",
+                    "action": Action(action="retry", args=f"Error scrolling PDF: {str(e)}"),
                     "actions_taken": [f"Error scrolling PDF: {str(e)}"]
                 }
         else:
             # Regular webpage scrolling with exactly 500px
             scroll_amount = 500  # Changed from 800 to 500
             scroll_direction = -scroll_amount if direction.lower() == "up" else scroll_amount
-            try:
-                await page.evaluate(f"""
-                    window.scrollBy({{
-                        top: {scroll_direction},
-                        left: 0,
-                        behavior: 'smooth'
-                    }});
-                """)
-            except Exception:
-                await page.evaluate(f"window.scrollBy(0, {scroll_direction})")
-
-        await page.wait_for_timeout(500)
+            with span("action", action="scroll"):
+                try:
+                    await page.evaluate(f"""
+                        window.scrollBy({{
+                            top: {scroll_direction},
+                            left: 0,
+                            behavior: 'smooth'
+                        }});
+                    """)
+                except Exception:
+                    await page.evaluate(f"window.scrollBy(0, {scroll_direction})")
+
+        # Smooth scrolling keeps firing scroll events until it ends
+        await timer.settle(page, timeout=2, quiet_ms=150)
 
+        emit(config, "scroll", {"direction": direction, "target": "window"})
         return {
             "last_action": f"Scroll : scrolled {direction}",
-            "actions_taken": [f"Scroll : scrolled {direction}"]
+            "actions_taken": [f"Scroll : scrolled {direction}"],
+            "step_latency": timer.report()
         }
 
     else:
         # Element-specific scrolling
         try:
-            bbox_id = int(action["action"].split("[")[1].split("]")[0])
-            if bbox_id not in [bbox["id"] for bbox in state["bboxes"]]:
+            bbox_id = action_bbox_id(action)
+            bbox = next((bbox for bbox in state["bboxes"] if bbox["id"] == bbox_id), None)
+            if bbox is None:
                 return {
-                    "action": "retry",
-                    "args": f"Could not find bbox with id {bbox_id}",
+                    "action": Action(action="retry", args=f"Could not find bbox with id {bbox_id}"),
                     "actions_taken": [f"Could not find bbox with id {bbox_id}"]
                 }
 
-            bbox = state["bboxes"][bbox_id]
             scroll_amount = 200
             scroll_direction = -scroll_amount if direction.lower() == "up" else scroll_amount
 
-            await page.mouse.move(bbox["x"], bbox["y"])
-            await page.mouse.wheel(0, scroll_direction)
+            with span("action", action="scroll"):
+                await page.mouse.move(bbox["x"], bbox["y"])
+                await page.mouse.wheel(0, scroll_direction)
+            await timer.settle(page, timeout=2, quiet_ms=150)
 
+            emit(config, "scroll", {"direction": direction, "target": bbox_id})
             return {
                 "last_action": f"Scroll : scrolled {direction} at element {bbox_id}",
-                "actions_taken": [f"Scroll : scrolled {direction} at element {bbox_id}"]
+                "actions_taken": [f"Scroll : scrolled {direction} at element {bbox_id}"],
+                "step_latency": timer.report()
             }
 
         except Exception as e:
             return {
-                "action": "retry",
-                "args": f"Error scrolling element: {str(e)}",
+                "action": Action(action="retry", args=f"Error scrolling element: {str(e)}"),
                 "actions_taken": [f"Error scrolling element: {str(e)}"]
             }
@@ -1,27 +1,37 @@
-import asyncio
 import platform
-from src.graph_state import AgentState
+from langchain_core.runnables import RunnableConfig
+from src.action_parser import bbox_id as action_bbox_id
+from src.event_bus import emit
+from src.graph_state import AgentState, Action
+from src.settle import StepTimer
+from src.tracing import span
+from src.utilities import get_page
 
 
-async def type_node(state: AgentState):
-    page = state["page"]
+async def type_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
     action = state["action"]
-    bbox_id = int(action["action"].split("[")[1].split("]")[0])
-    if bbox_id not in [bbox["id"] for bbox in state["bboxes"]]:
-        return {"action": "retry", "args": f"Could not find bbox with id {bbox_id}"}
-    bbox = state["bboxes"][bbox_id]
-    await page.mouse.click(bbox["x"], bbox["y"])
-    select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
-    await page.keyboard.press(select_all)
-    await asyncio.sleep(2)
-    select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
-    await page.keyboard.press(select_all)
-    await asyncio.sleep(1)
-    await page.keyboard.press("Backspace")
-    await asyncio.sleep(1)
-    await page.keyboard.type(action["args"])
-    await asyncio.sleep(3)
-    await page.keyboard.press("Enter")
-    await asyncio.sleep(3)
+    timer = StepTimer("type_node")
+    bbox_id = action_bbox_id(action)
+    bbox = next((bbox for bbox in state["bboxes"] if bbox["id"] == bbox_id), None)
+    if bbox is None:
+        return {"action": Action(action="retry", args=f"Could not find bbox with id {bbox_id}"),
+                "actions_taken": [f"Type : could not find bbox with id {bbox_id}"]}
+    await timer.stable_target(page, bbox["x"], bbox["y"])
+    with span("action", action="type"):
+        await page.mouse.click(bbox["x"], bbox["y"])
+        select_all = "Meta+A" if platform.system() == "Darwin" else "Control+A"
+        await page.keyboard.press(select_all)
+        await page.keyboard.press("Backspace")
+        await page.keyboard.type(action["args"])
+    # Let autocomplete and similar widgets react before submitting
+    await timer.settle(page, timeout=1, quiet_ms=150)
+    with span("action", action="submit"):
+        await page.keyboard.press("Enter")
+    emit(config, "type", {"bbox_id": bbox_id, "text": action["args"]})
+    report = await timer.settle(page, learn=True)
+    if report.navigated:
+        emit(config, "navigation", {"url": page.url, "status": "loaded"})
     return {"last_action": f"Type : typed {action['args']} into {bbox_id}",
-            "actions_taken": [f"Type : typed {action['args']} into {bbox_id}"]}
+            "actions_taken": [f"Type : typed {action['args']} into {bbox_id}"],
+            "step_latency": timer.report()}
@@ -1,7 +1,14 @@
-import asyncio
+from langchain_core.runnables import RunnableConfig
 from src.graph_state import AgentState
+from src.settle import StepTimer
+from src.utilities import get_page
 
 
-async def wait_node(state: AgentState):
-    await asyncio.sleep(3)
-    return {"last_action": "Wait : waited for 3 seconds", "actions_taken": ["Wait : waited for 3 seconds"]}
\ No newline at end of file
+async def wait_node(state: AgentState, config: RunnableConfig):
+    page = get_page(config)
+    timer = StepTimer("wait_node")
+    # Wait up to 3 seconds, but stop as soon as the page has settled
+    report = await timer.settle(page, timeout=3)
+    waited = f"{report.waited_ms / 1000:.1f}"
+    return {"last_action": f"Wait : waited for {waited} seconds", "actions_taken": [f"Wait : waited for {waited} seconds"],
+            "step_latency": timer.report()}
@@ -0,0 +1,70 @@
+from langchain_core.messages import BaseMessage, HumanMessage
+from typing_extensions import List, Optional
+
+from src.bbox_encoder import CHARS_PER_TOKEN, encode_bboxes
+from src.graph_state import Bbox, TokenUsage
+
+# Leading base64 characters of each encoding the screenshot pipeline can produce
+IMAGE_MIME_TYPES = {
+    "/9j/": "image/jpeg",
+    "UklGR": "image/webp",
+    "iVBOR": "image/png",
+}
+
+# Gemini bills an image up to 768x768 as a flat 258 tokens
+IMAGE_TOKENS = 258
+
+
+def image_part(image: str) -> Optional[dict]:
+    """Wrap a base64 screenshot as an image content part, or None when there is no screenshot."""
+    if not image:
+        return None
+    mime_type = next((mime for prefix, mime in IMAGE_MIME_TYPES.items() if image.startswith(prefix)),
+                     "image/jpeg")
+    return {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image}"}}
+
+
+def observation_message(image: str, bboxes: List[Bbox], text: str = "", query: str = "",
+                        plan_step: str = "") -> HumanMessage:
+    """
+    A single human turn carrying the screenshot as an image part and the bboxes in the compact
+    encoding, ranked against `query` and `plan_step` when they exceed the token budget.
+    """
+    content = []
+    if text:
+        content.append({"type": "text", "text": text})
+    encoded_bboxes = encode_bboxes(bboxes, query=query, plan_step=plan_step)
+    content.append({"type": "text", "text": f"Observation: Bounding Boxes:\n{encoded_bboxes}"})
+    part = image_part(image)
+    if part:
+        content.append({"type": "text", "text": "Observation: Screenshot:"})
+        content.append(part)
+    return HumanMessage(content=content)
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough prompt size before sending: text at ~4 characters per token plus a flat cost per image."""
+    tokens = 0
+    for message in messages:
+        if isinstance(message.content, str):
+            tokens += len(message.content) // CHARS_PER_TOKEN
+            continue
+        for part in message.content:
+            if isinstance(part, str):
+                tokens += len(part) // CHARS_PER_TOKEN
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // CHARS_PER_TOKEN
+    return tokens
+
+
+def token_usage(response, estimated_input_tokens: int) -> TokenUsage:
+    """Usage reported by the model for one call, falling back to estimates when it reports none."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    output = getattr(response, "content", response)
+    return TokenUsage(
+        input_tokens=usage.get("input_tokens", estimated_input_tokens),
+        output_tokens=usage.get("output_tokens", len(str(output)) // CHARS_PER_TOKEN),
+        llm_calls=1
+    )
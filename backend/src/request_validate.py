@@ -7,5 +7,14 @@ class BrowserSetupRequest(BaseModel):
 
 class QueryRequest(BaseModel):
     query: str
+    session_id: str
+    # Skip the answer and plan caches, fresh results still refresh them
+    bypass_cache: bool = False
 
 
+class CleanupRequest(BaseModel):
+    session_id: str
+
+
+class ResumeRequest(BaseModel):
+    session_id: str
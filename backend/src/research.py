@@ -0,0 +1,52 @@
+import os
+from typing_extensions import List, TypedDict
+
+from playwright.async_api import Page, Error as PlaywrightError
+
+RESEARCH_TOP_K = int(os.getenv("RESEARCH_TOP_K", "3"))
+RESEARCH_PAGE_TIMEOUT_SECONDS = float(os.getenv("RESEARCH_PAGE_TIMEOUT_SECONDS", "15"))
+RESEARCH_TEXT_LIMIT = int(os.getenv("RESEARCH_TEXT_LIMIT", "12000"))
+
+# Organic result links of the search engines the agent starts from, ads and engine pages excluded
+RESULT_LINKS_SCRIPT = """(limit) => {
+    const selectors = [
+        "#search a:has(h3)", "#rso a:has(h3)",           // Google
+        "#b_results h2 a",                               // Bing
+        "a[data-testid='result-title-a']",               // DuckDuckGo
+    ];
+    const engine = /(^|\\.)(google|bing|duckduckgo)\\./;
+    const seen = new Set();
+    const links = [];
+    for (const anchor of document.querySelectorAll(selectors.join(","))) {
+        let url;
+        try { url = new URL(anchor.href); } catch (e) { continue; }
+        if (!url.protocol.startsWith("http") || engine.test(url.hostname)) continue;
+        url.hash = "";
+        if (seen.has(url.href)) continue;
+        seen.add(url.href);
+        const heading = anchor.querySelector("h3") || anchor;
+        links.push({ url: url.href, title: heading.innerText.trim() });
+        if (links.length >= limit) break;
+    }
+    return links;
+}"""
+
+
+class SourceLink(TypedDict):
+    url: str
+    title: str
+
+
+class SourceState(TypedDict):
+    """What each parallel `read_source_node` receives through `Send`."""
+    url: str
+    title: str
+    input_str: str
+
+
+async def result_links(page: Page, limit: int = RESEARCH_TOP_K) -> List[SourceLink]:
+    try:
+        return await page.evaluate(RESULT_LINKS_SCRIPT, limit)
+    except PlaywrightError as e:
+        print(f"[research] Could not collect result links: {e}")
+        return []
@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing_extensions import Any, Callable, Dict
+
+from src.llm import get_llm
+
+
+class Resources:
+    """
+    Objects every step of every run shares: prompt templates, model clients and the screenshot
+    encoders. Each is built by its registered factory on first use, or all of them at startup by
+    `warm()`, so the first query doesn't pay for building them.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._built: Dict[str, Any] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        if name not in self._built:
+            self._built[name] = self._factories[name]()
+        return self._built[name]
+
+    def replace(self, name: str, value: Any):
+        """Serve `value` as `name` from now on, e.g. a scripted model in the offline benchmarks."""
+        self._factories[name] = lambda: value
+        self._built[name] = value
+
+    async def warm(self):
+        start = time.perf_counter()
+        for name in self._factories:
+            resource = self.get(name)
+            # Gemini clients create their async transport on first use, it needs the running loop.
+            # Structured models wrap these same clients.
+            if hasattr(resource, "async_client"):
+                resource.async_client
+        await warm_encoders()
+        print(f"[resources] Warmed {len(self._factories)} resources in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def clear(self):
+        self._built.clear()
+
+
+async def warm_encoders():
+    """Start every screenshot encoder worker now, a process pool otherwise forks on the first screenshot."""
+    from src.screenshot import SCREENSHOT_WORKERS, get_executor
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, time.sleep, 0) for _ in range(SCREENSHOT_WORKERS)))
+
+
+resources = Resources()
+
+# Plain models for answers, research extraction and memory folds, structured ones are registered by their nodes
+resources.register("llm", lambda: get_llm())
+resources.register("llm_summary", lambda: get_llm(temperature=0))
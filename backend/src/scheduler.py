@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing_extensions import AsyncIterator, Deque, Dict, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from src.graph_state import AgentState, steps_taken
+
+# Graph runs executing at once in this process, and per tenant
+SCHEDULER_MAX_RUNS = int(os.getenv("SCHEDULER_MAX_RUNS", "8"))
+SCHEDULER_MAX_RUNS_PER_TENANT = int(os.getenv("SCHEDULER_MAX_RUNS_PER_TENANT", "2"))
+# Runs allowed to wait for a slot, more are turned away
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "64"))
+
+# Per-run budgets, a run past any of them goes straight to answer_node with what it has (0 disables)
+RUN_MAX_STEPS = int(os.getenv("RUN_MAX_STEPS", "60"))
+RUN_MAX_SECONDS = float(os.getenv("RUN_MAX_SECONDS", "300"))
+RUN_MAX_TOKENS = int(os.getenv("RUN_MAX_TOKENS", "300000"))
+
+
+class SchedulerFullError(RuntimeError):
+    """Raised when the run queue already holds SCHEDULER_MAX_QUEUE waiting runs."""
+
+
+class Ticket:
+    """A run's place in the scheduler, waiting until admitted and holding a slot until released."""
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.released = False
+        self.position = 0  # 1-based order among waiting runs, 0 once admitted
+        self._changed = asyncio.Event()
+
+    def _update(self, position: int, admitted: bool = False):
+        self.position = position
+        self.admitted = admitted
+        self._changed.set()
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield the queue position each time it changes, returning once the run is admitted."""
+        reported = None
+        while True:
+            # Cleared before reading the state, an update while the caller held a yield is never lost
+            self._changed.clear()
+            if self.admitted:
+                return
+            if self.position != reported:
+                reported = self.position
+                yield reported
+                continue
+            await self._changed.wait()
+
+
+class RunScheduler:
+    """
+    Admission control for graph runs: at most `max_runs` at once and `max_runs_per_tenant` per tenant.
+    Waiting runs are admitted round-robin across tenants, so one tenant's backlog never holds back
+    another tenant's first run.
+    """
+
+    def __init__(self, max_runs: int = SCHEDULER_MAX_RUNS, max_runs_per_tenant: int = SCHEDULER_MAX_RUNS_PER_TENANT,
+                 max_queue: int = SCHEDULER_MAX_QUEUE):
+        self.max_runs = max_runs
+        self.max_runs_per_tenant = max_runs_per_tenant
+        self.max_queue = max_queue
+        self._running: Dict[str, int] = {}
+        # Tenants with waiting runs, in the order they get their next turn
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._counters = {"admitted": 0, "rejected": 0, "cancelled_waiting": 0, "wait_ms": 0.0}
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def enqueue(self, tenant: str) -> Ticket:
+        if self.waiting() >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise SchedulerFullError(f"{self.waiting()} runs are already waiting, try again later")
+        ticket = Ticket(tenant)
+        self._queues.setdefault(tenant, deque()).append(ticket)
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free the run's slot, or drop it from the queue if it was never admitted (client went away)."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted:
+            self._running[ticket.tenant] -= 1
+            if not self._running[ticket.tenant]:
+                del self._running[ticket.tenant]
+        else:
+            queue = self._queues.get(ticket.tenant)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.tenant]
+            self._counters["cancelled_waiting"] += 1
+        self._dispatch()
+
+    def _has_room(self, tenant: str) -> bool:
+        return self._running.get(tenant, 0) < self.max_runs_per_tenant
+
+    def _dispatch(self):
+        while self.running() < self.max_runs:
+            tenant = next((tenant for tenant in self._queues if self._has_room(tenant)), None)
+            if tenant is None:
+                break
+            queue = self._queues[tenant]
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            self._counters["admitted"] += 1
+            self._counters["wait_ms"] += (time.monotonic() - ticket.enqueued) * 1000
+            ticket._update(0, admitted=True)
+
+        # Positions follow the admission order: one run per tenant per round, in turn order
+        position = 0
+        queues = [list(queue) for queue in self._queues.values()]
+        for round_index in range(max((len(queue) for queue in queues), default=0)):
+            for queue in queues:
+                if round_index < len(queue):
+                    position += 1
+                    if queue[round_index].position != position:
+                        queue[round_index]._update(position)
+
+    def stats(self) -> Dict[str, float]:
+        return {"running": self.running(), "waiting": self.waiting(),
+                "tenants": len(set(self._running) | set(self._queues)),
+                **{key: round(value, 1) for key, value in self._counters.items()}}
+
+
+run_scheduler = RunScheduler()
+
+
+def tokens_used(state: AgentState) -> int:
+    usage = state.get("token_usage") or {}
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+@dataclass
+class RunBudget:
+    """
+    Limits of one run, checked before every action the graph routes to. A resumed run is budgeted
+    from where it resumed: steps and tokens already in the checkpoint don't count.
+    """
+    max_steps: int = RUN_MAX_STEPS
+    max_seconds: float = RUN_MAX_SECONDS
+    max_tokens: int = RUN_MAX_TOKENS
+    started: float = field(default_factory=time.monotonic)
+    steps_before: int = 0
+    tokens_before: int = 0
+    exceeded: str = ""  # which limit ended the run, empty while within budget
+
+    @classmethod
+    def resuming(cls, state: AgentState) -> "RunBudget":
+        return cls(steps_before=steps_taken(state), tokens_before=tokens_used(state))
+
+    def check(self, state: AgentState) -> str:
+        limits = [
+            ("steps", self.max_steps, steps_taken(state) - self.steps_before),
+            ("seconds", self.max_seconds, time.monotonic() - self.started),
+            ("tokens", self.max_tokens, tokens_used(state) - self.tokens_before),
+        ]
+        for name, limit, used in limits:
+            if limit and used >= limit:
+                return f"{name} budget of {limit:g} used up ({used:g})"
+        return ""
+
+
+def over_budget(state: AgentState, config: Optional[RunnableConfig]) -> bool:
+    """True once the run passed its budget, recording why on the budget for the `budget` event."""
+    budget = (config or {}).get("configurable", {}).get("budget")
+    if budget is None:
+        return False
+    reason = budget.exceeded or budget.check(state)
+    if reason and not budget.exceeded:
+        budget.exceeded = reason
+        print(f"[scheduler] Ending run early, {reason}")
+    return bool(reason)
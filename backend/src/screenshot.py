@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import io
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing_extensions import Dict, Optional
+
+from PIL import Image as PILImage
+from playwright.async_api import CDPSession, Page
+
+from src.llm import DEFAULT_MODEL
+from src.settle import settle
+from src.tracing import span
+
+
+@dataclass(frozen=True)
+class ScreenshotProfile:
+    """How the screenshot sent to a model is sized and encoded."""
+    max_size: int = 600
+    grayscale: bool = True
+    format: str = "JPEG"  # JPEG, WEBP or PNG
+    quality: int = 50
+
+
+PROFILES: Dict[str, ScreenshotProfile] = {
+    "default": ScreenshotProfile(),
+    "color": ScreenshotProfile(max_size=768, grayscale=False, format="JPEG", quality=60),
+    "webp": ScreenshotProfile(max_size=768, grayscale=False, format="WEBP", quality=60),
+}
+
+# Profile used for each model, anything not listed falls back to "default"
+MODEL_PROFILES: Dict[str, str] = {
+    DEFAULT_MODEL: "default",
+}
+
+# Encoding runs off the event loop: threads by default (PIL releases the GIL while resizing and
+# encoding), or a process pool when one worker serves many sessions.
+SCREENSHOT_EXECUTOR = os.getenv("SCREENSHOT_EXECUTOR", "thread")
+SCREENSHOT_WORKERS = int(os.getenv("SCREENSHOT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[Executor] = None
+_cdp_sessions: "weakref.WeakKeyDictionary[Page, CDPSession]" = weakref.WeakKeyDictionary()
+
+CDP_FORMATS = {"JPEG": "jpeg", "WEBP": "webp", "PNG": "png"}
+
+
+def get_profile(model: str = DEFAULT_MODEL) -> ScreenshotProfile:
+    name = os.getenv("SCREENSHOT_PROFILE") or MODEL_PROFILES.get(model, "default")
+    return PROFILES.get(name, PROFILES["default"])
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if SCREENSHOT_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=SCREENSHOT_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=SCREENSHOT_WORKERS, thread_name_prefix="screenshot")
+    return _executor
+
+
+def is_image_blank(image_bytes: bytes) -> bool:
+    """Return True if the screenshot is a single flat colour (e.g. all white), else False."""
+    if not image_bytes:
+        return True
+    img = PILImage.open(io.BytesIO(image_bytes))
+    # JPEG can be decoded at 1/8 scale directly, other formats are reduced after decoding
+    img.draft("L", (64, 64))
+    img = img.convert("L")
+    img.thumbnail((64, 64))
+    low, high = img.getextrema()
+    return high - low <= 2
+
+
+def encode_screenshot(raw_bytes: bytes, profile: ScreenshotProfile) -> bytes:
+    """Resize, optionally grayscale, and re-encode a raw capture according to `profile`."""
+    img = PILImage.open(io.BytesIO(raw_bytes))
+    img.draft("L" if profile.grayscale else "RGB", (profile.max_size, profile.max_size))
+    if profile.grayscale:
+        # Convert to grayscale, quantize and convert back for the encoder
+        img = img.convert("L")
+        img.thumbnail((profile.max_size, profile.max_size), PILImage.Resampling.LANCZOS)
+        img = img.quantize(colors=256).convert("RGB")
+    else:
+        img = img.convert("RGB")
+        img.thumbnail((profile.max_size, profile.max_size), PILImage.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    if profile.format == "JPEG":
+        img.save(buffer, format="JPEG", quality=profile.quality, optimize=True, progressive=True)
+    else:
+        img.save(buffer, format=profile.format, quality=profile.quality)
+    return buffer.getvalue()
+
+
+async def _cdp_session(page: Page) -> CDPSession:
+    session = _cdp_sessions.get(page)
+    if session is None:
+        session = await page.context.new_cdp_session(page)
+        _cdp_sessions[page] = session
+    return session
+
+
+async def capture_raw(page: Page, profile: ScreenshotProfile) -> tuple[bytes, bool]:
+    """
+    Capture the viewport, asking Chromium to scale it down to the profile size.
+
+    Returns the bytes and whether they are already in the final encoding, which is the case for
+    colour profiles whose format Chromium can produce itself.
+    """
+    direct = not profile.grayscale
+    try:
+        cdp = await _cdp_session(page)
+        metrics = await cdp.send("Page.getLayoutMetrics")
+        viewport = metrics["cssVisualViewport"]
+        scale = min(1.0, profile.max_size / max(viewport["clientWidth"], viewport["clientHeight"]))
+        result = await cdp.send("Page.captureScreenshot", {
+            "format": CDP_FORMATS[profile.format] if direct else "jpeg",
+            "quality": profile.quality if direct else 90,
+            "clip": {
+                "x": viewport["pageX"],
+                "y": viewport["pageY"],
+                "width": viewport["clientWidth"],
+                "height": viewport["clientHeight"],
+                "scale": scale,
+            },
+            "captureBeyondViewport": False,
+        })
+        return base64.b64decode(result["data"]), direct
+    except Exception as e:
+        print(f"[capture_raw] Scaled capture failed, falling back to a full screenshot: {e}")
+        _cdp_sessions.pop(page, None)
+        return await page.screenshot(type="jpeg", quality=80, scale="css"), False
+
+
+async def capture_screenshot(page: Page, profile: ScreenshotProfile, max_retries=3, wait_seconds=2) -> bytes:
+    """
+    Take a screenshot encoded for `profile` of a page the caller already settled, retry if blank (a
+    single flat colour) once the page settled again, for at most `wait_seconds`.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    raw_bytes, encoded = b"", False
+    for attempt in range(max_retries):
+        with span("screenshot", attempt=attempt + 1) as current:
+            raw_bytes, encoded = await capture_raw(page, profile)
+            current.attributes["bytes"] = len(raw_bytes)
+
+        # Check if it's blank
+        with span("encode", step="blank_check"):
+            blank = await loop.run_in_executor(executor, is_image_blank, raw_bytes)
+        if not blank:
+            break
+
+        # Usually a page still painting, give it time to settle and retry
+        print(f"[capture_screenshot] Screenshot is blank (attempt {attempt + 1}/{max_retries}). Retrying...")
+        report = await settle(page, timeout=wait_seconds)
+        if report.reason == "quiet" and not report.waited_on:
+            # Nothing was pending, a repaint is all that could still change
+            await asyncio.sleep(0.25)
+    else:
+        # If we get here, all attempts yielded a blank screenshot
+        print("[capture_screenshot] All screenshot attempts were blank.")
+
+    if not raw_bytes or encoded:
+        return raw_bytes
+    with span("encode") as current:
+        encoded_bytes = await loop.run_in_executor(executor, encode_screenshot, raw_bytes, profile)
+        current.attributes["bytes"] = len(encoded_bytes)
+    return encoded_bytes
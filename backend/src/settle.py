@@ -0,0 +1,307 @@
+import asyncio
+import os
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing_extensions import Dict, List
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page, Request, Frame, Error as PlaywrightError
+
+from src.graph_state import StepLatency
+from src.tracing import span
+
+SETTLE_TIMEOUT_SECONDS = float(os.getenv("SETTLE_TIMEOUT_SECONDS", "5"))
+SETTLE_QUIET_MS = int(os.getenv("SETTLE_QUIET_MS", "300"))
+SETTLE_MAX_INFLIGHT = int(os.getenv("SETTLE_MAX_INFLIGHT", "2"))
+# Shorten the deadline on domains that are known to settle fast, or to never settle at all
+SETTLE_ADAPTIVE = os.getenv("SETTLE_ADAPTIVE", "true").lower() == "true"
+SETTLE_MIN_TIMEOUT_SECONDS = float(os.getenv("SETTLE_MIN_TIMEOUT_SECONDS", "1"))
+SETTLE_ADAPTIVE_FACTOR = float(os.getenv("SETTLE_ADAPTIVE_FACTOR", "3"))  # deadline as a multiple of the typical wait
+SETTLE_EWMA_ALPHA = 0.3
+SETTLE_MIN_SAMPLES = 3
+SETTLE_MAX_DOMAINS = 2048
+
+# Long-lived connections never finish and must not hold a step open
+IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "media"}
+
+# Resolves once the document has had no DOM mutation, layout change or scroll for `quietMs`, with
+# `quiet` false when `timeoutMs` passed first. `source` is the last activity seen: what was waited on.
+# The activity tracker is installed once per document and survives across calls, so every call
+# waits at least `quietMs`.
+DOM_QUIET_SCRIPT = """([quietMs, timeoutMs]) => new Promise((resolve) => {
+    if (!window.__roverActivity) {
+        const activity = { last: performance.now(), source: null, height: 0 };
+        const bump = (source) => () => { activity.last = performance.now(); activity.source = source; };
+        new MutationObserver(bump("dom")).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+        window.addEventListener("scroll", bump("scroll"), { capture: true, passive: true });
+        try {
+            new PerformanceObserver(bump("layout")).observe({ type: "layout-shift", buffered: false });
+        } catch (e) {}
+        window.__roverActivity = activity;
+    }
+    const activity = window.__roverActivity;
+    const start = performance.now();
+    let measured = false;
+    const waitedOn = () => (activity.last > start - quietMs ? activity.source : null);
+    (function check() {
+        const now = performance.now();
+        // Late images and fonts resize the page without any DOM mutation
+        const height = document.documentElement ? document.documentElement.scrollHeight : 0;
+        if (measured && height !== activity.height) {
+            activity.last = now;
+            activity.source = "layout";
+        }
+        activity.height = height;
+        measured = true;
+        // Quiet is counted from this call, activity before it says nothing about what the action started
+        if (now - Math.max(activity.last, start) >= quietMs) return resolve({ quiet: true, source: waitedOn() });
+        if (now - start >= timeoutMs) return resolve({ quiet: false, source: waitedOn() });
+        setTimeout(check, Math.min(50, quietMs));
+    })();
+})"""
+
+# Resolves true once the element under (x, y) keeps the same box for two consecutive frames
+TARGET_STABLE_SCRIPT = """([x, y, timeoutMs]) => new Promise((resolve) => {
+    const start = performance.now();
+    const box = () => {
+        const element = document.elementFromPoint(x, y);
+        if (!element) return null;
+        const r = element.getBoundingClientRect();
+        return [r.left, r.top, r.width, r.height].join(",");
+    };
+    let previous = box();
+    (function check() {
+        requestAnimationFrame(() => {
+            const current = box();
+            if (current !== null && current === previous) return resolve(true);
+            if (performance.now() - start >= timeoutMs) return resolve(false);
+            previous = current;
+            check();
+        });
+    })();
+})"""
+
+
+class NetworkTracker:
+    """Counts in-flight requests and main-frame navigations of one page from Playwright events."""
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.inflight = set()
+        # Main-frame document requests not yet committed, the page is about to be replaced
+        self.pending_navigations = set()
+        self.navigations = 0
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+        page.on("framenavigated", self._on_frame_navigated)
+
+    def _on_request(self, request: Request):
+        if self._is_main_navigation(request):
+            self.pending_navigations.add(request)
+        elif request.resource_type not in IGNORED_RESOURCE_TYPES:
+            self.inflight.add(request)
+
+    def _on_request_done(self, request: Request):
+        self.inflight.discard(request)
+        self.pending_navigations.discard(request)
+
+    def _on_frame_navigated(self, frame: Frame):
+        if frame == self.page.main_frame:
+            self.navigations += 1
+            # The new document committed, and requests of the previous one will never report back
+            self.pending_navigations.clear()
+            self.inflight.clear()
+
+    def _is_main_navigation(self, request: Request) -> bool:
+        try:
+            return request.is_navigation_request() and request.frame == self.page.main_frame
+        except PlaywrightError:
+            # Service worker requests have no frame
+            return False
+
+
+_trackers: "weakref.WeakKeyDictionary[Page, NetworkTracker]" = weakref.WeakKeyDictionary()
+
+
+def track_network(page: Page) -> NetworkTracker:
+    tracker = _trackers.get(page)
+    if tracker is None:
+        tracker = _trackers[page] = NetworkTracker(page)
+    return tracker
+
+
+@dataclass
+class SettleReport:
+    waited_ms: float
+    reason: str  # quiet, timeout or stable
+    navigated: bool = False
+    inflight: int = 0
+    waited_on: List[str] = field(default_factory=list)  # navigation, dom, layout, scroll or network
+    deadline_ms: float = 0.0  # shorter than the timeout once the domain's settle time is learned
+
+
+@dataclass
+class DomainSettle:
+    wait_ms: float  # moving average of the waits that ended quiet, raised by those that timed out
+    timeouts: float  # moving share of waits that hit the deadline
+    samples: int = 1
+
+
+class SettleHistory:
+    """Typical settle time per domain, so the deadline follows what each site actually needs."""
+
+    def __init__(self, max_domains: int = SETTLE_MAX_DOMAINS):
+        self.max_domains = max_domains
+        self._domains: "OrderedDict[str, DomainSettle]" = OrderedDict()
+
+    def deadline(self, url: str, timeout: float) -> float:
+        stats = self._domains.get(urlsplit(url).hostname or "")
+        if not SETTLE_ADAPTIVE or stats is None or stats.samples < SETTLE_MIN_SAMPLES:
+            return timeout
+        if stats.timeouts > 0.8:
+            # Tickers and live feeds never go quiet, waiting the full timeout only adds latency
+            return min(timeout, SETTLE_MIN_TIMEOUT_SECONDS)
+        return min(timeout, max(SETTLE_MIN_TIMEOUT_SECONDS, SETTLE_ADAPTIVE_FACTOR * stats.wait_ms / 1000))
+
+    def observe(self, url: str, report: SettleReport):
+        domain = urlsplit(url).hostname or ""
+        if not domain:
+            return
+        timed_out = 1.0 if report.reason == "timeout" else 0.0
+        stats = self._domains.get(domain)
+        if stats is None:
+            stats = self._domains[domain] = DomainSettle(wait_ms=report.waited_ms, timeouts=timed_out, samples=0)
+            if len(self._domains) > self.max_domains:
+                self._domains.popitem(last=False)
+        else:
+            self._domains.move_to_end(domain)
+            stats.timeouts += SETTLE_EWMA_ALPHA * (timed_out - stats.timeouts)
+            if timed_out:
+                # The page needed at least the whole deadline, back off so the next one is longer
+                stats.wait_ms = min(max(2 * stats.wait_ms, report.waited_ms), SETTLE_TIMEOUT_SECONDS * 1000)
+            else:
+                stats.wait_ms += SETTLE_EWMA_ALPHA * (report.waited_ms - stats.wait_ms)
+        stats.samples += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {domain: {"wait_ms": round(stats.wait_ms, 1), "timeouts": round(stats.timeouts, 2),
+                         "samples": stats.samples} for domain, stats in self._domains.items()}
+
+
+settle_history = SettleHistory()
+
+
+async def settle(page: Page, timeout: float = SETTLE_TIMEOUT_SECONDS, quiet_ms: int = SETTLE_QUIET_MS,
+                 max_inflight: int = SETTLE_MAX_INFLIGHT, learn: bool = False) -> SettleReport:
+    """
+    Wait until the page is ready for the next observation: any navigation has committed, the DOM and
+    layout have been quiet for `quiet_ms` and at most `max_inflight` requests are pending. Never waits
+    longer than `timeout` seconds, less on domains whose settle time has been learned.
+
+    Only `learn` waits feed the domain's settle time: the full wait after an action, not the short
+    or pre-checked ones that would drag it down.
+    """
+    with span("settle") as current:
+        report = await _settle(page, settle_history.deadline(page.url, timeout), quiet_ms, max_inflight)
+        if learn:
+            settle_history.observe(page.url, report)
+        current.attributes.update(reason=report.reason, navigated=report.navigated, inflight=report.inflight,
+                                  waited_on=",".join(report.waited_on), deadline_ms=report.deadline_ms)
+        return report
+
+
+async def _settle(page: Page, timeout: float, quiet_ms: int, max_inflight: int) -> SettleReport:
+    tracker = track_network(page)
+    navigations = tracker.navigations
+    start = time.monotonic()
+    deadline = start + timeout
+    waited_on: List[str] = []
+
+    def waited(signal: str | None):
+        if signal and signal not in waited_on:
+            waited_on.append(signal)
+
+    def report(reason: str) -> SettleReport:
+        navigated = tracker.navigations != navigations
+        if navigated:
+            waited("navigation")
+        return SettleReport(waited_ms=(time.monotonic() - start) * 1000, reason=reason, navigated=navigated,
+                            inflight=len(tracker.inflight), waited_on=waited_on, deadline_ms=round(timeout * 1000))
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return report("timeout")
+        if tracker.pending_navigations:
+            # A quiet old document says nothing about the one replacing it
+            waited("navigation")
+            await asyncio.sleep(0.05)
+            continue
+        navigations_before = tracker.navigations
+        try:
+            result = await page.evaluate(DOM_QUIET_SCRIPT, [quiet_ms, remaining * 1000])
+        except PlaywrightError:
+            # A navigation replaced the document mid-wait, wait for the new one to commit
+            waited("navigation")
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=max(remaining * 1000, 1))
+            except PlaywrightError:
+                pass
+            continue
+        waited(result["source"])
+        if not result["quiet"]:
+            return report("timeout")
+        if tracker.pending_navigations or tracker.navigations != navigations_before:
+            # A navigation started or committed while the old document looked quiet, measure the new one
+            waited("navigation")
+            continue
+        if len(tracker.inflight) <= max_inflight:
+            return report("quiet")
+        waited("network")
+        await asyncio.sleep(0.05)
+
+
+async def wait_for_stable_target(page: Page, x: float, y: float, timeout: float = 2) -> SettleReport:
+    """Wait until the element at (x, y) stops moving, e.g. at the end of an animation or late layout."""
+    start = time.monotonic()
+    with span("settle", wait="stable_target") as current:
+        try:
+            stable = await page.evaluate(TARGET_STABLE_SCRIPT, [x, y, timeout * 1000])
+        except PlaywrightError:
+            stable = False
+        current.attributes["reason"] = "stable" if stable else "timeout"
+    return SettleReport(waited_ms=(time.monotonic() - start) * 1000, reason="stable" if stable else "timeout")
+
+
+class StepTimer:
+    """Splits the wall time of one action step into time spent waiting for the page and doing work."""
+
+    def __init__(self, step: str):
+        self.step = step
+        self.start = time.monotonic()
+        self.reports: List[SettleReport] = []
+
+    async def settle(self, page: Page, **kwargs) -> SettleReport:
+        report = await settle(page, **kwargs)
+        self.reports.append(report)
+        return report
+
+    async def stable_target(self, page: Page, x: float, y: float, **kwargs) -> SettleReport:
+        report = await wait_for_stable_target(page, x, y, **kwargs)
+        self.reports.append(report)
+        return report
+
+    def report(self) -> StepLatency:
+        total_ms = (time.monotonic() - self.start) * 1000
+        wait_ms = sum(report.waited_ms for report in self.reports)
+        latency = StepLatency(step=self.step, total_ms=round(total_ms, 1), wait_ms=round(wait_ms, 1),
+                              work_ms=round(total_ms - wait_ms, 1),
+                              waits=[asdict(report) for report in self.reports])
+        print(f"[{self.step}] {latency['total_ms']}ms total: {latency['wait_ms']}ms waiting, "
+              f"{latency['work_ms']}ms working")
+        return latency
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import zlib
+from typing_extensions import Any, AsyncIterator, List, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_GZIP = os.getenv("SSE_GZIP", "false").lower() == "true"
+# Upper bound on events drained into one write when the client falls behind
+SSE_MAX_BATCH = int(os.getenv("SSE_MAX_BATCH", "64"))
+
+# Token deltas that may be merged into one frame when several are waiting
+MERGEABLE_EVENT_TYPES = {"thought_delta", "answer_delta"}
+
+HEARTBEAT_FRAME = b": keepalive\n\n"
+
+SSEEvent = Tuple[str, Any]
+
+
+def sse_frame(event_type: str, content: Any, event_id: Optional[int] = None) -> bytes:
+    """
+    Encode one event as a single-line SSE frame. `type` stays inside the payload so clients that
+    only read `data:` keep working.
+    """
+    data = orjson.dumps({"type": event_type, "content": content}, default=str)
+    head = b"id: %d\nevent: %s\n" % (event_id, event_type.encode()) if event_id is not None \
+        else b"event: %s\n" % event_type.encode()
+    return head + b"data: " + data + b"\n\n"
+
+
+def merge_deltas(events: List[SSEEvent]) -> List[SSEEvent]:
+    """Join consecutive token deltas of the same type, keeping every other event in order."""
+    merged: List[SSEEvent] = []
+    for event_type, content in events:
+        if merged and event_type in MERGEABLE_EVENT_TYPES and merged[-1][0] == event_type:
+            merged[-1] = (event_type, merged[-1][1] + content)
+        else:
+            merged.append((event_type, content))
+    return merged
+
+
+class SSEWriter:
+    """
+    Turns an async iterator of `(event_type, content)` pairs into SSE bytes.
+
+    A heartbeat comment is sent only after `heartbeat_seconds` without any event. Events that are
+    already waiting when the previous write finishes (the client or a proxy is slower than the
+    graph) are written together in one chunk with their token deltas merged, so a slow consumer
+    gets fewer, larger frames instead of an ever-growing backlog.
+    """
+
+    def __init__(self, events: AsyncIterator[SSEEvent], heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS,
+                 compress: bool = False, max_batch: int = SSE_MAX_BATCH):
+        self.events = events
+        self.heartbeat_seconds = heartbeat_seconds
+        self.compress = compress
+        self.max_batch = max_batch
+        self.next_id = 1
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _encode(self, chunk: bytes) -> bytes:
+        if self._compressor is None:
+            return chunk
+        # Sync flush so every chunk can be decoded as soon as it arrives
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _frames(self, events: List[SSEEvent]) -> bytes:
+        frames = []
+        for event_type, content in merge_deltas(events):
+            frames.append(sse_frame(event_type, content, self.next_id))
+            self.next_id += 1
+        return b"".join(frames)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        iterator = self.events.__aiter__()
+        pending: Optional[asyncio.Future] = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                # Never wait_for the generator itself, a timeout would cancel it mid-step
+                done, _ = await asyncio.wait({pending}, timeout=self.heartbeat_seconds)
+                if not done:
+                    yield self._encode(HEARTBEAT_FRAME)
+                    continue
+
+                batch: List[SSEEvent] = []
+                finished = False
+                error: Optional[BaseException] = None
+                while pending is not None and pending.done():
+                    try:
+                        batch.append(pending.result())
+                    except StopAsyncIteration:
+                        finished = True
+                        pending = None
+                        break
+                    except Exception as e:
+                        # Write what the producer sent before failing, then fail the response
+                        error = e
+                        pending = None
+                        break
+                    pending = None
+                    if len(batch) >= self.max_batch:
+                        break
+                    # Give the producer one loop turn to hand over anything it already has
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                    await asyncio.sleep(0)
+
+                if batch:
+                    yield self._encode(self._frames(batch))
+                if error is not None:
+                    raise error
+                if finished:
+                    break
+            if self._compressor is not None:
+                yield self._compressor.flush(zlib.Z_FINISH)
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                    pass
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+
+def accepts_gzip(request: Optional[Request]) -> bool:
+    return request is not None and "gzip" in request.headers.get("accept-encoding", "")
+
+
+def sse_response(events: AsyncIterator[SSEEvent], request: Optional[Request] = None,
+                 compress: bool = SSE_GZIP) -> StreamingResponse:
+    compress = compress and accepts_gzip(request)
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        # Stop nginx and similar proxies from buffering the stream
+        "X-Accel-Buffering": "no",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(SSEWriter(events, compress=compress), media_type="text/event-stream",
+                             headers=headers)
@@ -20,85 +20,175 @@ document.head.append(styleTag);
 
 var labels = [];
 
+// Change detection: count DOM mutations so the backend can tell whether the page
+// changed since the last annotation and reuse the previous screenshot and bboxes.
+var roverState = window.__roverState || (window.__roverState = { mutations: 0, observer: null });
+if (!roverState.observer) {
+    roverState.observer = new MutationObserver(function(records) {
+        roverState.mutations += records.length;
+    });
+    roverState.observer.observe(document, {
+        subtree: true,
+        childList: true,
+        attributes: true,
+        characterData: true
+    });
+}
+
+// Drop the mutation records caused by our own labels so they do not count as page changes.
+function discardOwnMutations() {
+    roverState.observer.takeRecords();
+}
+
+function pageSignature() {
+    return {
+        url: window.location.href,
+        scrollX: Math.round(window.scrollX),
+        scrollY: Math.round(window.scrollY),
+        width: window.innerWidth,
+        height: window.innerHeight,
+        scrollHeight: document.documentElement.scrollHeight,
+        mutations: roverState.mutations
+    };
+}
+
 function unmarkPage() {
     for (var i = 0; i < labels.length; i++) {
         document.body.removeChild(labels[i]);
     }
     labels = [];
+    discardOwnMutations();
+}
+
+var INTERACTIVE_TAGS = {
+    INPUT: true,
+    TEXTAREA: true,
+    SELECT: true,
+    BUTTON: true,
+    A: true,
+    IFRAME: true,
+    VIDEO: true
+};
+
+// Decide how the walker treats an element: FILTER_REJECT prunes the whole subtree,
+// which is only safe when nothing below it can render (display: none, content-visibility: hidden).
+function acceptElement(element) {
+    var hidden = element.checkVisibility
+        ? !element.checkVisibility()
+        : element.getClientRects().length === 0;
+    if (!hidden) {
+        return NodeFilter.FILTER_ACCEPT;
+    }
+    // display: contents has no box of its own but its children still render
+    if (window.getComputedStyle(element).display === "contents") {
+        return NodeFilter.FILTER_SKIP;
+    }
+    return NodeFilter.FILTER_REJECT;
 }
 
 function markPage() {
     unmarkPage();
 
-    var bodyRect = document.body.getBoundingClientRect();
-
-    var items = Array.prototype.slice
-        .call(document.querySelectorAll("*"))
-        .map(function(element) {
-            var vw = Math.max(
-                document.documentElement.clientWidth || 0,
-                window.innerWidth || 0
-            );
-            var vh = Math.max(
-                document.documentElement.clientHeight || 0,
-                window.innerHeight || 0
-            );
-            var textualContent = element.textContent.trim().replace(/\s{2,}/g, " ");
-            var elementType = element.tagName.toLowerCase();
-            var ariaLabel = element.getAttribute("aria-label") || "";
-
-            var rects = Array.prototype.slice.call(element.getClientRects())
-                .filter(function(bb) {
-                    var center_x = bb.left + bb.width / 2;
-                    var center_y = bb.top + bb.height / 2;
-                    var elAtCenter = document.elementFromPoint(center_x, center_y);
-
-                    return elAtCenter === element || element.contains(elAtCenter);
-                })
-                .map(function(bb) {
-                    var rect = {
-                        left: Math.max(0, bb.left),
-                        top: Math.max(0, bb.top),
-                        right: Math.min(vw, bb.right),
-                        bottom: Math.min(vh, bb.bottom)
-                    };
-                    rect.width = rect.right - rect.left;
-                    rect.height = rect.bottom - rect.top;
-                    return rect;
-                });
-
-            var area = rects.reduce(function(acc, rect) {
-                return acc + rect.width * rect.height;
-            }, 0);
+    var vw = Math.max(
+        document.documentElement.clientWidth || 0,
+        window.innerWidth || 0
+    );
+    var vh = Math.max(
+        document.documentElement.clientHeight || 0,
+        window.innerHeight || 0
+    );
+
+    function clampToViewport(bb) {
+        var rect = {
+            left: Math.max(0, bb.left),
+            top: Math.max(0, bb.top),
+            right: Math.min(vw, bb.right),
+            bottom: Math.min(vh, bb.bottom)
+        };
+        rect.width = rect.right - rect.left;
+        rect.height = rect.bottom - rect.top;
+        return rect;
+    }
+
+    // Rects of the element that are actually on top at their centre (not covered by an overlay)
+    function visibleRects(element) {
+        return Array.prototype.slice.call(element.getClientRects())
+            .filter(function(bb) {
+                var center_x = bb.left + bb.width / 2;
+                var center_y = bb.top + bb.height / 2;
+                var elAtCenter = document.elementFromPoint(center_x, center_y);
+
+                return elAtCenter === element || element.contains(elAtCenter);
+            })
+            .map(clampToViewport);
+    }
+
+    // Single pass over the DOM in document order. Invisible subtrees are pruned by the walker,
+    // elements outside the viewport are dropped before any style or hit-testing work, and the
+    // cheap tag checks run before getComputedStyle.
+    var walker = document.createTreeWalker(document.documentElement, NodeFilter.SHOW_ELEMENT, {
+        acceptNode: acceptElement
+    });
+
+    var items = [];
+    // Included items that are ancestors of the current element, innermost last
+    var ancestors = [];
 
+    for (var element = walker.nextNode(); element; element = walker.nextNode()) {
+        var bounds = clampToViewport(element.getBoundingClientRect());
+        if (bounds.width <= 0 || bounds.height <= 0 || bounds.width * bounds.height < 20) {
+            continue;
+        }
+
+        var include =
+            INTERACTIVE_TAGS[element.tagName] === true ||
+            element.onclick != null ||
+            window.getComputedStyle(element).cursor == "pointer";
+        if (!include) {
+            continue;
+        }
+
+        var rects = visibleRects(element);
+        var area = rects.reduce(function(acc, rect) {
+            return acc + rect.width * rect.height;
+        }, 0);
+        if (area < 20) {
+            continue;
+        }
+
+        // Linear nesting elimination: only the innermost interactive element is kept, so flag
+        // the nearest included ancestor. Ancestors that do not contain this element cannot
+        // contain any later one either (document order), so they leave the stack for good.
+        while (ancestors.length && !ancestors[ancestors.length - 1].element.contains(element)) {
+            ancestors.pop();
+        }
+        if (ancestors.length) {
+            ancestors[ancestors.length - 1].hasNested = true;
+        }
+
+        var item = {
+            element: element,
+            rects: rects,
+            hasNested: false
+        };
+        ancestors.push(item);
+        items.push(item);
+    }
+
+    items = items
+        .filter(function(item) {
+            return !item.hasNested;
+        })
+        .map(function(item) {
+            var element = item.element;
             return {
                 element: element,
-                include:
-                    element.tagName === "INPUT" ||
-                    element.tagName === "TEXTAREA" ||
-                    element.tagName === "SELECT" ||
-                    element.tagName === "BUTTON" ||
-                    element.tagName === "A" ||
-                    element.onclick != null ||
-                    window.getComputedStyle(element).cursor == "pointer" ||
-                    element.tagName === "IFRAME" ||
-                    element.tagName === "VIDEO",
-                area: area,
-                rects: rects,
-                text: textualContent,
-                type: elementType,
-                ariaLabel: ariaLabel
+                rects: item.rects,
+                text: element.textContent.trim().replace(/\s{2,}/g, " "),
+                type: element.tagName.toLowerCase(),
+                ariaLabel: element.getAttribute("aria-label") || ""
             };
-        })
-        .filter(function(item) {
-            return item.include && item.area >= 20;
-        });
-
-    items = items.filter(function(x) {
-        return !items.some(function(y) {
-            return x.element.contains(y.element) && !(x == y);
         });
-    });
 
     function getRandomColor() {
         var letters = "0123456789ABCDEF";
@@ -139,6 +229,7 @@ function markPage() {
             labels.push(newElement);
         });
     });
+    discardOwnMutations();
 
     var coordinates = [];
     items.forEach(function(item, index) {
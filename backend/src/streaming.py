@@ -0,0 +1,111 @@
+import re
+
+from langchain_core.messages import AIMessageChunk
+
+THOUGHT_PREFIX = "Thought:"
+ACTION_PREFIX = "Action:"
+
+
+def chunk_text(chunk: AIMessageChunk) -> str:
+    """Text of a streamed model chunk, whose content is either a string or a list of parts."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in chunk.content)
+
+
+class ThoughtStream:
+    """
+    Incrementally extracts the `Thought:` section of the llm_call_node reply while it streams.
+
+    The tail of the buffer is held back until it can no longer be the start of `Action:`, and
+    nothing after `Action:` is ever emitted.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.sent = 0
+        self.done = False
+
+    def feed(self, text: str) -> str:
+        if self.done:
+            return ""
+        self.buffer += text
+
+        body = self.buffer.lstrip()
+        if THOUGHT_PREFIX.startswith(body):
+            # Still receiving the prefix itself
+            return ""
+        offset = len(self.buffer) - len(body)
+        if body.startswith(THOUGHT_PREFIX):
+            offset += len(THOUGHT_PREFIX)
+
+        action_at = self.buffer.find(ACTION_PREFIX, offset)
+        if action_at != -1:
+            end = action_at
+            self.done = True
+        else:
+            end = len(self.buffer) - (len(ACTION_PREFIX) - 1)
+
+        start = max(self.sent, offset)
+        if end <= start:
+            return ""
+        self.sent = end
+        delta = self.buffer[start:end]
+        if start == offset:
+            delta = delta.lstrip()
+        return delta.rstrip() if self.done else delta
+
+
+class JsonStringFieldStream:
+    """
+    Incrementally decodes one string field of JSON arguments that arrive in pieces, such as the
+    `thought` of a streamed tool call. Escapes split across pieces are held back until complete.
+    """
+
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+    def __init__(self, field: str):
+        self.pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self.buffer = ""
+        self.position = None
+        self.done = False
+
+    def feed(self, text: str) -> str:
+        if self.done:
+            return ""
+        self.buffer += text
+        if self.position is None:
+            match = self.pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        buffer, i, decoded = self.buffer, self.position, []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(buffer):
+                break
+            if buffer[i + 1] != "u":
+                decoded.append(self.ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(buffer):
+                break
+            code = int(buffer[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # A surrogate pair only decodes together with its low half
+                if i + 12 > len(buffer):
+                    break
+                code = 0x10000 + ((code - 0xD800) << 10) + (int(buffer[i + 8:i + 12], 16) - 0xDC00)
+                i += 6
+            decoded.append(chr(code))
+            i += 6
+        self.position = i
+        return "".join(decoded)
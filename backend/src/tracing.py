@@ -0,0 +1,233 @@
+import contextvars
+import inspect
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+from typing_extensions import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+# Mirror every span to OpenTelemetry (needs `opentelemetry-api` and an SDK configured by the host)
+TRACE_OTEL = os.getenv("TRACE_OTEL", "false").lower() == "true"
+# Append each finished run's summary and spans to this JSON lines file
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+# Upper bounds in seconds of the Prometheus latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str  # node, or phase for work inside a node: mark, screenshot, encode, llm, action, settle
+    parent: Optional[str]
+    start_ms: float  # since the run started
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class RunTrace:
+    """Spans of one graph run, summarized into the `metrics` event at its end."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started = time.monotonic()
+        self.spans: List[Span] = []
+        self.finished = False
+
+    def summary(self) -> Dict[str, Any]:
+        nodes: Dict[str, Dict[str, float]] = {}
+        phases: Dict[str, Dict[str, float]] = {}
+        totals = {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0, "bytes_sent": 0}
+        for span in self.spans:
+            entry = (nodes if span.kind == "node" else phases).setdefault(span.name, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span.duration_ms, 1)
+            if span.name == "llm":
+                totals["llm_calls"] += 1
+                for key in ("input_tokens", "output_tokens", "bytes_sent"):
+                    totals[key] += span.attributes.get(key) or 0
+        return {"run_id": self.run_id, "total_ms": round((time.monotonic() - self.started) * 1000, 1),
+                "steps": sum(entry["count"] for entry in nodes.values()), "nodes": nodes, "phases": phases,
+                **totals}
+
+    def finish(self) -> Dict[str, Any]:
+        self.finished = True
+        summary = self.summary()
+        metrics.observe_run(summary)
+        if TRACE_EXPORT_PATH:
+            with open(TRACE_EXPORT_PATH, "a") as f:
+                f.write(json.dumps({"summary": summary, "spans": [asdict(span) for span in self.spans]}) + "\n")
+        return summary
+
+
+# Trace of the run and the span being timed in the current node task
+_active: contextvars.ContextVar[Tuple[Optional[RunTrace], Optional[Span]]] = \
+    contextvars.ContextVar("rover_active_span", default=(None, None))
+
+
+def _otel_span(name: str):
+    if not TRACE_OTEL:
+        return nullcontext()
+    from opentelemetry import trace as otel_trace
+
+    return otel_trace.get_tracer("webrover").start_as_current_span(name)
+
+
+@contextmanager
+def span(name: str, kind: str = "phase", **attributes) -> Iterator[Span]:
+    """
+    Time a block as a child of the current span. Attributes added to the yielded span while the block
+    runs (token counts, bytes) are recorded with it.
+    """
+    trace, parent = _active.get()
+    start = time.monotonic()
+    current = Span(name=name, kind=kind, parent=parent.name if parent else None,
+                   start_ms=round((start - trace.started) * 1000, 1) if trace else 0.0, attributes=attributes)
+    token = _active.set((trace, current))
+    try:
+        with _otel_span(name) as otel:
+            try:
+                yield current
+            finally:
+                if otel is not None:
+                    otel.set_attributes({key: value for key, value in current.attributes.items()
+                                         if isinstance(value, (str, bool, int, float))})
+    finally:
+        _active.reset(token)
+        current.duration_ms = round((time.monotonic() - start) * 1000, 1)
+        if trace is not None:
+            trace.spans.append(current)
+        metrics.observe_span(current)
+
+
+def traced_node(name: str, node: Callable) -> Callable:
+    """Run a graph node inside a span of the run trace passed in the config."""
+    parameters = list(inspect.signature(node).parameters.values())
+    takes_config = "config" in (parameter.name for parameter in parameters)
+
+    async def run(state, config: RunnableConfig):
+        token = _active.set((config.get("configurable", {}).get("trace"), None))
+        try:
+            with span(name, kind="node"):
+                return await (node(state, config) if takes_config else node(state))
+        finally:
+            _active.reset(token)
+
+    run.__name__ = node.__name__
+    # LangGraph reads the input schema from the first parameter, Send targets have their own
+    run.__annotations__["state"] = parameters[0].annotation
+    return run
+
+
+def message_bytes(llm_input) -> int:
+    """Size of a prompt's text and inline images as sent to the model."""
+    messages = llm_input.to_messages() if hasattr(llm_input, "to_messages") else []
+    size = 0
+    for message in messages:
+        parts = [message.content] if isinstance(message.content, str) else message.content
+        for part in parts:
+            if isinstance(part, str):
+                size += len(part.encode())
+            elif part.get("type") == "image_url":
+                size += len(part["image_url"]["url"])
+            else:
+                size += len(part.get("text", "").encode())
+    return size
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> bucket counts, then sum and count
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self.series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def dump(self) -> List[List[Any]]:
+        return [[list(labels), series] for labels, series in self.series.items()]
+
+    def load(self, dumped: List[List[Any]]):
+        """Add series from another process's `dump()`."""
+        for labels, series in dumped:
+            current = self.series.setdefault(tuple(labels), [0] * (len(self.buckets) + 2))
+            for index, value in enumerate(series):
+                current[index] += value
+
+    def render(self, name: str, label_names: Tuple[str, ...]) -> List[str]:
+        lines = []
+        for labels, series in sorted(self.series.items()):
+            pairs = [f'{key}="{value}"' for key, value in zip(label_names, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _labels(pairs + [f'le="{bound}"'])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _labels(pairs + ['le="+Inf"'])
+            lines.append(f"{name}_bucket{bucket_labels} {int(series[-1])}")
+            lines.append(f"{name}_sum{_labels(pairs)} {series[-2]:.6f}")
+            lines.append(f"{name}_count{_labels(pairs)} {int(series[-1])}")
+        return lines
+
+
+def _labels(pairs: List[str]) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metrics:
+    """Process-wide aggregates of every span and run, exposed in the Prometheus text format."""
+
+    def __init__(self):
+        self.spans = Histogram()
+        self.runs = Histogram()
+        self.counters: Dict[str, float] = {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0, "bytes_sent": 0,
+                                           "runs": 0, "steps": 0, "requests_blocked": 0, "bytes_saved": 0}
+
+    def observe_span(self, span: Span):
+        self.spans.observe((span.kind, span.name), span.duration_ms / 1000)
+        # Model calls outside a run, like background summaries, are counted too
+        if span.name == "llm":
+            self.counters["llm_calls"] += 1
+            for key in ("input_tokens", "output_tokens", "bytes_sent"):
+                self.counters[key] += span.attributes.get(key) or 0
+
+    def observe_run(self, summary: Dict[str, Any]):
+        self.runs.observe((), summary["total_ms"] / 1000)
+        self.counters["runs"] += 1
+        self.counters["steps"] += summary["steps"]
+
+    def dump(self) -> Dict[str, Any]:
+        """JSON-safe totals, for browser workers to report to the API through the broker."""
+        return {"spans": self.spans.dump(), "runs": self.runs.dump(), "counters": dict(self.counters)}
+
+    @classmethod
+    def merged(cls, dumps: List[Dict[str, Any]]) -> "Metrics":
+        total = cls()
+        for dump in dumps:
+            total.spans.load(dump["spans"])
+            total.runs.load(dump["runs"])
+            for key, value in dump["counters"].items():
+                total.counters[key] = total.counters.get(key, 0) + value
+        return total
+
+    def render(self) -> str:
+        lines = ["# HELP rover_span_duration_seconds Time spent in graph nodes and their phases.",
+                 "# TYPE rover_span_duration_seconds histogram"]
+        lines += self.spans.render("rover_span_duration_seconds", ("kind", "name"))
+        lines += ["# HELP rover_run_duration_seconds Wall time of finished graph runs.",
+                  "# TYPE rover_run_duration_seconds histogram"]
+        lines += self.runs.render("rover_run_duration_seconds", ())
+        for key, value in self.counters.items():
+            lines += [f"# TYPE rover_{key}_total counter", f"rover_{key}_total {int(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
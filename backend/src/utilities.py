@@ -1,164 +1,174 @@
 import base64
 import os
 import asyncio
-from PIL import Image as PILImage
-from playwright.async_api import Page, async_playwright
-import io
+import weakref
+from langchain_core.runnables import RunnableConfig
+from playwright.async_api import Page, BrowserContext, async_playwright
+
+from src.network_profile import network_profile
+from src.screenshot import ScreenshotProfile, capture_screenshot, get_profile
+from src.settle import settle, track_network
+from src.tracing import span
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 mark_page_path = os.path.join(current_dir, "static", "mark_page.js")
 
+with open(mark_page_path) as f:
+    mark_page_script = f.read()
+
+# Last annotation per page, reused while the page signature is unchanged
+annotation_cache: "weakref.WeakKeyDictionary[Page, dict]" = weakref.WeakKeyDictionary()
+
+
+def get_page(config: RunnableConfig) -> Page:
+    """The live page is passed through the run config so it never ends up in a checkpoint."""
+    return config["configurable"]["page"]
+
+
+async def inject_mark_page_script(page: Page):
+    """Inject the marking script once per document; navigations start with a fresh window."""
+    if not await page.evaluate("typeof window.markPage === 'function'"):
+        await page.evaluate(mark_page_script)
+
+
+async def page_signature(page: Page):
+    """URL, scroll position, viewport and DOM mutation count as tracked by mark_page.js."""
+    try:
+        return await page.evaluate("typeof window.pageSignature === 'function' ? pageSignature() : null")
+    except Exception as e:
+        print(f"[page_signature] Could not read page signature: {e}")
+        return None
 
-async def mark_page(page):
+
+async def mark_page(page, profile: ScreenshotProfile | None = None):
 
     """
-    1. Wait for the page to be loaded using 'networkidle'.
-    2. Attempt to run a 'mark_page_script' that presumably marks and returns bounding boxes.
-    3. Retry up to 10 times if it fails.
-    4. Capture a screenshot with retry logic (up to 3 tries) if the page is blank.
-    5. Process screenshot (grayscale, resize, quantize, compress).
-    6. Remove the markings before returning.
+    1. Return the previous annotation if the page signature has not changed since it was taken.
+    2. Wait for the page to settle (DOM, layout and requests quiet, bounded by a deadline).
+    3. Attempt to run a 'mark_page_script' that presumably marks and returns bounding boxes.
+    4. Retry up to 3 times if it fails.
+    5. Capture a screenshot with retry logic (up to 3 tries) if the page is blank.
+    6. Encode the screenshot for the model's `profile` (size, colour, format).
+    7. Remove the markings before returning.
     """
 
+    profile = profile or get_profile()
+    await page.wait_for_load_state("domcontentloaded")
+    signature = await page_signature(page)
+    cached = annotation_cache.get(page)
+    if (signature is not None and cached is not None
+            and cached["signature"] == signature and cached["profile"] == profile):
+        return cached["result"]
+
+    # Marked before the screenshot, so the boxes must come from the settled page. Long-polling and
+    # streaming pages never reach networkidle, the deadline bounds the wait on them.
+    report = await settle(page)
+    if report.waited_on:
+        signature = await page_signature(page)
+
     bboxes = []
-    for attempt in range (3):
-        try:
-            with open(mark_page_path) as f:
-                mark_page_script = f.read()
-            await page.wait_for_load_state("domcontentloaded")
-            await page.evaluate(mark_page_script)
-            bboxes = await page.evaluate("markPage()")
-            break
-        except Exception as e:
-            print(f"[mark_page] Attempt {attempt +1}/3 failed to mark page: {e}")
-            await asyncio.sleep(3)
-    # Get screenshot as bytes
-    await page.wait_for_load_state("networkidle")
-    screenshot_bytes = await capture_screenshot(page, max_retries=3)
-
-    # Process screenshot if we have any bytes
-    if screenshot_bytes:
-        img = PILImage.open(io.BytesIO(screenshot_bytes))
-        # Convert to grayscale
-        img = img.convert('L')
-        # Resize
-        max_size = (600, 600)
-        img.thumbnail(max_size, PILImage.Resampling.LANCZOS)
-        # Quantize and convert back to grayscale
-        img = img.quantize(colors=256).convert('RGB')
-
-        # Compress
-        buffer = io.BytesIO()
-        img.save(
-            buffer,
-            format='JPEG',
-            quality=50,      # Low quality -> smaller size
-            optimize=True,
-            progressive=True
-        )
-        compressed_bytes = buffer.getvalue()
-    else:
+    with span("mark") as current:
+        for attempt in range (3):
+            try:
+                await page.wait_for_load_state("domcontentloaded")
+                await inject_mark_page_script(page)
+                if signature is None:
+                    signature = await page_signature(page)
+                bboxes = await page.evaluate("markPage()")
+                break
+            except Exception as e:
+                print(f"[mark_page] Attempt {attempt +1}/3 failed to mark page: {e}")
+                await asyncio.sleep(3)
+        current.attributes.update(attempts=attempt + 1, bboxes=len(bboxes))
+    # Get screenshot as bytes, scaled and encoded for the model off the event loop
+    compressed_bytes = await capture_screenshot(page, profile, max_retries=3)
+    if not compressed_bytes:
         # If screenshot is empty or never taken, handle gracefully
         print("[mark_page] Using empty screenshot due to failure or blank screenshot.")
-        compressed_bytes = b""
 
-    await page.wait_for_load_state("networkidle")
     try:
         await page.evaluate("unmarkPage()")
     except Exception as e:
         print(f"[mark_page] Could not unmark page: {e}")
 
     # Build final result
-    return {
+    result = {
         "image": base64.b64encode(compressed_bytes).decode("utf-8"),
         "bboxes": bboxes
     }
+    # Only cache complete annotations; any mutation after the signature was read invalidates it
+    if signature is not None and bboxes and compressed_bytes:
+        annotation_cache[page] = {"signature": signature, "profile": profile, "result": result}
+    return result
+
+
+# Add browser arguments to appear more human-like
+BROWSER_ARGS = [
+    "--disable-gpu",
+    "--disable-software-rasterizer",  # Ensures no GPU rendering
+    "--no-sandbox",  # Required for running as root in EC2
+    "--disable-dev-shm-usage",  # Prevents crashes in Docker/EC2
+    "--disable-setuid-sandbox",  # Avoid sandbox issues
+    "--disable-blink-features=AutomationControlled",  # Hide automation
+    "--disable-extensions",  # Disable unnecessary extensions
+    "--ignore-certificate-errors",  # Ignore SSL issues
+    "--disable-infobars",  # Remove Chrome popups
+    "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+]
+
+# Add browser context options
+CONTEXT_OPTIONS = {
+    # "viewport": {"width": 1076, "height": 1076},  # Standard desktop resolution
+    "viewport": {"width": 1280, "height": 720},
+    "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    "permissions": ['geolocation'],
+    "geolocation": {"latitude": 37.7749, "longitude": -122.4194},  # Set a fixed location
+    "locale": 'en-US',
+    "timezone_id": 'America/Los_Angeles',
+}
+
+# Enable JavaScript and cookies
+STEALTH_INIT_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    });
+"""
+
+CHROMIUM_EXECUTABLE_PATH = os.getenv("CHROMIUM_EXECUTABLE_PATH", "/usr/bin/chromium-browser")
+
+
+async def new_agent_page(context: BrowserContext, go_to_page: str) -> Page:
+    """Prepare a context for the agent and open its first page on `go_to_page`."""
+    await context.add_init_script(STEALTH_INIT_SCRIPT)
+    # Skip media, fonts, ads and excess third-party requests the screenshot and page text don't need
+    await network_profile.apply(context)
 
+    page = await context.new_page()
+    await network_profile.apply_page(page)
+    # Count requests from the very first navigation so action nodes can wait on the network
+    track_network(page)
 
-async def is_image_blank(image_bytes: bytes) -> bool:
-    """Return True if the screenshot is fully blank (e.g. all white), else False."""
-    if not image_bytes:
-        return True
-    img = PILImage.open(io.BytesIO(image_bytes)).convert("L")
-    # If getbbox() returns None, the image is entirely one color
-    return img.getbbox() is None
-
-
-async def capture_screenshot(page: Page, max_retries=3, wait_seconds=2) -> bytes:
-    """Take a screenshot, retry if blank (completely white)."""
-    screenshot_bytes = b""
-    for attempt in range(max_retries):
-        # Wait for the page to be fully loaded
-        await page.wait_for_load_state("networkidle")
-
-        # Take screenshot
-        screenshot_bytes = await page.screenshot(path="screenshot.jpg", type="jpeg", quality=60, scale="device")
-
-        # Check if it's blank
-        if not await is_image_blank(screenshot_bytes):
-            return screenshot_bytes
-
-        # If blank, wait a bit and retry
-        print(f"[capture_screenshot] Screenshot is blank (attempt {attempt + 1}/{max_retries}). Retrying...")
-        await asyncio.sleep(wait_seconds)
+    try:
+        await page.goto(go_to_page, timeout=80000, wait_until="domcontentloaded")
+    except Exception as e:
+        print(f"Error loading page: {e}")
+        # Fallback to Google if the original page fails to load
+        await page.goto("https://www.google.com", timeout=60000, wait_until="domcontentloaded")
 
-    # If we get here, all attempts yielded a blank screenshot
-    print("[capture_screenshot] All screenshot attempts were blank.")
-    return screenshot_bytes  # Return whatever we got last
+    return page
 
 
 async def setup_browser_2(go_to_page: str):
     playwright = await async_playwright().start()
 
-    # Add browser arguments to appear more human-like
-    browser_args = [
-        "--disable-gpu",
-        "--disable-software-rasterizer",  # Ensures no GPU rendering
-        "--no-sandbox",  # Required for running as root in EC2
-        "--disable-dev-shm-usage",  # Prevents crashes in Docker/EC2
-        "--disable-setuid-sandbox",  # Avoid sandbox issues
-        "--disable-blink-features=AutomationControlled",  # Hide automation
-        "--disable-extensions",  # Disable unnecessary extensions
-        "--ignore-certificate-errors",  # Ignore SSL issues
-        "--disable-infobars",  # Remove Chrome popups
-        "--remote-debugging-port=9222",  # Debugging mode (optional)
-        "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-    ]
-
-    # Add browser context options
-    context_options = {
-        # "viewport": {"width": 1076, "height": 1076},  # Standard desktop resolution
-        "viewport": {"width": 1280, "height": 720},
-        "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-        "permissions": ['geolocation'],
-        "geolocation": {"latitude": 37.7749, "longitude": -122.4194},  # Set a fixed location
-        "locale": 'en-US',
-        "timezone_id": 'America/Los_Angeles',
-    }
-
     browser = await playwright.chromium.launch(
         headless=True,
-        args=browser_args,
-        executable_path="/usr/bin/chromium-browser"
+        args=BROWSER_ARGS + ["--remote-debugging-port=9222"],  # Debugging mode (optional)
+        executable_path=CHROMIUM_EXECUTABLE_PATH
     )
 
     # Create context with the specified options
-    context = await browser.new_context(**context_options)
-
-    # Enable JavaScript and cookies
-    await context.add_init_script("""
-        Object.defineProperty(navigator, 'webdriver', {
-            get: () => undefined
-        });
-    """)
-
-    page = await context.new_page()
-
-    try:
-        await page.goto(go_to_page, timeout=80000, wait_until="domcontentloaded")
-    except Exception as e:
-        print(f"Error loading page: {e}")
-        # Fallback to Google if the original page fails to load
-        await page.goto("https://www.google.com", timeout=60000, wait_until="domcontentloaded")
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    page = await new_agent_page(context, go_to_page)
 
     return playwright, browser, page
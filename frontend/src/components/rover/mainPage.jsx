@@ -29,6 +29,9 @@ export default function Home() {
         throw new Error(errorData.detail || 'Failed to setup browser');
       }
 
+      const { session_id } = await response.json();
+      sessionStorage.setItem('roverSessionId', session_id);
+
       console.log('Connection successful, redirecting...');
       router('rover');
     } catch (error) {
@@ -21,7 +21,12 @@ function RoverPage () {
     try {
       await fetch('http://65.1.139.145:8082/cleanup', {
         method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ session_id: sessionStorage.getItem('roverSessionId') }),
       });
+      sessionStorage.removeItem('roverSessionId');
     } catch (error) {
       console.error('Failed to cleanup browser:', error);
     } finally {
@@ -41,7 +46,7 @@ function RoverPage () {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ query }),
+        body: JSON.stringify({ query, session_id: sessionStorage.getItem('roverSessionId') }),
       });
 
       const reader = response.body?.getReader();
@@ -59,8 +64,10 @@ function RoverPage () {
         
         buffer = lines.pop() || '';
 
-        for (const line of lines) {
-          if (line.trim() && line.startsWith('data: ')) {
+        for (const frame of lines) {
+          // Frames also carry id:/event: fields and heartbeats are ':' comments, only data: holds the payload
+          const line = frame.split('\n').find((field) => field.startsWith('data: '));
+          if (line) {
             try {
               const jsonStr = line.slice(6).trim();
               const data = JSON.parse(jsonStr);
@@ -85,12 +92,29 @@ function RoverPage () {
                 data.content = JSON.stringify(data.content);
               }
 
-              // Only add valid message types
+              // Token deltas grow the thought or answer currently being streamed
+              if (data.type === 'thought_delta' || data.type === 'answer_delta') {
+                const type = data.type === 'thought_delta' ? 'thought' : 'final_answer';
+                setMessages(prev => {
+                  const last = prev[prev.length - 1];
+                  if (last && last.type === type && last.streaming) {
+                    return [...prev.slice(0, -1), { ...last, content: last.content + data.content }];
+                  }
+                  return [...prev, { type, content: String(data.content), streaming: true }];
+                });
+                continue;
+              }
+
+              // Only add valid message types, replacing the streamed version once it completes
               if (['thought', 'action', 'final_answer', 'error'].includes(data.type)) {
-                setMessages(prev => [...prev, {
-                  type: data.type,
-                  content: String(data.content)
-                }]);
+                setMessages(prev => {
+                  const last = prev[prev.length - 1];
+                  const message = { type: data.type, content: String(data.content) };
+                  if (last && last.type === data.type && last.streaming) {
+                    return [...prev.slice(0, -1), message];
+                  }
+                  return [...prev, message];
+                });
               }
             } catch (e) {
               console.error('Failed to parse SSE message:', e, line);